@@ -1,6 +1,11 @@
 from langchain.memory import ConversationBufferMemory
 from langchain.chains import ConversationChain
 from langchain_ollama import OllamaLLM
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "src", "rag_pipeline"))
+from streaming import TokenStats, stream_conversation
 
 def main():
     llm = OllamaLLM(model="alibayram/smollm3:latest")
@@ -26,8 +31,12 @@ def main():
             print("Conversation saved to conversation_log.txt")
             break
 
-        response = conversation.predict(input=user_input)
-        print(f"Test Bot: {response}\n")
+        # Tokens are printed as they arrive instead of after the whole reply
+        stats = TokenStats()
+        print("Test Bot: ", end="", flush=True)
+        for token in stream_conversation(conversation, user_input, stats):
+            print(token, end="", flush=True)
+        print(f"\n[{stats.summary()}]\n")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
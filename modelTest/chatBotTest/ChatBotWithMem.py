@@ -1,18 +1,26 @@
-from langchain.memory import ConversationBufferMemory
 from langchain.chains import ConversationChain
+from langchain_core.messages import AIMessage, HumanMessage
 from langchain_ollama import OllamaLLM
-from datetime import datetime
 import os
+import sys
+from chat_log import ChatLog
+from token_memory import TokenBudgetMemory
 
-def load_previous_memory(filename):
-    """Load a previous conversation from a text file into ConversationBufferMemory."""
-    memory = ConversationBufferMemory(return_messages=True)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "src", "rag_pipeline"))
+from streaming import TokenStats, stream_conversation
+
+# Prompt history budget; older turns are folded into a rolling summary
+HISTORY_TOKEN_LIMIT = 1024
+
+def load_previous_memory(filename, memory):
+    """Load a conversation saved as a text file (the old log format) into `memory`."""
     with open(filename, "r", encoding="utf-8") as f:
         for line in f:
             if line.startswith("You: "):
                 memory.chat_memory.add_user_message(line[len("You: "):].strip())
             elif line.startswith("Bot: "):
                 memory.chat_memory.add_ai_message(line[len("Bot: "):].strip())
+    memory.restore("", list(memory.chat_memory.messages))
     return memory
 
 def main():
@@ -20,8 +28,10 @@ def main():
     os.makedirs(logs_folder, exist_ok=True)
     print(f"Conversations will be saved in: {logs_folder}\n")
 
-    memory = None
-    prev_files = [f for f in os.listdir(logs_folder) if f.startswith("conversation_") and f.endswith(".txt")]
+    llm = OllamaLLM(model="alibayram/smollm3:latest")
+    memory = TokenBudgetMemory(llm=llm, max_token_limit=HISTORY_TOKEN_LIMIT)
+    log = None
+    prev_files = [f for f in os.listdir(logs_folder) if f.startswith("conversation_") and f.endswith((".jsonl", ".txt"))]
     prev_files.sort()
     
     if prev_files:
@@ -31,13 +41,24 @@ def main():
         choice = input("Enter the number of a file to continue, or press Enter to start fresh: ")
         if choice.isdigit() and 1 <= int(choice) <= len(prev_files):
             filename = os.path.join(logs_folder, prev_files[int(choice)-1])
-            memory = load_previous_memory(filename)
+            if filename.endswith(".jsonl"):
+                # Only the latest summary and the turns after it are read
+                log = ChatLog(filename)
+                summary, messages, summarized = log.resume()
+                memory.restore(summary, messages, summarized)
+            else:
+                load_previous_memory(filename, memory)
+                memory.prune()
             print(f"Loaded conversation from {filename}")
     
-    if memory is None:
-        memory = ConversationBufferMemory(return_messages=True)
+    if log is None:
+        # Every turn is appended as it happens, so a crash loses at most the current turn
+        log = ChatLog.create(logs_folder)
+        if memory.moving_summary_buffer:
+            log.append_summary(memory.moving_summary_buffer, 0, memory.summarized_messages)
+        for msg in memory.chat_memory.messages:
+            log.append_message(msg)
 
-    llm = OllamaLLM(model="alibayram/smollm3:latest")
     conversation = ConversationChain(
         llm=llm,
         memory=memory,
@@ -53,8 +74,24 @@ def main():
                 print("Goodbye!")
                 break
 
-            response = conversation.predict(input=user_input)
-            print(f"Test Bot: {response}\n")
+            # The question is logged before generation, so it survives a crash mid-reply
+            log.append_message(HumanMessage(content=user_input))
+
+            # Tokens are printed as they arrive instead of after the whole reply
+            stats = TokenStats()
+            summarized = memory.summarized_messages
+            tokens = []
+            print("Test Bot: ", end="", flush=True)
+            for token in stream_conversation(conversation, user_input, stats):
+                tokens.append(token)
+                print(token, end="", flush=True)
+            print(f"\n[{stats.summary()}, history {memory.window_tokens} tokens]\n")
+
+            # Not taken from the memory window: pruning may already have folded this turn into the summary
+            log.append_message(AIMessage(content="".join(tokens)))
+            if memory.summarized_messages != summarized:
+                log.append_summary(memory.moving_summary_buffer, len(memory.chat_memory.messages),
+                                   memory.summarized_messages)
 
     except KeyboardInterrupt:
         print("\nInterrupted by user. Exiting...")
@@ -64,14 +101,8 @@ def main():
         print("Exiting chat...")
 
     finally:
-        if memory and memory.chat_memory.messages:
-            timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            filename = os.path.join(logs_folder, f"conversation_{timestamp}.txt")
-            with open(filename, "w", encoding="utf-8") as f:
-                for msg in memory.chat_memory.messages:
-                    role = "You" if msg.type == "human" else "Bot"
-                    f.write(f"{role}: {msg.content}\n")
-            print(f"Conversation saved to {filename}")
+        log.close()
+        print(f"Conversation saved to {log.path}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,130 @@
+import json
+import os
+import struct
+from datetime import datetime
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+# Index file: an 8-byte header (1 + record number of the latest summary, 0 = none)
+# followed by one 8-byte offset into the log per record.
+HEADER = struct.Struct("<Q")
+OFFSET = struct.Struct("<Q")
+
+
+class ChatLog:
+    """Append-only conversation log with a fixed-width offset index.
+
+    Every turn is appended to `<name>.jsonl` as it happens, so a crash loses
+    at most the turn in progress. `<name>.idx` holds the byte offset of every
+    record plus a pointer to the latest rolling-summary record, which names
+    the record where the message window after it starts. Resuming reads the
+    header, the summary and the window -- never the whole history.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = os.path.splitext(path)[0] + ".idx"
+        self.records = 0
+        self.latest_summary = None
+        self.message_records = []  # record numbers of the messages written or resumed in this process
+        self._open()
+
+    @classmethod
+    def create(cls, folder):
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        return cls(os.path.join(folder, f"conversation_{timestamp}.jsonl"))
+
+    def _open(self):
+        new = not os.path.exists(self.index_path)
+        self._log = open(self.path, "a+b")
+        self._index = open(self.index_path, "w+b" if new else "r+b")
+        if new:
+            self._index.write(HEADER.pack(0))
+            self._index.flush()
+        self._index.seek(0)
+        (pointer,) = HEADER.unpack(self._index.read(HEADER.size))
+        self.latest_summary = pointer - 1 if pointer else None
+        self.records = (os.path.getsize(self.index_path) - HEADER.size) // OFFSET.size
+        self._recover()
+
+    def _recover(self):
+        """Index records whose log line was written but not indexed, and drop a torn last line."""
+        log_size = os.path.getsize(self.path)
+        end = self._record_end(self.records - 1) if self.records else 0
+        if end == log_size:
+            return
+        self._log.seek(end)
+        tail = self._log.read()
+        offset = end
+        for line in tail.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break
+            self._index_record(offset, json.loads(line))
+            offset += len(line)
+        self._log.truncate(offset)
+        self._log.flush()
+
+    def _offset(self, record):
+        self._index.seek(HEADER.size + record * OFFSET.size)
+        return OFFSET.unpack(self._index.read(OFFSET.size))[0]
+
+    def _record_end(self, record):
+        self._log.seek(self._offset(record))
+        return self._log.tell() + len(self._log.readline())
+
+    def read(self, record):
+        self._log.seek(self._offset(record))
+        return json.loads(self._log.readline())
+
+    def _index_record(self, offset, entry):
+        self._index.seek(HEADER.size + self.records * OFFSET.size)
+        self._index.write(OFFSET.pack(offset))
+        if entry["type"] == "summary":
+            self._index.seek(0)
+            self._index.write(HEADER.pack(self.records + 1))
+            self.latest_summary = self.records
+        elif entry["type"] == "message":
+            self.message_records.append(self.records)
+        self._index.flush()
+        self.records += 1
+
+    def _append(self, entry):
+        self._log.seek(0, os.SEEK_END)
+        offset = self._log.tell()
+        self._log.write((json.dumps(entry) + "\n").encode("utf-8"))
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self._index_record(offset, entry)
+
+    def append_message(self, message):
+        role = "human" if message.type == "human" else "ai"
+        self._append({"type": "message", "role": role, "content": message.content,
+                      "time": datetime.now().isoformat(timespec="seconds")})
+
+    def append_summary(self, summary, window_messages, summarized_messages):
+        """Record the rolling summary; `window_messages` is how many recent messages it does not cover."""
+        window = self.message_records[len(self.message_records) - window_messages:] if window_messages else []
+        self._append({"type": "summary", "content": summary, "summarized_messages": summarized_messages,
+                      "window_record": window[0] if window else self.records})
+
+    def resume(self):
+        """(summary, messages after it, number of summarized messages) without reading the whole log."""
+        summary, summarized, start = "", 0, 0
+        if self.latest_summary is not None:
+            entry = self.read(self.latest_summary)
+            summary, summarized, start = entry["content"], entry["summarized_messages"], entry["window_record"]
+        messages = []
+        self.message_records = []
+        if start < self.records:
+            self._log.seek(self._offset(start))
+            for record, line in enumerate(self._log, start):
+                entry = json.loads(line)
+                if entry["type"] == "message":
+                    cls = HumanMessage if entry["role"] == "human" else AIMessage
+                    messages.append(cls(content=entry["content"]))
+                    self.message_records.append(record)
+        return summary, messages, summarized
+
+    def close(self):
+        self._log.close()
+        self._index.close()
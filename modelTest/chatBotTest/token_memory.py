@@ -0,0 +1,110 @@
+from typing import Any, List, Optional
+
+import tiktoken
+from langchain.memory.chat_memory import BaseChatMemory
+from langchain.memory.prompt import SUMMARY_PROMPT
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.messages import BaseMessage, SystemMessage, get_buffer_string
+from pydantic import PrivateAttr
+
+# Approximates SmolLM3's tokenizer closely enough for budgeting
+ENCODING_NAME = "cl100k_base"
+
+
+class TokenBudgetMemory(BaseChatMemory):
+    """Conversation memory that keeps the prompt history under a token budget.
+
+    The most recent messages are kept verbatim (a sliding window). When the
+    window exceeds `max_token_limit` tokens, the oldest messages are folded
+    into a rolling summary with one LLM call, using LangChain's progressive
+    summary prompt. Messages are pruned down to `prune_to` of the budget, so
+    a summary is written every few turns rather than on every turn.
+
+    Token counts are taken with tiktoken once per message and kept alongside
+    the window, so checking the budget costs O(1) per turn. Without an `llm`
+    the pruned messages are simply dropped.
+    """
+
+    llm: Optional[BaseLanguageModel] = None
+    max_token_limit: int = 1024
+    prune_to: float = 0.75
+    moving_summary_buffer: str = ""
+    summarized_messages: int = 0
+    human_prefix: str = "Human"
+    ai_prefix: str = "AI"
+    memory_key: str = "history"
+
+    _encoding: Any = PrivateAttr(default=None)
+    _token_counts: List[int] = PrivateAttr(default_factory=list)
+    _window_tokens: int = PrivateAttr(default=0)
+
+    def model_post_init(self, __context):
+        self._encoding = tiktoken.get_encoding(ENCODING_NAME)
+        self._token_counts = [self.count_tokens(msg) for msg in self.chat_memory.messages]
+        self._window_tokens = sum(self._token_counts)
+
+    @property
+    def memory_variables(self):
+        return [self.memory_key]
+
+    def count_tokens(self, message):
+        text = message.content if isinstance(message, BaseMessage) else message
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+    @property
+    def window_tokens(self):
+        return self._window_tokens
+
+    def load_memory_variables(self, inputs):
+        messages = self.chat_memory.messages
+        if self.moving_summary_buffer:
+            messages = [SystemMessage(content=self.moving_summary_buffer)] + messages
+        if self.return_messages:
+            return {self.memory_key: messages}
+        return {self.memory_key: get_buffer_string(messages, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)}
+
+    def save_context(self, inputs, outputs):
+        before = len(self.chat_memory.messages)
+        super().save_context(inputs, outputs)
+        for msg in self.chat_memory.messages[before:]:
+            self._token_counts.append(self.count_tokens(msg))
+            self._window_tokens += self._token_counts[-1]
+        self.prune()
+
+    def prune(self):
+        """Fold the oldest messages into the summary once the window is over budget."""
+        if self._window_tokens <= self.max_token_limit:
+            return
+        target = int(self.max_token_limit * self.prune_to)
+        messages = self.chat_memory.messages
+        count = 0
+        while count < len(messages) - 1 and self._window_tokens > target:
+            self._window_tokens -= self._token_counts[count]
+            count += 1
+        pruned = messages[:count]
+        del messages[:count]
+        del self._token_counts[:count]
+        self.summarized_messages += count
+        if self.llm is not None:
+            self.moving_summary_buffer = self.predict_new_summary(pruned, self.moving_summary_buffer)
+
+    def predict_new_summary(self, messages, existing_summary):
+        new_lines = get_buffer_string(messages, human_prefix=self.human_prefix, ai_prefix=self.ai_prefix)
+        result = self.llm.invoke(SUMMARY_PROMPT.format(summary=existing_summary, new_lines=new_lines))
+        return (result if isinstance(result, str) else result.content).strip()
+
+    def restore(self, summary, messages, summarized_messages=0):
+        """Load a saved state: the rolling summary plus the messages after it."""
+        self.moving_summary_buffer = summary or ""
+        self.summarized_messages = summarized_messages
+        self.chat_memory.clear()
+        self.chat_memory.add_messages(messages)
+        self._token_counts = [self.count_tokens(msg) for msg in messages]
+        self._window_tokens = sum(self._token_counts)
+
+    def clear(self):
+        super().clear()
+        self.moving_summary_buffer = ""
+        self.summarized_messages = 0
+        self._token_counts = []
+        self._window_tokens = 0
@@ -1,14 +1,15 @@
-import pandas as pd
-import numpy as np
 import os
+import sys
 from datetime import datetime
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data"))
+from dataset_io import read_dataset, write_dataset
+
 RAW_CSV_PATH = "/Users/mousuf/ProgProj/oss-hackathon/OssCode/data/processed/cpu_benchmarks_v3_cleaned_2025-09-08_20-52-44.csv"
 PROCESSED_DIR = "/Users/mousuf/ProgProj/oss-hackathon/OssCode/data/processed"
-os.makedirs(PROCESSED_DIR, exist_ok=True)
 
-def main():
-    df = pd.read_csv(RAW_CSV_PATH)
+def main(input_csv=RAW_CSV_PATH, output_csv=None):
+    df = read_dataset(input_csv)
 
     current_year = datetime.now().year
 
@@ -29,14 +30,17 @@ def main():
 
     # df.to_csv(RAW_CSV_PATH, index=False)
 
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    csv_version_path = os.path.join(PROCESSED_DIR, f"cpu_benchmarks_v4_feature_engineering_{timestamp}.csv")
-    df.to_csv(csv_version_path, index=False)
+    if output_csv is None:
+        os.makedirs(PROCESSED_DIR, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        output_csv = os.path.join(PROCESSED_DIR, f"cpu_benchmarks_v4_feature_engineering_{timestamp}.arrow")
+    csv_version_path = output_csv
+    write_dataset(df, csv_version_path)
     print(f"Version 4 (feature engineering) saved to: {csv_version_path}")
 
     print(f"============================")
     print(f"============================")
-    print(f"Head 10: {df.hsead(10)}")
+    print(f"Head 10: {df.head(10)}")
 
     print(f"Number of rows: {df.shape[0]}")
     print(f"Number of columns: {df.shape[1]}")
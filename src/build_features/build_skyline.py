@@ -0,0 +1,129 @@
+import pandas as pd
+import numpy as np
+import json
+import os
+import re
+import sys
+from itertools import combinations
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data"))
+from dataset_io import read_dataset
+
+FINAL_PATH = "data/final/cpu_benchmarks_final.arrow"
+SKYLINE_PATH = "data/final/cpu_skyline_index.json"
+SKYLINE_VERSION = 1
+
+# Quantities users optimise ("best", "fastest", "most efficient") ...
+TARGETS = ["cpu_mark", "thread_mark", "threadMark_per_watt", "thread_mark_per_dollar"]
+# ... and the budgets they constrain ("under $2000", "below 150 W")
+CONSTRAINTS = ["price", "TDP"]
+
+# One objective set per target and non-empty subset of constraints, e.g.
+# "cpu_mark|price,TDP" = maximise cpu_mark, minimise price and TDP.
+OBJECTIVE_SETS = {
+    f"{target}|{','.join(subset)}": {target: "max", **{col: "min" for col in subset}}
+    for target in TARGETS
+    for size in range(1, len(CONSTRAINTS) + 1)
+    for subset in combinations(CONSTRAINTS, size)
+}
+
+PARTITION_COLUMNS = ["category", "socket", "brand_name"]
+MAX_LAYERS = 5
+RECORD_COLUMNS = ["cpu_id", "brand_name", "cpu_model", "category", "socket"]
+
+def partition_value(col, value):
+    """Partition key spelling: sockets ignore case, spaces and hyphens ("LGA 2011" == "LGA2011")."""
+    value = str(value)
+    return re.sub(r"[\s\-_]", "", value.lower()) if col == "socket" else value.lower()
+
+def pareto_layers(values, max_layers=MAX_LAYERS, block=1024):
+    """Peel successive Pareto fronts of `values` (rows x objectives, all minimised).
+
+    Returns a list of index arrays, front 1 first. Dominance is tested in
+    row blocks so memory stays at block x n x objectives booleans.
+    """
+    remaining = np.arange(len(values))
+    layers = []
+    while len(remaining) and len(layers) < max_layers:
+        V = values[remaining]
+        dominated = np.zeros(len(V), dtype=bool)
+        for start in range(0, len(V), block):
+            chunk = V[start:start + block, None, :]
+            no_worse = (V[None, :, :] <= chunk).all(axis=2)
+            better = (V[None, :, :] < chunk).any(axis=2)
+            dominated[start:start + block] = (no_worse & better).any(axis=1)
+        layers.append(remaining[~dominated])
+        remaining = remaining[dominated]
+    return layers
+
+def partitions(df):
+    """Row masks for the whole table and every combination of category / socket / brand values."""
+    keys = {"all": np.ones(len(df), dtype=bool)}
+    normalized = {
+        col: df[col].fillna("unknown").map(lambda v, col=col: partition_value(col, v))
+        for col in PARTITION_COLUMNS if col in df.columns
+    }
+    for size in range(1, len(normalized) + 1):
+        for cols in combinations(normalized, size):
+            groups = pd.DataFrame({col: normalized[col] for col in cols}).groupby(list(cols)).indices
+            for values, rows in groups.items():
+                values = values if isinstance(values, tuple) else (values,)
+                if "unknown" in values:
+                    continue
+                mask = np.zeros(len(df), dtype=bool)
+                mask[rows] = True
+                keys["|".join(f"{col}={value}" for col, value in zip(cols, values))] = mask
+    return keys
+
+def build_index(df, objective_sets=OBJECTIVE_SETS, max_layers=MAX_LAYERS):
+    parts = partitions(df)
+    fronts = {}
+    used = set()
+    for name, objectives in objective_sets.items():
+        cols = list(objectives)
+        values = np.column_stack([
+            df[col].to_numpy(dtype=np.float64, na_value=np.nan) * (-1.0 if direction == "max" else 1.0)
+            for col, direction in objectives.items()
+        ])
+        complete = ~np.isnan(values).any(axis=1)
+        fronts[name] = {}
+        for key, mask in parts.items():
+            rows = np.flatnonzero(mask & complete)
+            if len(rows) == 0:
+                continue
+            layers = [rows[layer].tolist() for layer in pareto_layers(values[rows], max_layers)]
+            fronts[name][key] = layers
+            used.update(i for layer in layers for i in layer)
+        print(f"{name}: {len(fronts[name])} partitions, all-CPU front of {len(fronts[name]['all'][0])} ({', '.join(cols)})")
+
+    value_columns = sorted({col for objectives in objective_sets.values() for col in objectives})
+    records = {}
+    for i in sorted(used):
+        record = {}
+        for col in RECORD_COLUMNS + value_columns:
+            if col in df.columns:
+                value = df[col].iloc[i]
+                record[col] = None if pd.isna(value) else (value.item() if hasattr(value, "item") else value)
+        records[str(i)] = record
+    return {
+        "version": SKYLINE_VERSION,
+        "max_layers": max_layers,
+        "objectives": objective_sets,
+        "fronts": fronts,
+        "rows": records,
+    }
+
+def main(input_csv=FINAL_PATH, output_json=SKYLINE_PATH, max_layers=MAX_LAYERS):
+    df = read_dataset(input_csv)
+
+    index = build_index(df, OBJECTIVE_SETS, max_layers)
+
+    os.makedirs(os.path.dirname(output_json) or ".", exist_ok=True)
+    tmp_path = output_json + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, output_json)
+    print(f"\nSkyline index ({len(index['rows'])} CPUs on the first {max_layers} fronts) saved to: {output_json}")
+
+if __name__ == "__main__":
+    main()
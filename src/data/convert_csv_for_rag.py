@@ -1,10 +1,47 @@
 import pandas as pd
+import numpy as np
 import os
 from datetime import datetime
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
+from dataset_io import iter_dataset
 
 INPUT_CSV = "/Users/mousuf/ProgProj/oss-hackathon/OssCode/data/final/cpu_benchmarks_final.csv"   # your final dataset
 OUTPUT_CSV = "/Users/mousuf/ProgProj/oss-hackathon/OssCode/data/documents/"        # new file with text chunks
 
+# Columns rendered by row_to_text; only these are loaded from the dataset
+TEXT_COLUMNS = [
+    "brand_name", "cpu_model", "price", "cpu_mark", "cpu_value", "thread_mark", "thread_value",
+    "TDP", "power_performance", "cores", "socket", "category", "price_per_core",
+    "thread_mark_per_dollar", "thread_efficiency", "threadMark_per_watt",
+    "thermal_performance_ratio", "age", "test_date",
+]
+
+# Columns format_value renders without a decimal point when the value is whole
+INTEGER_COLUMNS = ["age", "cores", "test_date"]
+
+# Rows rendered per batch when streaming the dataset to text
+CHUNK_ROWS = 100_000
+
+# The row_to_text sentence with one placeholder per TEXT_COLUMNS entry, in order
+TEXT_TEMPLATE = (
+    "The brand_name is %s, "
+    "cpu_model is %s at the price of %s. "
+    "The cpu_mark is %s. "
+    "The cpu_value is %s. "
+    "The thread_mark is %s. "
+    "The thread_value is %s. "
+    "The TDP is %s. "
+    "The power_performance is operating at %s. "
+    "The number of cores are %s. "
+    "The socket this CPU is suitable for is %s. "
+    "This cpu is for %s. "
+    "The price_per_core is %s and the thread_mark_per_dollar is %s. "
+    "The thread_efficiency is %s. "
+    "The threadMark_per_watt is %s. "
+    "The thermal_performance_ratio is %s. "
+    "The age of the cpu is %s and it was tested in the year %s."
+)
+
 def format_value(value, col):
     """Format values based on column rules."""
     if pd.isna(value) or value == "":
@@ -39,20 +76,52 @@ def row_to_text(row):
         f"The age of the cpu is {format_value(row['age'], 'age')} and it was tested in the year {format_value(row['test_date'], 'test_date')}."
     )
 
-def main():
-    # Load dataset
-    df = pd.read_csv(INPUT_CSV)
+def format_column(values, col):
+    """Apply format_value to a whole column at once; returns an object array of strings.
+
+    Each distinct value is formatted once and broadcast back by its factorized
+    code. Floats are factorized on their bit pattern so that, e.g., 0.0 and
+    -0.0 keep their own spelling.
+    """
+    if is_numeric_dtype(values) and not is_bool_dtype(values):
+        nums = values.to_numpy(dtype=np.float64, na_value=np.nan)
+        codes, uniques = pd.factorize(nums.view(np.int64))
+        uniques = uniques.view(np.float64)
+        if col in INTEGER_COLUMNS:
+            labels = [str(int(num)) if num.is_integer() else str(num) for num in uniques.tolist()]
+        else:
+            labels = list(map(str, uniques.tolist()))
+        labels = np.array(labels + ["Null"], dtype=object)
+        codes[np.isnan(nums)] = -1
+        return labels[codes]
+    # pd.factorize gives missing values code -1, which picks the trailing "Null"
+    codes, uniques = pd.factorize(values)
+    labels = np.array([format_value(value, col) for value in uniques] + ["Null"], dtype=object)
+    return labels[codes]
+
+def render_text(df):
+    """Vectorized row_to_text: the same sentences, built column by column."""
+    columns = [format_column(df[col], col) for col in TEXT_COLUMNS]
+    return [TEXT_TEMPLATE % values for values in zip(*columns)]
 
-    # Convert rows to text chunks
-    text_chunks = df.apply(row_to_text, axis=1).tolist()
+def iter_text_chunks(input_csv=INPUT_CSV, chunk_rows=CHUNK_ROWS):
+    """Yield the text chunks for the dataset in lists of at most `chunk_rows` sentences."""
+    for df in iter_dataset(input_csv, columns=TEXT_COLUMNS, chunk_rows=chunk_rows):
+        yield render_text(df)
 
-    # Save to new CSV with timestamp
-    df_text = pd.DataFrame({"cpu_description": text_chunks})
-    os.makedirs(OUTPUT_CSV, exist_ok=True)
+def main(input_csv=INPUT_CSV, output_csv=None, chunk_rows=CHUNK_ROWS):
+    if output_csv is None:
+        os.makedirs(OUTPUT_CSV, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        output_csv = os.path.join(OUTPUT_CSV, f"cpu_text_chunks_{timestamp}.csv")
 
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    output_csv = os.path.join(OUTPUT_CSV, f"cpu_text_chunks_{timestamp}.csv")
-    df_text.to_csv(output_csv, index=False)
+    # Stream the dataset through the vectorized renderer, appending each batch to the CSV.
+    # Every sentence contains a comma, so pandas' to_csv would always quote it;
+    # writing the quoted lines directly gives the same bytes without the csv writer.
+    with open(output_csv, "w", newline="", encoding="utf-8") as f:
+        f.write("cpu_description" + os.linesep)
+        for text_chunks in iter_text_chunks(input_csv, chunk_rows):
+            f.write("".join(['"' + text.replace('"', '""') + '"' + os.linesep for text in text_chunks]))
 
     print(f"\nCPU text chunks saved to: {output_csv}")
 
@@ -0,0 +1,143 @@
+"""
+cpu_identity.py
+
+Stable integer IDs for CPUs across dataset versions.
+
+The raw export names a CPU in one `cpu_name` column ("AMD EPYC 7763"), later
+versions split it into `brand_name` + `cpu_model`. Both are reduced to one
+canonical form (Unicode NFKC, case-folded, trademark marks and core-count
+prefixes such as "Dual-Core" dropped, whitespace collapsed) and looked up in a
+persistent ID map. IDs are never reassigned, so a CPU keeps its ID in every
+version and stages join on a compact int32 key instead of strings.
+
+The map is (re)built by the `cpu_ids` pipeline stage; new names are appended:
+    python src/data/cpu_identity.py
+"""
+
+import json
+import os
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from dataset_io import RAW_SCHEMA, read_dataset
+
+V1_CSV_PATH = "data/processed/cpu_benchmarks_v1_2025-09-08_17-34-24.csv"
+V2_CSV_PATH = "data/processed/cpu_benchmarks_v2_server_2025-09-08_17-34-24.csv"
+ID_MAP_PATH = "data/cpu_id_map.json"
+ID_MAP_VERSION = 1
+
+MISSING_ID = -1
+
+TRADEMARK_RE = re.compile(r"\((?:r|tm|c)\)|[™®©]", re.IGNORECASE)
+CORE_PREFIX_RE = re.compile(r"^(?:single|dual|triple|quad|six|eight|ten|twelve|sixteen)-core\s+")
+
+
+def canonical_name(name):
+    """Canonical spelling of a CPU name, e.g. "Dual-Core AMD Opteron(tm) 1220  SE" -> "amd opteron 1220 se"."""
+    name = TRADEMARK_RE.sub(" ", str(name))
+    name = unicodedata.normalize("NFKC", name).casefold()
+    name = " ".join(name.split())
+    return CORE_PREFIX_RE.sub("", name)
+
+
+def cpu_names(df):
+    """Full CPU names of a dataset: `cpu_name` in the raw export, brand + model afterwards."""
+    if "cpu_name" in df.columns:
+        return df["cpu_name"]
+    return df["brand_name"] + " " + df["cpu_model"]
+
+
+def canonical_names(names):
+    """canonical_name for a whole Series, computed once per distinct value. Missing names stay None."""
+    codes, uniques = pd.factorize(names)
+    canonical = np.array([canonical_name(name) for name in uniques] + [None], dtype=object)
+    return canonical[codes]
+
+
+class CPUIdentityMap:
+    """Persistent canonical name -> integer ID map."""
+
+    def __init__(self, ids=None):
+        self.ids = dict(ids or {})
+
+    @classmethod
+    def load(cls, path=ID_MAP_PATH):
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        if payload.get("version") != ID_MAP_VERSION:
+            raise ValueError(f"{path} has ID map version {payload.get('version')}, expected {ID_MAP_VERSION}")
+        return cls(payload["ids"])
+
+    def save(self, path=ID_MAP_PATH):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": ID_MAP_VERSION, "ids": self.ids}, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, path)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def assign(self, names):
+        """Give every unseen name an ID; returns how many were added.
+
+        New names are numbered in sorted canonical order, so the result does
+        not depend on row order.
+        """
+        new = sorted({name for name in canonical_names(names) if name is not None} - self.ids.keys())
+        next_id = max(self.ids.values(), default=-1) + 1
+        for offset, name in enumerate(new):
+            self.ids[name] = next_id + offset
+        return len(new)
+
+    def lookup(self, names):
+        """int32 IDs for `names`; MISSING_ID where a name is missing or not in the map."""
+        codes, uniques = pd.factorize(canonical_names(names))
+        ids = np.array([self.ids.get(name, MISSING_ID) for name in uniques] + [MISSING_ID], dtype=np.int32)
+        return ids[codes]
+
+    def id_column(self, df):
+        """Nullable Int32 `cpu_id` values for the rows of a dataset."""
+        ids = self.lookup(cpu_names(df))
+        return pd.array(np.where(ids == MISSING_ID, None, ids), dtype="Int32")
+
+
+def match_rows(left_ids, right_ids):
+    """For each left ID, the position of the first right row with the same ID, or -1.
+
+    IDs are small dense integers, so the right side becomes a direct-address
+    table (ID -> row) and the join is one gather: one row per left row,
+    whatever the duplicates on the right, and no string hashing.
+    """
+    left_ids = np.asarray(left_ids, dtype=np.int32)
+    right_ids = np.asarray(right_ids, dtype=np.int32)
+    size = int(max(left_ids.max(initial=0), right_ids.max(initial=0))) + 2
+    table = np.full(size, -1, dtype=np.int64)
+    rows = np.flatnonzero(right_ids != MISSING_ID)
+    # Assign in reverse so the first occurrence of a duplicated ID wins
+    table[right_ids[rows[::-1]]] = rows[::-1]
+    # MISSING_ID (-1) indexes the last slot, which no real ID occupies
+    return table[left_ids]
+
+
+def main(v1_csv=V1_CSV_PATH, v2_csv=V2_CSV_PATH, id_map_path=ID_MAP_PATH):
+    id_map = CPUIdentityMap.load(id_map_path)
+    before = len(id_map)
+    sources = [
+        (v1_csv, read_dataset(v1_csv, columns=["cpu_name"], schema=RAW_SCHEMA)),
+        (v2_csv, read_dataset(v2_csv, columns=["brand_name", "cpu_model"])),
+    ]
+    for path, df in sources:
+        added = id_map.assign(cpu_names(df))
+        distinct = len(np.unique(id_map.lookup(cpu_names(df))))
+        print(f"{path}: {len(df)} rows, {distinct} distinct CPUs, {added} new IDs")
+    id_map.save(id_map_path)
+    print(f"\nCPU ID map saved to: {id_map_path} ({len(id_map)} IDs, {len(id_map) - before} new)")
+
+
+if __name__ == "__main__":
+    main()
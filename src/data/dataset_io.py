@@ -0,0 +1,185 @@
+"""
+dataset_io.py
+
+Read and write the versioned CPU benchmark datasets in a columnar format.
+
+Datasets are stored as uncompressed Arrow IPC files (`.arrow`). Loading one
+memory-maps the file, so reading is zero-copy and only the projected columns
+are ever paged in. `.parquet` is supported for archival copies, and `.csv` is
+still read (with the schema applied) so older versions keep working.
+
+Integer columns such as `test_date`, `age` and `cores` keep their integer
+type (nullable where values are missing) instead of turning into floats like
+2022.0.
+
+Convert existing CSV versions:
+    python src/data/dataset_io.py data/processed/*.csv data/featured/*.csv
+"""
+
+import argparse
+import os
+import sys
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Benchmark tables from v2 (server split) through v5 and the final dataset.
+BENCHMARK_SCHEMA = pa.schema([
+    ("cpu_id", pa.int32()),
+    ("brand_name", pa.string()),
+    ("cpu_model", pa.string()),
+    ("price", pa.float64()),
+    ("cpu_mark", pa.int64()),
+    ("cpu_value", pa.float64()),
+    ("thread_mark", pa.int64()),
+    ("thread_value", pa.float64()),
+    ("TDP", pa.float64()),
+    ("power_performance", pa.float64()),
+    ("cores", pa.int32()),
+    ("test_date", pa.int16()),
+    ("socket", pa.string()),
+    ("category", pa.string()),
+    ("price_per_core", pa.float64()),
+    ("thread_mark_per_dollar", pa.float64()),
+    ("thread_efficiency", pa.float64()),
+    ("threadMark_per_watt", pa.float64()),
+    ("thermal_performance_ratio", pa.float64()),
+    ("age", pa.int16()),
+])
+
+# v1 raw export: one combined name column and a free-text power_performance.
+RAW_SCHEMA = pa.schema([
+    ("cpu_name", pa.string()),
+    ("price", pa.float64()),
+    ("cpu_mark", pa.int64()),
+    ("cpu_value", pa.float64()),
+    ("thread_mark", pa.int64()),
+    ("thread_value", pa.float64()),
+    ("TDP", pa.float64()),
+    ("power_performance", pa.string()),
+    ("cores", pa.int32()),
+    ("test_date", pa.int16()),
+    ("socket", pa.string()),
+    ("category", pa.string()),
+])
+
+# Scaled ML-ready features are all floats apart from the identifying columns.
+ML_READY_SCHEMA = pa.schema(
+    [(f.name, f.type if pa.types.is_string(f.type) or f.name in ("cpu_id", "test_date") else pa.float64())
+     for f in BENCHMARK_SCHEMA]
+)
+
+PANDAS_INT_TYPES = {
+    pa.int16(): pd.Int16Dtype(),
+    pa.int32(): pd.Int32Dtype(),
+    pa.int64(): pd.Int64Dtype(),
+}
+
+
+def schema_for(df, schema=None):
+    """Arrow schema for `df`: declared types for known columns, inferred types for the rest."""
+    fields = []
+    for col in df.columns:
+        if schema is not None and col in schema.names:
+            fields.append(schema.field(col))
+        else:
+            fields.append(pa.Schema.from_pandas(df[[col]], preserve_index=False).field(col))
+    return pa.schema(fields)
+
+
+def _to_pandas(table):
+    return table.to_pandas(types_mapper=PANDAS_INT_TYPES.get)
+
+
+def read_table(path, columns=None):
+    """Load a dataset as an Arrow table, projecting `columns` if given.
+
+    For `.arrow` files the table references the memory-mapped file directly
+    (zero-copy); unselected columns are never read from disk.
+    """
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix in (".arrow", ".feather", ".ipc"):
+        source = pa.memory_map(path, "r")
+        table = pa.ipc.open_file(source).read_all()
+        return table.select(columns) if columns is not None else table
+    if suffix == ".parquet":
+        return pq.read_table(path, columns=columns, memory_map=True)
+    raise ValueError(f"read_table does not support {suffix} files; use read_dataset for CSV")
+
+
+def read_dataset(path, columns=None, schema=BENCHMARK_SCHEMA):
+    """Load a dataset version as a DataFrame with typed columns.
+
+    `.arrow` / `.parquet` files carry their own schema. CSV files are parsed
+    with `schema` applied so integer columns do not degrade to floats.
+    """
+    if path.lower().endswith(".csv"):
+        df = pd.read_csv(path, usecols=columns)
+        if columns is not None:
+            df = df[columns]
+        return _to_pandas(pa.Table.from_pandas(df, schema=schema_for(df, schema), preserve_index=False))
+    return _to_pandas(read_table(path, columns))
+
+
+def iter_dataset(path, columns=None, schema=BENCHMARK_SCHEMA, chunk_rows=100_000):
+    """Yield a dataset as DataFrames of at most `chunk_rows` rows, in file order.
+
+    Memory stays bounded by the chunk size: `.arrow` batches are sliced from
+    the memory-mapped file, `.parquet` and `.csv` are read incrementally.
+    """
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix == ".csv":
+        for df in pd.read_csv(path, usecols=columns, chunksize=chunk_rows):
+            if columns is not None:
+                df = df[columns]
+            yield _to_pandas(pa.Table.from_pandas(df, schema=schema_for(df, schema), preserve_index=False))
+        return
+    if suffix == ".parquet":
+        batches = pq.ParquetFile(path, memory_map=True).iter_batches(batch_size=chunk_rows, columns=columns)
+    else:
+        batches = read_table(path, columns).to_batches(max_chunksize=chunk_rows)
+    for batch in batches:
+        yield _to_pandas(pa.Table.from_batches([batch]))
+
+
+def write_dataset(df, path, schema=BENCHMARK_SCHEMA):
+    """Write a DataFrame as `.arrow` (default), `.parquet` or `.csv`, enforcing `schema`.
+
+    Raises if a column cannot be cast losslessly to its declared type.
+    """
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix == ".csv":
+        df.to_csv(path, index=False)
+        return path
+    table = pa.Table.from_pandas(df, schema=schema_for(df, schema), preserve_index=False)
+    if suffix == ".parquet":
+        pq.write_table(table, path)
+    else:
+        tmp_path = path + ".tmp"
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp_path, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert CSV dataset versions to Arrow files.")
+    parser.add_argument("paths", nargs="+", help="CSV files to convert (written next to the source as .arrow).")
+    parser.add_argument("--schema", choices=["benchmark", "raw", "ml_ready"], default="benchmark")
+    args = parser.parse_args()
+
+    schema = {"benchmark": BENCHMARK_SCHEMA, "raw": RAW_SCHEMA, "ml_ready": ML_READY_SCHEMA}[args.schema]
+    for path in args.paths:
+        if not path.lower().endswith(".csv"):
+            print(f"Skipping {path}: not a CSV file", file=sys.stderr)
+            continue
+        df = read_dataset(path, schema=schema)
+        out_path = os.path.splitext(path)[0] + ".arrow"
+        write_dataset(df, out_path, schema=schema)
+        print(f"{path} -> {out_path} ({df.shape[0]} rows, {df.shape[1]} columns)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+fitted_scalers.py
+
+Fitted parameters of the per-column scalers used by prepare_ml_data, saved as a
+versioned JSON artifact so new CPUs can be scaled exactly like the training
+data without refitting.
+
+Every scaler reduces to an affine map per column,
+
+    scaled = (x - center) / scale * mul + add
+
+(Robust/Standard use center/scale, MinMax uses mul/add, matching scikit-learn's
+own arithmetic), so transforming any number of rows is one NumPy expression on
+a single matrix.
+
+StandardScaler and MinMaxScaler statistics can be updated incrementally
+(streaming mean/variance, running min/max). RobustScaler's median and IQR
+cannot be updated from summaries, so those columns keep their fitted values
+until the next full refit.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import MinMaxScaler, RobustScaler, StandardScaler
+
+SCALERS_VERSION = 1
+
+SCALER_TYPES = {
+    "RobustScaler": RobustScaler,
+    "StandardScaler": StandardScaler,
+    "MinMaxScaler": MinMaxScaler,
+}
+
+
+def _nonzero(scale):
+    """Replace zero scales by 1, as scikit-learn does for constant columns."""
+    return np.where(scale == 0.0, 1.0, scale)
+
+
+def _column_stats(kind, scaler):
+    """The statistics needed to rebuild (and, where possible, update) one fitted scaler."""
+    if kind == "RobustScaler":
+        return {"center": float(scaler.center_[0]), "scale": float(scaler.scale_[0])}
+    if kind == "StandardScaler":
+        return {
+            "n": float(np.atleast_1d(scaler.n_samples_seen_)[0]),
+            "mean": float(scaler.mean_[0]),
+            "var": float(scaler.var_[0]),
+        }
+    return {"min": float(scaler.data_min_[0]), "max": float(scaler.data_max_[0])}
+
+
+class FittedScalers:
+    """Per-column scaler parameters plus a vectorized transform."""
+
+    def __init__(self, scaling_map, stats, rows=0):
+        self.scaling_map = dict(scaling_map)
+        self.columns = list(scaling_map)
+        self.stats = stats
+        self.rows = rows
+        self._compile()
+
+    @classmethod
+    def fit(cls, df, scaling_map):
+        """Fit one scikit-learn scaler per column, exactly as prepare_ml_data always has."""
+        present = {col: kind for col, kind in scaling_map.items() if col in df.columns}
+        stats = {}
+        for col, kind in present.items():
+            scaler = SCALER_TYPES[kind]().fit(df[[col]])
+            stats[col] = _column_stats(kind, scaler)
+        return cls(present, stats, rows=len(df))
+
+    def _compile(self):
+        """Turn the per-column statistics into the four vectors used by transform_matrix."""
+        n = len(self.columns)
+        self.center, self.scale = np.zeros(n), np.ones(n)
+        self.mul, self.add = np.ones(n), np.zeros(n)
+        for i, col in enumerate(self.columns):
+            kind, stats = self.scaling_map[col], self.stats[col]
+            if kind == "RobustScaler":
+                self.center[i], self.scale[i] = stats["center"], stats["scale"]
+            elif kind == "StandardScaler":
+                self.center[i], self.scale[i] = stats["mean"], _nonzero(np.sqrt(stats["var"]))
+            else:
+                self.mul[i] = 1.0 / _nonzero(stats["max"] - stats["min"])
+                self.add[i] = 0.0 - stats["min"] * self.mul[i]
+
+    def matrix(self, df):
+        """The scaled columns of `df` as one float64 matrix (missing values become NaN)."""
+        return np.column_stack([df[col].to_numpy(dtype=np.float64, na_value=np.nan) for col in self.columns])
+
+    def transform_matrix(self, X):
+        """Scale an (n_rows, n_columns) matrix in the column order of `self.columns`."""
+        return (X - self.center) / self.scale * self.mul + self.add
+
+    def transform(self, df):
+        """Return a copy of `df` with every mapped column scaled."""
+        scaled = self.transform_matrix(self.matrix(df))
+        out = df.copy()
+        out[self.columns] = pd.DataFrame(scaled, index=df.index, columns=self.columns)
+        return out
+
+    def partial_fit(self, df):
+        """Fold new rows into the StandardScaler and MinMaxScaler statistics.
+
+        Means and variances are merged with the parallel (Chan et al.) update
+        and min/max are running values; NaNs are ignored like in scikit-learn.
+        RobustScaler columns are left unchanged.
+        """
+        X = self.matrix(df)
+        for i, col in enumerate(self.columns):
+            kind, stats = self.scaling_map[col], self.stats[col]
+            values = X[:, i][~np.isnan(X[:, i])]
+            if kind == "RobustScaler" or len(values) == 0:
+                continue
+            if kind == "StandardScaler":
+                n_a, n_b = stats["n"], float(len(values))
+                mean_b, var_b = float(values.mean()), float(values.var())
+                n = n_a + n_b
+                delta = mean_b - stats["mean"]
+                m2 = stats["var"] * n_a + var_b * n_b + delta * delta * n_a * n_b / n
+                stats.update(n=n, mean=stats["mean"] + delta * n_b / n, var=m2 / n)
+            else:
+                stats.update(min=min(stats["min"], float(values.min())), max=max(stats["max"], float(values.max())))
+        self.rows += len(df)
+        self._compile()
+        return self
+
+    def save(self, path):
+        payload = {
+            "version": SCALERS_VERSION,
+            "rows": self.rows,
+            "scalers": self.scaling_map,
+            "stats": self.stats,
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        if payload.get("version") != SCALERS_VERSION:
+            raise ValueError(f"{path} has scaler format version {payload.get('version')}, expected {SCALERS_VERSION}")
+        return cls(payload["scalers"], payload["stats"], rows=payload["rows"])
@@ -1,39 +1,44 @@
 import pandas as pd
 import os
 from datetime import datetime
+from dataset_io import RAW_SCHEMA, read_dataset, write_dataset
+from cpu_identity import ID_MAP_PATH, MISSING_ID, CPUIdentityMap, match_rows
 
 V1_CSV_PATH = "/Users/mousuf/ProgProj/oss-hackathon/OssCode/data/processed/cpu_benchmarks_v1_2025-09-08_17-34-24.csv"  # Original CSV
 LATEST_CSV_PATH = "/Users/mousuf/ProgProj/oss-hackathon/OssCode/data/featured/cpu_benchmarks_v4_feature_engineering_2025-09-08_21-41-12.csv"
 PROCESSED_DIR = "/Users/mousuf/ProgProj/oss-hackathon/OssCode/data/featured"
-os.makedirs(PROCESSED_DIR, exist_ok=True)
 
-def main():
-    df_v1 = pd.read_csv(V1_CSV_PATH)
+def main(latest_csv=LATEST_CSV_PATH, v1_csv=V1_CSV_PATH, output_csv=None, id_map_path=ID_MAP_PATH):
+    # Only the join key and the corrected column are needed from the raw export
+    df_v1 = read_dataset(v1_csv, columns=['cpu_name', 'test_date'], schema=RAW_SCHEMA)
     
-    df_latest = pd.read_csv(LATEST_CSV_PATH)
-    
-    df_latest['cpu_name_full'] = df_latest['brand_name'] + " " + df_latest['cpu_model']
-    
-    df_merged = df_latest.merge(
-    df_v1[['cpu_name', 'test_date']],
-    how='left',
-    left_on='cpu_name_full',
-    right_on='cpu_name'
-    )
-    
-    print("Columns after merge:", df_merged.columns)
+    df_latest = read_dataset(latest_csv)
 
-    if 'test_date_y' in df_merged.columns:
-        df_merged['test_date'] = df_merged['test_date_y']
+    # Join on the integer CPU ID (canonical name) instead of the raw name strings
+    id_map = CPUIdentityMap.load(id_map_path)
+    if 'cpu_id' not in df_latest.columns:
+        df_latest.insert(0, 'cpu_id', id_map.id_column(df_latest))
+    v1_ids = id_map.lookup(df_v1['cpu_name'])
+    positions = match_rows(df_latest['cpu_id'].fillna(MISSING_ID).to_numpy(), v1_ids)
+    unmatched = int((positions < 0).sum())
+    if unmatched:
+        print(f"Warning: {unmatched} rows have no entry in {v1_csv}; their test_date is left empty")
 
-    df_merged.drop(columns=['cpu_name_full', 'cpu_name', 'test_date_y'] if 'test_date_y' in df_merged.columns else ['cpu_name_full', 'cpu_name'], inplace=True)
+    # The raw export's test_date replaces the placeholder one
+    df_merged = df_latest.drop(columns=['test_date'], errors='ignore')
+    df_merged['test_date'] = pd.api.extensions.take(df_v1['test_date'].array, positions, allow_fill=True)
+    
+    print("Columns after merge:", df_merged.columns)
     
     current_year = datetime.now().year
     df_merged['age'] = current_year - df_merged['test_date']
     
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    NEW_CSV = os.path.join(PROCESSED_DIR, f"cpu_benchmarks_v5_corrected_testdate_{timestamp}.csv")
-    df_merged.to_csv(NEW_CSV, index=False)
+    if output_csv is None:
+        os.makedirs(PROCESSED_DIR, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        output_csv = os.path.join(PROCESSED_DIR, f"cpu_benchmarks_v5_corrected_testdate_{timestamp}.arrow")
+    NEW_CSV = output_csv
+    write_dataset(df_merged, NEW_CSV)
     print(f"\nVersion 5 (corrected test_date) saved to: {NEW_CSV}")
 
     print(df_merged[['brand_name', 'cpu_model', 'test_date', 'age']].head(10))
@@ -1,14 +1,46 @@
-import pandas as pd
 import os
 from datetime import datetime
-from sklearn.preprocessing import StandardScaler, RobustScaler, MinMaxScaler
+from dataset_io import ML_READY_SCHEMA, read_dataset, write_dataset
+from fitted_scalers import FittedScalers
 
 FEATURED_CSV = "/Users/mousuf/ProgProj/oss-hackathon/OssCode/data/featured/cpu_benchmarks_v5_corrected_testdate_2025-09-08_23-34-43.csv"
 ML_DIR = "/Users/mousuf/ProgProj/oss-hackathon/OssCode/data/ml_ready"
-os.makedirs(ML_DIR, exist_ok=True)
+SCALERS_PATH = "data/ml_ready/cpu_scalers.json"
 
-def main():
-    df = pd.read_csv(FEATURED_CSV)
+SCALING_MAP = {
+    "price": "RobustScaler",
+    "TDP": "RobustScaler",
+    "cores": "RobustScaler",
+    "price_per_core": "RobustScaler",
+    "threadMark_per_watt": "RobustScaler",
+
+    "cpu_mark": "StandardScaler",
+    "cpu_value": "StandardScaler",
+    "thread_mark": "StandardScaler",
+    "thread_value": "StandardScaler",
+    "power_performance": "StandardScaler",
+    "thread_mark_per_dollar": "StandardScaler",
+    "thermal_performance_ratio": "StandardScaler",
+
+    "thread_efficiency": "MinMaxScaler",
+    "age": "MinMaxScaler"
+}
+
+def scale_new_cpus(df_new, scalers_path=SCALERS_PATH, update=False):
+    """Scale new CPU rows with the saved parameters: one matrix operation, no refit.
+
+    With `update=True` the rows are also folded into the incremental
+    (StandardScaler / MinMaxScaler) statistics and the artifact is saved.
+    The rows are scaled with the parameters in effect before the update.
+    """
+    scalers = FittedScalers.load(scalers_path)
+    df_scaled = scalers.transform(df_new)
+    if update:
+        scalers.partial_fit(df_new).save(scalers_path)
+    return df_scaled
+
+def main(input_csv=FEATURED_CSV, output_csv=None, scalers_path=SCALERS_PATH, refit=True):
+    df = read_dataset(input_csv)
 
     print("======================")
     print("Head 10 rows of raw data:")
@@ -22,41 +54,26 @@ def main():
     print(df.describe())
     print("======================")
 
-    scalers = {
-        "RobustScaler": RobustScaler(),
-        "StandardScaler": StandardScaler(),
-        "MinMaxScaler": MinMaxScaler()
-    }
-
-    scaling_map = {
-        "price": "RobustScaler",
-        "TDP": "RobustScaler",
-        "cores": "RobustScaler",
-        "price_per_core": "RobustScaler",
-        "threadMark_per_watt": "RobustScaler",
-
-        "cpu_mark": "StandardScaler",
-        "cpu_value": "StandardScaler",
-        "thread_mark": "StandardScaler",
-        "thread_value": "StandardScaler",
-        "power_performance": "StandardScaler",
-        "thread_mark_per_dollar": "StandardScaler",
-        "thermal_performance_ratio": "StandardScaler",
-
-        "thread_efficiency": "MinMaxScaler",
-        "age": "MinMaxScaler"
-    }
+    # Fit and persist the scaler parameters, or reuse the saved ones (transform only)
+    if refit or not os.path.exists(scalers_path):
+        scalers = FittedScalers.fit(df, SCALING_MAP)
+        os.makedirs(os.path.dirname(scalers_path) or ".", exist_ok=True)
+        scalers.save(scalers_path)
+        print(f"Fitted scalers saved to: {scalers_path}")
+    else:
+        scalers = FittedScalers.load(scalers_path)
+        print(f"Using fitted scalers from: {scalers_path} (fitted on {scalers.rows} rows)")
 
-    df_scaled = df.copy()
-    for col, scaler_name in scaling_map.items():
-        if col in df.columns:
-            scaler = scalers[scaler_name]
-            df_scaled[[col]] = scaler.fit_transform(df[[col]])
-            print(f"Applied {scaler_name} to {col}")
+    df_scaled = scalers.transform(df)
+    for col in scalers.columns:
+        print(f"Applied {scalers.scaling_map[col]} to {col}")
 
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    ML_CSV = os.path.join(ML_DIR, f"cpu_benchmarks_v4_ml_ready_scaled_custom_{timestamp}.csv")
-    df_scaled.to_csv(ML_CSV, index=False)
+    if output_csv is None:
+        os.makedirs(ML_DIR, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        output_csv = os.path.join(ML_DIR, f"cpu_benchmarks_v4_ml_ready_scaled_custom_{timestamp}.arrow")
+    ML_CSV = output_csv
+    write_dataset(df_scaled, ML_CSV, schema=ML_READY_SCHEMA)
     print(f"\nVersion 4 (ML-ready scaled custom) saved to: {ML_CSV}")
 
 
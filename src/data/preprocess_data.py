@@ -1,14 +1,17 @@
 import pandas as pd
-import numpy as np
 import os
 from datetime import datetime
+from dataset_io import read_dataset, write_dataset
+from cpu_identity import ID_MAP_PATH, CPUIdentityMap
 
 RAW_CSV_PATH = "/Users/mousuf/ProgProj/oss-hackathon/OssCode/data/processed/cpu_benchmarks_v2_server_2025-09-08_17-34-24.csv"
 PROCESSED_DIR = "/Users/mousuf/ProgProj/oss-hackathon/OssCode/data/processed"
-os.makedirs(PROCESSED_DIR, exist_ok=True)
 
-def main():
-    df = pd.read_csv(RAW_CSV_PATH)
+def main(input_csv=RAW_CSV_PATH, output_csv=None, id_map_path=ID_MAP_PATH):
+    df = read_dataset(input_csv)
+
+    # Stable integer key used by later stages to join against other versions
+    df.insert(0, 'cpu_id', CPUIdentityMap.load(id_map_path).id_column(df))
     
     df['test_date'] = pd.to_datetime(df['test_date'], errors='coerce').dt.year
 
@@ -25,9 +28,12 @@ def main():
 
     # df.to_csv(RAW_CSV_PATH, index=False)
 
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    csv_version_path = os.path.join(PROCESSED_DIR, f"cpu_benchmarks_v3_cleaned_{timestamp}.csv")
-    df.to_csv(csv_version_path, index=False)
+    if output_csv is None:
+        os.makedirs(PROCESSED_DIR, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        output_csv = os.path.join(PROCESSED_DIR, f"cpu_benchmarks_v3_cleaned_{timestamp}.arrow")
+    csv_version_path = output_csv
+    write_dataset(df, csv_version_path)
     print(f"Version 3 (cleaned) saved to: {csv_version_path}")
 
     print(f"============================")
@@ -0,0 +1,272 @@
+"""
+run_pipeline.py
+
+Run the dataset build (cpu_ids -> preprocess -> build_features -> fix_test_date -> final ->
+skyline / prepare_ml_data / convert_csv_for_rag) as a cached DAG.
+
+Each stage is fingerprinted from its code, its parameters and the content of
+its inputs. A stage whose fingerprint and outputs are unchanged since the last
+run is skipped. Inputs can declare the columns a stage reads, so an edit to any
+other column does not invalidate it. When a stage re-runs but writes
+byte-identical output, its dependents are skipped as well. Stages whose
+dependencies are done run in parallel.
+
+Run from the repository root:
+    python src/data/run_pipeline.py
+    python src/data/run_pipeline.py --dry-run
+    python src/data/run_pipeline.py --force fix_test_date --jobs 2
+"""
+
+import argparse
+import hashlib
+import importlib.util
+import inspect
+import json
+import os
+import shutil
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+from cpu_identity import ID_MAP_PATH
+from dataset_io import RAW_SCHEMA, read_dataset
+
+STATE_PATH = "data/pipeline_state.json"
+CURRENT_YEAR = datetime.now().year
+# Published CSV layout; the Arrow file additionally keeps cpu_id for the downstream stages
+FINAL_CSV_COLUMNS = [
+    "brand_name", "cpu_model", "price", "cpu_mark", "cpu_value", "thread_mark", "thread_value", "TDP",
+    "power_performance", "cores", "socket", "category", "price_per_core", "thread_mark_per_dollar",
+    "thread_efficiency", "threadMark_per_watt", "thermal_performance_ratio", "age", "test_date",
+]
+
+
+def publish_final(input_path, output_arrow, output_csv):
+    """Publish the latest corrected version as the final dataset (Arrow plus a CSV export)."""
+    shutil.copyfile(input_path, output_arrow)
+    read_dataset(output_arrow, columns=FINAL_CSV_COLUMNS).to_csv(output_csv, index=False)
+    print(f"Final dataset published to: {output_arrow} and {output_csv}")
+
+
+# Each stage names the script (or function) to run, the keyword arguments that
+# are input / output paths, and extra parameters. `columns` restricts the input
+# fingerprint to the columns the stage actually reads (parsed with `schemas`
+# for CSV inputs). `salt` covers values the
+# code reads implicitly (the stages compute age from the current year).
+STAGES = {
+    "cpu_ids": {
+        "script": "src/data/cpu_identity.py",
+        "inputs": {
+            "v1_csv": "data/processed/cpu_benchmarks_v1_2025-09-08_17-34-24.csv",
+            "v2_csv": "data/processed/cpu_benchmarks_v2_server_2025-09-08_17-34-24.csv",
+        },
+        "columns": {"v1_csv": ["cpu_name"], "v2_csv": ["brand_name", "cpu_model"]},
+        "schemas": {"v1_csv": RAW_SCHEMA},
+        "outputs": {"id_map_path": ID_MAP_PATH},
+    },
+    "preprocess": {
+        "script": "src/data/preprocess_data.py",
+        "inputs": {
+            "input_csv": "data/processed/cpu_benchmarks_v2_server_2025-09-08_17-34-24.csv",
+            "id_map_path": ID_MAP_PATH,
+        },
+        "outputs": {"output_csv": "data/processed/cpu_benchmarks_v3_cleaned.arrow"},
+        "salt": {"current_year": CURRENT_YEAR},
+    },
+    "build_features": {
+        "script": "src/build_features/build_features.py",
+        "inputs": {"input_csv": "data/processed/cpu_benchmarks_v3_cleaned.arrow"},
+        "outputs": {"output_csv": "data/processed/cpu_benchmarks_v4_feature_engineering.arrow"},
+        "salt": {"current_year": CURRENT_YEAR},
+    },
+    "fix_test_date": {
+        "script": "src/data/fix_test_date.py",
+        "inputs": {
+            "latest_csv": "data/processed/cpu_benchmarks_v4_feature_engineering.arrow",
+            "v1_csv": "data/processed/cpu_benchmarks_v1_2025-09-08_17-34-24.csv",
+            "id_map_path": ID_MAP_PATH,
+        },
+        "columns": {"v1_csv": ["cpu_name", "test_date"]},
+        "schemas": {"v1_csv": RAW_SCHEMA},
+        "outputs": {"output_csv": "data/featured/cpu_benchmarks_v5_corrected_testdate.arrow"},
+        "salt": {"current_year": CURRENT_YEAR},
+    },
+    "final": {
+        "function": publish_final,
+        "inputs": {"input_path": "data/featured/cpu_benchmarks_v5_corrected_testdate.arrow"},
+        "outputs": {
+            "output_arrow": "data/final/cpu_benchmarks_final.arrow",
+            "output_csv": "data/final/cpu_benchmarks_final.csv",
+        },
+    },
+    "skyline": {
+        "script": "src/build_features/build_skyline.py",
+        "inputs": {"input_csv": "data/final/cpu_benchmarks_final.arrow"},
+        "outputs": {"output_json": "data/final/cpu_skyline_index.json"},
+    },
+    "prepare_ml_data": {
+        "script": "src/data/prepare_ml_data.py",
+        "inputs": {"input_csv": "data/featured/cpu_benchmarks_v5_corrected_testdate.arrow"},
+        "outputs": {
+            "output_csv": "data/ml_ready/cpu_benchmarks_v4_ml_ready_scaled_custom.arrow",
+            "scalers_path": "data/ml_ready/cpu_scalers.json",
+        },
+    },
+    "convert_csv_for_rag": {
+        "script": "src/data/convert_csv_for_rag.py",
+        "inputs": {"input_csv": "data/final/cpu_benchmarks_final.arrow"},
+        "outputs": {"output_csv": "data/documents/cpu_text_chunks.csv"},
+    },
+}
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def input_hash(path, columns=None, schema=None):
+    """Hash an input file, or only the listed columns of it."""
+    if columns is None:
+        return file_hash(path)
+    kwargs = {"schema": schema} if schema is not None else {}
+    df = read_dataset(path, columns=columns, **kwargs)
+    return hashlib.sha256(df.to_csv(index=False).encode("utf-8")).hexdigest()
+
+
+def code_hash(stage):
+    if "script" in stage:
+        return file_hash(stage["script"])
+    return hashlib.sha256(inspect.getsource(stage["function"]).encode("utf-8")).hexdigest()
+
+
+def fingerprint(stage):
+    payload = {
+        "code": code_hash(stage),
+        "params": stage.get("params", {}),
+        "salt": stage.get("salt", {}),
+        "inputs": {
+            arg: input_hash(path, stage.get("columns", {}).get(arg), stage.get("schemas", {}).get(arg))
+            for arg, path in sorted(stage["inputs"].items())
+        },
+        "outputs": stage["outputs"],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def dependencies(stages):
+    """Map each stage to the stages that produce its inputs."""
+    producers = {path: name for name, stage in stages.items() for path in stage["outputs"].values()}
+    return {
+        name: {producers[path] for path in stage["inputs"].values() if path in producers}
+        for name, stage in stages.items()
+    }
+
+
+def load_state(path=STATE_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state, path=STATE_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def is_current(name, stage, state):
+    recorded = state.get(name)
+    if recorded is None or recorded["fingerprint"] != fingerprint(stage):
+        return False
+    for path in stage["outputs"].values():
+        if not os.path.exists(path) or file_hash(path) != recorded["outputs"].get(path):
+            return False
+    return True
+
+
+def run_stage(name, stage):
+    """Run one stage in a worker process."""
+    kwargs = {**stage["inputs"], **stage["outputs"], **stage.get("params", {})}
+    for path in stage["outputs"].values():
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    if "function" in stage:
+        stage["function"](**kwargs)
+        return name
+    script_dir = os.path.dirname(os.path.abspath(stage["script"]))
+    if script_dir not in sys.path:
+        sys.path.insert(0, script_dir)
+    spec = importlib.util.spec_from_file_location(f"pipeline_stage_{name}", stage["script"])
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.main(**kwargs)
+    return name
+
+
+def run(stages=STAGES, jobs=None, force=(), dry_run=False, state_path=STATE_PATH):
+    """Run every stage that is out of date, in dependency order. Returns the names that ran."""
+    deps = dependencies(stages)
+    state = load_state(state_path)
+    pending = set(stages)
+    done, ran, planned = set(), [], set()
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        running = {}
+        while pending or running:
+            ready = sorted(name for name in pending if deps[name] <= done)
+            for name in ready:
+                pending.discard(name)
+                stage = stages[name]
+                missing = [path for path in stage["inputs"].values() if not os.path.exists(path)]
+                if missing and not dry_run:
+                    raise FileNotFoundError(f"Stage '{name}' is missing inputs: {', '.join(missing)}")
+                upstream_planned = bool(deps[name] & planned)
+                if name not in force and not missing and not upstream_planned and is_current(name, stage, state):
+                    print(f"[skip] {name} is up to date")
+                    done.add(name)
+                elif dry_run:
+                    print(f"[plan] {name} would run")
+                    planned.add(name)
+                    ran.append(name)
+                    done.add(name)
+                else:
+                    print(f"[run ] {name}")
+                    running[pool.submit(run_stage, name, stage)] = name
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                future.result()
+                stage = stages[name]
+                state[name] = {
+                    "fingerprint": fingerprint(stage),
+                    "outputs": {path: file_hash(path) for path in stage["outputs"].values()},
+                    "finished": datetime.now().isoformat(timespec="seconds"),
+                }
+                save_state(state, state_path)
+                ran.append(name)
+                done.add(name)
+    return ran
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the cached dataset build pipeline.")
+    parser.add_argument("--jobs", "-j", type=int, default=None, help="Maximum stages to run in parallel.")
+    parser.add_argument("--force", nargs="*", default=[], choices=list(STAGES),
+                        help="Stages to re-run even if they are up to date.")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only report which stages are out of date (a dependent of a planned stage is always listed).")
+    args = parser.parse_args()
+
+    ran = run(jobs=args.jobs, force=set(args.force), dry_run=args.dry_run)
+    print(f"\nPipeline finished: {len(ran)} stage(s) {'planned' if args.dry_run else 'run'}: {', '.join(ran) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
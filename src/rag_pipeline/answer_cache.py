@@ -0,0 +1,210 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from incremental_index import index_version
+
+ANSWER_CACHE_PATH = "data/answer_cache/answers.json"
+ANSWER_CACHE_VERSION = 2
+
+NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+
+def source_records(docs):
+    """Retrieved documents as the JSON-serializable records stored with an answer."""
+    return [{"content": doc.page_content, "source": doc.metadata.get("source", "Unknown")} for doc in docs]
+
+
+class SemanticAnswerCache:
+    """Reuse RAG answers for questions that mean the same thing.
+
+    Entries are keyed by the normalized query embedding. A lookup returns the
+    most similar cached question whose cosine similarity is at least
+    `threshold`, and which mentions the same numbers (so "under $2000" never
+    matches "under $3000"). Entries expire after `ttl_seconds`, and the least
+    recently used ones are evicted beyond `max_entries`.
+
+    Every entry records the Chroma index version it was answered against (a
+    digest of the sync manifest) together with `settings`, the retrieval and
+    prompt settings that shaped the answer (vector store, k, rerank depth,
+    context budget, model). When the collection is re-indexed or a setting
+    changes, the whole cache is dropped. The manifest is re-read only when
+    its size or mtime changes.
+
+    The cache file is written after every `put`, outside the lock that
+    lookups take.
+    """
+
+    def __init__(self, embeddings, manifest_path, path=ANSWER_CACHE_PATH, threshold=0.95,
+                 max_entries=512, ttl_seconds=24 * 3600, settings=None):
+        self.embeddings = embeddings
+        self.manifest_path = manifest_path
+        self.settings = settings or {}
+        self.path = path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Serializes writers; a snapshot older than the last one written is skipped
+        self._save_lock = threading.Lock()
+        self._generation = 0
+        self._saved_generation = 0
+        # Held only to swap in or remove the file, so a clear never waits for a save's encoding
+        self._file_lock = threading.Lock()
+        self._cleared_generation = 0
+        self._manifest_stat = None
+        self.version = None
+        self.entries = OrderedDict()  # query -> entry, least recently used first
+        self._matrix = None
+        self._load()
+        self._check_version()
+
+    # --- storage ---
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        if payload.get("version") != ANSWER_CACHE_VERSION:
+            logging.info(f"Ignoring answer cache {self.path} with format version {payload.get('version')}")
+            return
+        self.version = payload["index_version"]
+        for entry in payload["entries"]:
+            entry["vector"] = np.asarray(entry["vector"], dtype=np.float32)
+            self.entries[entry["query"]] = entry
+
+    def _snapshot(self):
+        """Entries to save; call with `_lock` held. The copies keep later hit counts out of the write."""
+        self._generation += 1
+        return self._generation, self.version, [dict(entry) for entry in self.entries.values()]
+
+    def save(self, snapshot=None):
+        """Write the cache file; the JSON encoding runs without holding the entry lock."""
+        if snapshot is None:
+            with self._lock:
+                snapshot = self._snapshot()
+        generation, version, entries = snapshot
+        with self._save_lock:
+            if generation <= self._saved_generation:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            payload = {
+                "version": ANSWER_CACHE_VERSION,
+                "index_version": version,
+                "entries": [{**entry, "vector": entry["vector"].tolist()} for entry in entries],
+            }
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f)
+            with self._file_lock:
+                if generation < self._cleared_generation:
+                    os.remove(tmp_path)
+                    return
+                os.replace(tmp_path, self.path)
+            self._saved_generation = generation
+
+    def _check_version(self):
+        """Drop every entry if the collection was re-indexed or the settings changed since they were stored."""
+        try:
+            stat = os.stat(self.manifest_path)
+            stat = (stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            stat = None
+        if stat == self._manifest_stat and self.version is not None:
+            return
+        self._manifest_stat = stat
+        current = {"index": index_version(self.manifest_path), "settings": self.settings}
+        if current != self.version:
+            if self.entries:
+                logging.info(f"Collection re-indexed or retrieval settings changed; "
+                             f"dropping {len(self.entries)} cached answers")
+            self.clear()
+            self.version = current
+
+    def clear(self):
+        self.entries.clear()
+        self._matrix = None
+        # Saves of snapshots taken before the clear are discarded instead of bringing the file back
+        self._generation += 1
+        with self._file_lock:
+            self._cleared_generation = self._generation
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def _expire(self, now):
+        expired = [query for query, entry in self.entries.items() if now - entry["created"] > self.ttl_seconds]
+        for query in expired:
+            del self.entries[query]
+        if expired:
+            self._matrix = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    # --- cache interface ---
+
+    def embed(self, query):
+        vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, query, vector=None):
+        """The cached answer for the closest matching question, or None.
+
+        A hit is the stored entry plus `similarity` (cosine with the matched
+        question) and `matched_query`.
+        """
+        vector = self.embed(query) if vector is None else vector
+        numbers = NUMBER_RE.findall(query)
+        with self._lock:
+            self._check_version()
+            self._expire(time.time())
+            if not self.entries:
+                self.misses += 1
+                return None
+            if self._matrix is None:
+                self._matrix = (list(self.entries), np.stack([entry["vector"] for entry in self.entries.values()]))
+            queries, matrix = self._matrix
+            similarity = matrix @ vector
+            for i in np.argsort(-similarity):
+                if similarity[i] < self.threshold:
+                    break
+                entry = self.entries[queries[i]]
+                if entry["numbers"] == numbers:
+                    self.entries.move_to_end(queries[i])
+                    entry["hits"] += 1
+                    self.hits += 1
+                    hit = {key: value for key, value in entry.items() if key != "vector"}
+                    return {**hit, "similarity": float(similarity[i]), "matched_query": entry["query"]}
+            self.misses += 1
+            return None
+
+    def put(self, query, answer, sources, vector=None):
+        """Store an answer with its sources ({"content", "source"} dicts)."""
+        vector = self.embed(query) if vector is None else vector
+        with self._lock:
+            self._check_version()
+            self.entries[query] = {
+                "query": query,
+                "numbers": NUMBER_RE.findall(query),
+                "answer": answer,
+                "sources": sources,
+                "created": time.time(),
+                "hits": 0,
+                "vector": vector,
+            }
+            self.entries.move_to_end(query)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+            self._matrix = None
+            snapshot = self._snapshot()
+        self.save(snapshot)
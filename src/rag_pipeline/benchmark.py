@@ -0,0 +1,352 @@
+"""
+benchmark.py
+
+Reproducible performance benchmark for the RAG pipeline.
+
+For each scale factor the final CPU dataset is replicated into a synthetic
+catalog (model names made unique, numeric columns jittered with a fixed
+seed), rendered into text chunks exactly like convert_csv_for_rag, and run
+through every stage in a scratch ChromaDB:
+
+    split      chunking.chunk_documents (one chunk per row, dedup), chunks/sec
+    embed      embed_documents, chunks/sec
+    upsert     Chroma upsert of precomputed vectors, rows/sec
+    bm25       BM25 index build time
+    retrieval  dense and hybrid latency p50/p95/p99 for several k
+    e2e        RetrievalQA (hybrid, k=3) with a deterministic stub LLM
+
+The default "hash" embedder (token feature hashing into 384 dims), a word
+count in place of the tiktoken tokenizer and the stub LLM make runs
+independent of model downloads and GPUs, so timings measure the pipeline
+itself; `--embeddings hf|onnx`, `--tokenizer tiktoken` (which downloads the
+cl100k_base encoding on first use) and `--ollama-url` (e.g. a stub_ollama.py
+server) swap in the real components.
+
+Results are written to logs/benchmarks/ as JSON. `--compare OLD NEW` prints
+the change of every metric and exits with status 1 when a metric regressed
+by more than `--threshold`.
+
+    python src/rag_pipeline/benchmark.py --scales 1 10 100
+    python src/rag_pipeline/benchmark.py --compare logs/benchmarks/a.json logs/benchmarks/b.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+
+from bm25_index import BM25Index, HybridRetriever, tokenize
+from chunking import chunk_documents, token_counter
+from cpu_metadata import CPU_ROW, FINAL_CSV, row_metadata
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data"))
+from convert_csv_for_rag import TEXT_COLUMNS, render_text
+from dataset_io import read_dataset
+
+RESULTS_DIR = "logs/benchmarks"
+SEED = 42
+EMBEDDING_DIM = 384
+JITTER_COLUMNS = ["price", "cpu_mark", "thread_mark", "TDP", "power_performance", "cpu_value", "thread_value"]
+K_VALUES = [1, 5, 10, 50]
+UPSERT_BATCH = 1000
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic stand-in embedder: signed feature hashing of BM25 tokens, L2-normalized."""
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+
+    def _vector(self, text):
+        v = np.zeros(self.dim, dtype=np.float32)
+        for token in tokenize(text):
+            h = zlib.crc32(token.encode("utf-8"))
+            v[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = np.linalg.norm(v)
+        return (v / norm if norm else v).tolist()
+
+    def embed_documents(self, texts):
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+class StubLLM(LLM):
+    """Deterministic LLM: a fixed-length answer derived from the prompt, after an optional delay."""
+
+    delay_ms: float = 0.0
+    tokens: int = 40
+
+    @property
+    def _llm_type(self):
+        return "stub"
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        if self.delay_ms:
+            time.sleep(self.delay_ms / 1e3)
+        return f"Stub answer for a {len(prompt)}-character prompt." + "".join(f" token{i}" for i in range(1, self.tokens))
+
+
+def synthetic_catalog(df, scale, seed=SEED):
+    """`scale` copies of the dataset with unique model names and jittered numbers (+-5%)."""
+    if scale == 1:
+        return df.copy()
+    rng = np.random.default_rng(seed)
+    out = pd.concat([df] * scale, ignore_index=True)
+    copy = np.repeat(np.arange(scale), len(df))
+    out["cpu_model"] = out["cpu_model"].astype(str) + np.where(copy == 0, "", " S" + copy.astype(str)).astype(object)
+    for col in JITTER_COLUMNS:
+        if col in out.columns:
+            noise = rng.uniform(0.95, 1.05, len(out))
+            noise[copy == 0] = 1.0
+            out[col] = out[col] * noise
+    if "cpu_id" in out.columns:
+        out["cpu_id"] = out["cpu_id"] + copy * (int(df["cpu_id"].max()) + 1)
+    return out
+
+
+def benchmark_queries(df, count, seed=SEED):
+    """A fixed mix of lookup, constraint and reference questions drawn from the catalog."""
+    rng = np.random.default_rng(seed)
+    rows = df.iloc[rng.integers(0, len(df), count)]
+    queries = []
+    for i, (_, row) in enumerate(rows.iterrows()):
+        kind = i % 4
+        if kind == 0:
+            queries.append(f"Tell me about the {row['brand_name']} {row['cpu_model']}")
+        elif kind == 1 and pd.notna(row.get("price")):
+            queries.append(f"What is the best {row['category']} CPU under ${int(row['price']) + 100}?")
+        elif kind == 2 and pd.notna(row.get("socket")):
+            queries.append(f"Which CPUs use socket {row['socket']}?")
+        else:
+            queries.append("What are the key factors for choosing a server CPU?")
+    return queries
+
+
+def percentiles(values):
+    p50, p95, p99 = np.percentile(np.asarray(values) * 1e3, [50, 95, 99])
+    return {"p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99), "mean_ms": float(np.mean(values) * 1e3)}
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def load_embeddings(backend):
+    if backend == "hash":
+        return HashingEmbeddings()
+    from rag_components import load_base_embeddings
+
+    return load_base_embeddings(backend)
+
+
+def word_count(text):
+    """Offline stand-in for the tiktoken counter."""
+    return len(text.split())
+
+
+def load_token_counter(tokenizer):
+    return word_count if tokenizer == "words" else token_counter()
+
+
+def load_llm(ollama_url, delay_ms):
+    if ollama_url is None:
+        return StubLLM(delay_ms=delay_ms)
+    from rag_components import load_llm as load_ollama
+
+    return load_ollama(ollama_url)
+
+
+def run_scale(base_df, scale, args, embeddings, llm, count_tokens):
+    from langchain.chains import RetrievalQA
+    from langchain_community.vectorstores import Chroma
+    import chromadb
+    from chromadb.config import Settings
+
+    result = {"scale": scale}
+    df = synthetic_catalog(base_df, scale)
+    texts, seconds = timed(render_text, df[TEXT_COLUMNS])
+    result["rows"] = len(df)
+    result["render_rows_per_s"] = len(df) / seconds
+
+    records = df.to_dict("records")
+    docs = [
+        Document(page_content=text, metadata={"row": i, "doc_type": CPU_ROW, **row_metadata(record)})
+        for i, (text, record) in enumerate(zip(texts, records))
+    ]
+    (chunks, _), seconds = timed(chunk_documents, docs, count_tokens=count_tokens)
+    result["chunks"] = len(chunks)
+    result["split_chunks_per_s"] = len(chunks) / seconds
+
+    chunk_texts = [chunk.page_content for chunk in chunks]
+    vectors, seconds = timed(embeddings.embed_documents, chunk_texts)
+    result["embed_chunks_per_s"] = len(chunks) / seconds
+
+    workdir = tempfile.mkdtemp(prefix="rag_bench_")
+    try:
+        # Telemetry retries would show up in the timings when offline
+        client = chromadb.PersistentClient(path=workdir, settings=Settings(anonymized_telemetry=False))
+        collection = client.create_collection("bench", metadata={"hnsw:space": "l2"})
+        ids = [f"c{i}" for i in range(len(chunks))]
+        batch = min(UPSERT_BATCH, client.get_max_batch_size())
+        start = time.perf_counter()
+        for s in range(0, len(chunks), batch):
+            collection.upsert(
+                ids=ids[s:s + batch],
+                embeddings=vectors[s:s + batch],
+                documents=chunk_texts[s:s + batch],
+                metadatas=[chunk.metadata for chunk in chunks[s:s + batch]],
+            )
+        result["upsert_rows_per_s"] = len(chunks) / (time.perf_counter() - start)
+
+        bm25, seconds = timed(BM25Index.build, ids, chunk_texts, [chunk.metadata for chunk in chunks])
+        result["bm25_build_s"] = seconds
+
+        vectorstore = Chroma(client=client, collection_name="bench", embedding_function=embeddings)
+        sockets = sorted(df["socket"].dropna().astype(str).unique())
+        queries = benchmark_queries(df, args.queries)
+        retrieval = {"dense": {}, "hybrid": {}}
+        for k in args.k:
+            hybrid = HybridRetriever(vectorstore=vectorstore, bm25=bm25, k=k, fetch_k=max(20, k), sockets=sockets)
+            for name, search in (("dense", lambda q: vectorstore.similarity_search(q, k=k)), ("hybrid", hybrid.invoke)):
+                search(queries[0])  # warm-up
+                latencies = [timed(search, q)[1] for q in queries]
+                retrieval[name][f"k={k}"] = percentiles(latencies)
+        result["retrieval"] = retrieval
+
+        retriever = HybridRetriever(vectorstore=vectorstore, bm25=bm25, k=3, sockets=sockets)
+        qa_chain = RetrievalQA.from_chain_type(llm=llm, chain_type="stuff", retriever=retriever)
+        queries = queries[:args.e2e_queries]
+        result["e2e"] = percentiles([timed(qa_chain.invoke, {"query": q})[1] for q in queries])
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "git_commit": commit or None,
+    }
+
+
+def flatten(result, prefix=""):
+    """{"scale=10.retrieval.dense.k=5.p95_ms": value, ...} for every numeric metric."""
+    flat = {}
+    for key, value in result.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(old_path, new_path, threshold):
+    """Print per-metric changes; return the metrics that got worse by more than `threshold`."""
+    with open(old_path, "r", encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)
+    old_flat = flatten({f"scale={r['scale']}": r for r in old["results"]})
+    new_flat = flatten({f"scale={r['scale']}": r for r in new["results"]})
+    regressions = []
+    print(f"{'metric':<58} {'old':>12} {'new':>12} {'change':>9}")
+    for name in sorted(set(old_flat) & set(new_flat)):
+        if name.endswith((".scale", ".rows", ".chunks")):
+            continue
+        before, after = old_flat[name], new_flat[name]
+        change = (after - before) / before if before else 0.0
+        # Throughputs should go up; latencies and durations should go down
+        worse = -change if name.endswith("_per_s") else change
+        flag = ""
+        if worse > threshold:
+            flag = " REGRESSION"
+            regressions.append(name)
+        print(f"{name:<58} {before:>12.3f} {after:>12.3f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingestion, retrieval and generation of the RAG pipeline.")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100],
+                        help="Catalog sizes as multiples of the final dataset (up to 1000).")
+    parser.add_argument("--k", type=int, nargs="+", default=K_VALUES, help="Retrieval depths to time.")
+    parser.add_argument("--queries", type=int, default=100, help="Retrieval queries per k.")
+    parser.add_argument("--e2e-queries", type=int, default=50, help="End-to-end RetrievalQA queries.")
+    parser.add_argument("--embeddings", choices=["hash", "hf", "onnx"], default="hash")
+    parser.add_argument("--tokenizer", choices=["words", "tiktoken"], default=None,
+                        help="Token counter of the split stage (default: words with --embeddings hash, else tiktoken).")
+    parser.add_argument("--ollama-url", help="Generate with ChatOllama at this URL instead of the in-process stub.")
+    parser.add_argument("--llm-delay-ms", type=float, default=0.0, help="Simulated latency of the stub LLM.")
+    parser.add_argument("--input", default=FINAL_CSV)
+    parser.add_argument("--output", help=f"Result file (default: {RESULTS_DIR}/bench_<timestamp>.json).")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two result files.")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Relative change counted as a regression.")
+    args = parser.parse_args()
+
+    if args.compare:
+        regressions = compare(*args.compare, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} metrics regressed by more than {args.threshold:.0%}")
+            raise SystemExit(1)
+        return
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    base_df = read_dataset(args.input)
+    args.tokenizer = args.tokenizer or ("words" if args.embeddings == "hash" else "tiktoken")
+    embeddings = load_embeddings(args.embeddings)
+    count_tokens = load_token_counter(args.tokenizer)
+    llm = load_llm(args.ollama_url, args.llm_delay_ms)
+
+    results = []
+    for scale in args.scales:
+        logging.info(f"Benchmarking {scale}x catalog ({scale * len(base_df)} rows)...")
+        result = run_scale(base_df, scale, args, embeddings, llm, count_tokens)
+        results.append(result)
+        dense = result["retrieval"]["dense"][f"k={args.k[0]}"]
+        logging.info(
+            f"{scale}x: split {result['split_chunks_per_s']:.0f} chunks/s, embed {result['embed_chunks_per_s']:.0f} "
+            f"chunks/s, upsert {result['upsert_rows_per_s']:.0f} rows/s, dense k={args.k[0]} p95 "
+            f"{dense['p95_ms']:.2f} ms, e2e p95 {result['e2e']['p95_ms']:.2f} ms"
+        )
+
+    config = {key: value for key, value in vars(args).items() if key not in ("compare", "output", "threshold")}
+    payload = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "config": config,
+        "environment": environment(),
+        "results": results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"bench_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    print(f"Benchmark results saved to: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import json
+import math
+import os
+import re
+from typing import Any
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from query_constraints import extract_constraints, matches_constraints, to_chroma_where
+
+BM25_PATH = "data/chroma_db/smollm3_bm25.json"
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    """Lower-case alphanumeric tokens, so "EPYC 7763" -> ["epyc", "7763"]."""
+    return TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """Okapi BM25 inverted index over the chunks stored in the vector store.
+
+    Postings keep the precomputed BM25 weight of each (term, chunk) pair, so a
+    query costs one vectorised add per query term.
+    """
+
+    def __init__(self, ids, texts, metadatas, postings, k1=1.5, b=0.75):
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.k1 = k1
+        self.b = b
+        self.raw_postings = postings  # term -> [[doc, tf], ...]
+        self.doc_len = np.zeros(len(ids), dtype=np.float32)
+        for entries in postings.values():
+            for doc, tf in entries:
+                self.doc_len[doc] += tf
+        avgdl = float(self.doc_len.mean()) if len(ids) else 0.0
+
+        n = len(ids)
+        self.postings = {}
+        for term, entries in postings.items():
+            docs = np.fromiter((doc for doc, _ in entries), dtype=np.int32, count=len(entries))
+            tfs = np.fromiter((tf for _, tf in entries), dtype=np.float32, count=len(entries))
+            idf = math.log(1 + (n - len(entries) + 0.5) / (len(entries) + 0.5))
+            norm = k1 * (1 - b + b * self.doc_len[docs] / avgdl)
+            self.postings[term] = (docs, (idf * tfs * (k1 + 1) / (tfs + norm)).astype(np.float32))
+
+    @classmethod
+    def build(cls, ids, texts, metadatas, k1=1.5, b=0.75):
+        postings = {}
+        for doc, text in enumerate(texts):
+            counts = {}
+            for token in tokenize(text):
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                postings.setdefault(token, []).append([doc, tf])
+        return cls(list(ids), list(texts), list(metadatas), postings, k1=k1, b=b)
+
+    @classmethod
+    def from_collection(cls, collection, **kwargs):
+        """Index every chunk currently stored in a Chroma collection."""
+        stored = collection.get(include=["documents", "metadatas"])
+        return cls.build(stored["ids"], stored["documents"], [m or {} for m in stored["metadatas"]], **kwargs)
+
+    def save(self, path=BM25_PATH):
+        payload = {
+            "k1": self.k1,
+            "b": self.b,
+            "ids": self.ids,
+            "texts": self.texts,
+            "metadatas": self.metadatas,
+            "postings": self.raw_postings,
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=BM25_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+        return cls(payload["ids"], payload["texts"], payload["metadatas"], payload["postings"],
+                   k1=payload["k1"], b=payload["b"])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def scores(self, query):
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is not None:
+                scores[posting[0]] += posting[1]
+        return scores
+
+    def search(self, query, k=10, allowed=None):
+        """Return up to `k` (doc index, score) pairs with a positive score, best first.
+
+        `allowed` is an optional predicate on the doc index, applied before the top-`k` cut.
+        """
+        scores = self.scores(query)
+        hits = np.flatnonzero(scores > 0)
+        if allowed is not None:
+            hits = np.array([i for i in hits if allowed(i)], dtype=np.int64)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(int(i), float(scores[i])) for i in hits]
+
+    def exact_matches(self, query, max_df):
+        """Chunks containing every model-number-like query token, if those tokens are selective.
+
+        Tokens with a digit ("7763", "e5", "sp3") identify specific CPUs or sockets.
+        When every such token occurs in at most `max_df` chunks, the lexical
+        index alone answers the lookup and dense search can be skipped.
+        Returns None when the query is not an exact lookup.
+        """
+        tokens = {t for t in tokenize(query) if any(c.isdigit() for c in t)}
+        if not tokens or any(t not in self.postings or len(self.postings[t][0]) > max_df for t in tokens):
+            return None
+        docs = set(self.postings[tokens.pop()][0].tolist())
+        for token in tokens:
+            docs &= set(self.postings[token][0].tolist())
+        if not docs:
+            return None
+        scores = self.scores(query)
+        return sorted(docs, key=lambda i: -scores[i])
+
+    def document(self, i):
+        return Document(id=self.ids[i], page_content=self.texts[i], metadata=self.metadatas[i])
+
+
+class HybridRetriever(BaseRetriever):
+    """Merge BM25 and dense candidates with reciprocal-rank fusion.
+
+    Drop-in replacement for `vectorstore.as_retriever(search_kwargs={"k": k})`.
+    Constraints found in the query ("AMD", "under 3 years", a socket name) are
+    applied as a Chroma `where` prefilter on the dense side and to the BM25
+    candidates' metadata. Exact model-number lookups are served from the BM25
+    index alone.
+    """
+
+    vectorstore: Any
+    bm25: Any
+    k: int = 3
+    fetch_k: int = 20
+    rrf_k: int = 60
+    sockets: list = []
+    use_constraints: bool = True
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        constraints = extract_constraints(query, self.sockets) if self.use_constraints else []
+
+        def allowed(i):
+            return matches_constraints(self.bm25.metadatas[i], constraints)
+
+        exact = self.bm25.exact_matches(query, max_df=self.k)
+        if exact is not None:
+            matches = [self.bm25.document(i) for i in exact if allowed(i)][:self.k]
+            # The named CPU failing the constraints ("is the EPYC 7763 under $500?") still needs context
+            if matches:
+                return matches
+
+        fused = {}
+        docs = {}
+        hits = self.bm25.search(query, self.fetch_k, allowed=allowed if constraints else None)
+        lexical = [self.bm25.document(i) for i, _ in hits]
+        dense = self.vectorstore.similarity_search(query, k=self.fetch_k, filter=to_chroma_where(constraints))
+        for ranked in (lexical, dense):
+            for rank, doc in enumerate(ranked):
+                key = doc.page_content
+                fused[key] = fused.get(key, 0.0) + 1.0 / (self.rrf_k + rank + 1)
+                docs.setdefault(key, doc)
+        best = sorted(fused, key=fused.get, reverse=True)[:self.k]
+        return [docs[key] for key in best]
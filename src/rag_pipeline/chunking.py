@@ -0,0 +1,285 @@
+"""
+chunking.py
+
+Schema-aware chunking for the RAG index.
+
+CPU rows (doc_type "cpu_row") are already one self-contained description
+each, so every row becomes exactly one chunk -- never split, never
+overlapped. Reference documents (the PDF, one Document per page) are joined
+per source, cut into sections at heading lines, and packed into chunks of at
+most `chunk_tokens` tokens along paragraph, then sentence, boundaries, with
+a small token overlap inside a section. Continuation chunks repeat their
+section heading so they still say what they are about.
+
+Before embedding, exact duplicate chunks are dropped, and reference chunks
+that are near-duplicates of an earlier chunk (estimated Jaccard similarity
+of word shingles >= `threshold`, found with MinHash + LSH banding) are
+dropped too. CPU rows are only deduplicated exactly: two rows that differ in
+a single number describe different CPUs.
+
+Token counts use tiktoken's cl100k_base, which tracks the embedding model's
+word pieces closely enough to stay under its 256-token input limit.
+"""
+
+import itertools
+import logging
+import re
+import zlib
+
+import numpy as np
+from langchain_core.documents import Document
+
+from cpu_metadata import CPU_ROW
+
+ENCODING_NAME = "cl100k_base"
+# all-MiniLM-L6-v2 truncates its input at 256 word pieces
+EMBEDDING_MAX_TOKENS = 256
+# Leaves room for the heading prefix and tokenizer differences
+CHUNK_TOKENS = 200
+CHUNK_OVERLAP_TOKENS = 20
+# Sections shorter than this are merged into the next one instead of becoming a chunk
+MIN_CHUNK_TOKENS = 40
+DEDUP_THRESHOLD = 0.9
+
+MINHASH_PERMUTATIONS = 128
+# 16 bands x 8 rows: pairs above ~0.7 Jaccard become candidates, then the signature estimate decides
+LSH_BANDS = 16
+SHINGLE_WORDS = 5
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = np.uint64((1 << 32) - 1)
+
+HEADING_MAX_WORDS = 8
+BULLET_RE = re.compile(r"^[●○•▪\-\*]")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9●○•])")
+SPACES_RE = re.compile(r"[ \t\u00a0]+")
+WORD_RE = re.compile(r"\w+")
+
+
+def token_counter(encoding_name=ENCODING_NAME):
+    """A function returning the number of tokens in a string."""
+    import tiktoken
+
+    encoding = tiktoken.get_encoding(encoding_name)
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def normalize_whitespace(text):
+    """Collapse the runs of spaces pypdf leaves between words; keep line breaks."""
+    lines = (SPACES_RE.sub(" ", line).strip() for line in text.split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+def is_heading(line):
+    """A short title-like line: no bullet, no sentence punctuation at the end."""
+    words = line.split()
+    return (
+        0 < len(words) <= HEADING_MAX_WORDS
+        and line[0].isupper()
+        and not BULLET_RE.match(line)
+        and line[-1] not in ".,;:!?)"
+    )
+
+
+def sections(pages):
+    """Yield (heading, [(line, page metadata)]) sections as the pages stream in."""
+    heading, lines = None, []
+    for page in pages:
+        for line in normalize_whitespace(page.page_content).split("\n"):
+            if is_heading(line):
+                if lines:
+                    yield heading, lines
+                heading, lines = line, []
+            lines.append((line, page.metadata))
+    if lines:
+        yield heading, lines
+
+
+def split_units(text, count_tokens, max_tokens):
+    """Break a paragraph into sentences, and an over-long sentence into word windows."""
+    if count_tokens(text) <= max_tokens:
+        return [text]
+    units = []
+    for sentence in SENTENCE_RE.split(text):
+        if count_tokens(sentence) <= max_tokens:
+            units.append(sentence)
+            continue
+        words = sentence.split()
+        step = max(1, len(words) * max_tokens // count_tokens(sentence))
+        units.extend(" ".join(words[i:i + step]) for i in range(0, len(words), step))
+    return units
+
+
+def pack_section(heading, lines, count_tokens, chunk_tokens, overlap_tokens):
+    """Greedily pack one section's paragraphs into token-bounded chunks.
+
+    Yields each chunk as a list of (text, page metadata, tokens) units. A
+    chunk after the first starts with the last `overlap_tokens` worth of
+    units of the previous one; the caller adds the heading back.
+    """
+    prefix = f"{heading}\n" if heading else ""
+    budget = chunk_tokens - (count_tokens(prefix) if prefix else 0)
+    units = []
+    for line, metadata in lines:
+        units.extend((unit, metadata, count_tokens(unit)) for unit in split_units(line, count_tokens, budget))
+
+    chunk, size = [], 0
+    for unit in units:
+        if chunk and size + unit[2] > budget:
+            yield chunk
+            # Carry the tail of the previous chunk over, whole units only
+            carry, carried = [], 0
+            for previous in reversed(chunk):
+                if carried + previous[2] > overlap_tokens or previous[0] == heading:
+                    break
+                carry.insert(0, previous)
+                carried += previous[2]
+            chunk, size = carry, carried
+        chunk.append(unit)
+        size += unit[2]
+    if chunk:
+        yield chunk
+
+
+def chunk_reference_docs(pages, count_tokens, chunk_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS,
+                         min_tokens=MIN_CHUNK_TOKENS):
+    """Section-aware, token-bounded chunks for the pages of one reference document."""
+    chunks = []
+    pending = None  # a section too short to stand alone, merged into the next
+    for heading, lines in sections(pages):
+        if pending is not None:
+            heading, lines = pending[0] or heading, pending[1] + lines
+            pending = None
+        if sum(count_tokens(line) for line, _ in lines) < min_tokens:
+            pending = (heading, lines)
+            continue
+        for part in pack_section(heading, lines, count_tokens, chunk_tokens, overlap_tokens):
+            text = "\n".join(unit for unit, _, _ in part)
+            if heading and not text.startswith(heading):
+                text = f"{heading}\n{text}"
+            metadata = {**part[0][1], "section": heading or "", "page_end": part[-1][1].get("page", 0)}
+            chunks.append(Document(page_content=text, metadata=metadata))
+    if pending is not None:
+        text = "\n".join(line for line, _ in pending[1])
+        metadata = {**pending[1][0][1], "section": pending[0] or "", "page_end": pending[1][-1][1].get("page", 0)}
+        chunks.append(Document(page_content=text, metadata=metadata))
+    return chunks
+
+
+class MinHashLSH:
+    """MinHash signatures over word shingles with banded LSH for near-duplicate lookup."""
+
+    def __init__(self, threshold=DEDUP_THRESHOLD, num_perm=MINHASH_PERMUTATIONS, bands=LSH_BANDS,
+                 shingle_words=SHINGLE_WORDS, seed=1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_words = shingle_words
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self.buckets = [{} for _ in range(bands)]
+        self.signatures = []
+
+    def shingles(self, text):
+        words = WORD_RE.findall(text.lower())
+        n = self.shingle_words
+        grams = {" ".join(words[i:i + n]) for i in range(max(1, len(words) - n + 1))}
+        return np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64, count=len(grams))
+
+    def signature(self, text):
+        hashes = self.shingles(text)
+        # Universal hashing (a*x + b) mod p per permutation; uint64 wrap-around is harmless here
+        permuted = (np.outer(hashes, self.a) + self.b) % MERSENNE_PRIME & MAX_HASH
+        return permuted.min(axis=0)
+
+    def query(self, signature):
+        """(index, estimated Jaccard) of the most similar stored signature at or above the threshold."""
+        candidates = set()
+        for band, buckets in enumerate(self.buckets):
+            key = signature[band * self.rows:(band + 1) * self.rows].tobytes()
+            candidates.update(buckets.get(key, ()))
+        best = None
+        for index in candidates:
+            similarity = float((self.signatures[index] == signature).mean())
+            if similarity >= self.threshold and (best is None or similarity > best[1]):
+                best = (index, similarity)
+        return best
+
+    def add(self, signature):
+        index = len(self.signatures)
+        self.signatures.append(signature)
+        for band, buckets in enumerate(self.buckets):
+            buckets.setdefault(signature[band * self.rows:(band + 1) * self.rows].tobytes(), []).append(index)
+        return index
+
+
+def deduplicate(chunks, threshold=DEDUP_THRESHOLD):
+    """Drop exact duplicates, and near-duplicate reference chunks.
+
+    Returns (kept chunks, number of exact duplicates, number of near duplicates).
+    The first occurrence of each group is kept, so the result is deterministic.
+    """
+    lsh = MinHashLSH(threshold=threshold)
+    seen = set()
+    kept = []
+    exact = near = 0
+    for chunk in chunks:
+        key = " ".join(chunk.page_content.split())
+        if key in seen:
+            exact += 1
+            continue
+        seen.add(key)
+        if chunk.metadata.get("doc_type") != CPU_ROW:
+            signature = lsh.signature(chunk.page_content)
+            match = lsh.query(signature)
+            if match is not None:
+                near += 1
+                logging.debug(f"Dropping near-duplicate chunk (similarity {match[1]:.2f}): {chunk.page_content[:80]!r}")
+                continue
+            lsh.add(signature)
+        kept.append(chunk)
+    return kept, exact, near
+
+
+def chunk_documents(docs, count_tokens=None, chunk_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS,
+                    dedup_threshold=DEDUP_THRESHOLD):
+    """Chunk documents by type and drop duplicates.
+
+    `docs` may be any iterable, e.g. pages streamed from pdf_ingest: pages
+    are chunked as they arrive and never held as a whole document. The pages
+    of one source must be consecutive.
+
+    Returns (chunks, stats) where stats counts CPU rows, reference pages and
+    chunks, exact and near duplicates dropped, and rows longer than the
+    embedding model's input limit (kept whole, but truncated when embedded).
+    """
+    count_tokens = count_tokens or token_counter()
+    rows = []
+    page_count = 0
+
+    def reference_pages():
+        nonlocal page_count
+        for doc in docs:
+            if doc.metadata.get("doc_type") == CPU_ROW:
+                rows.append(doc)
+            else:
+                page_count += 1
+                yield doc
+
+    reference = []
+    for _, pages in itertools.groupby(reference_pages(), key=lambda doc: str(doc.metadata.get("source", ""))):
+        reference.extend(chunk_reference_docs(pages, count_tokens, chunk_tokens, overlap_tokens))
+
+    chunks, exact, near = deduplicate(reference + rows, dedup_threshold)
+    stats = {
+        "cpu_rows": len(rows),
+        "reference_pages": page_count,
+        "reference_chunks": len(reference),
+        "exact_duplicates": exact,
+        "near_duplicates": near,
+        "oversized_rows": sum(1 for row in rows if count_tokens(row.page_content) > EMBEDDING_MAX_TOKENS),
+        "chunks": len(chunks),
+    }
+    return chunks, stats
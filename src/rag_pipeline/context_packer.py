@@ -0,0 +1,185 @@
+"""
+context_packer.py
+
+Token-budgeted, compact context for the "stuff" RetrievalQA prompt.
+
+The stuff chain pastes every retrieved chunk verbatim, and a CPU row chunk is
+the row_to_text sentence -- "The brand_name is AMD, cpu_model is ... The
+cpu_mark is 45860.0. The cpu_value is Null. ..." -- so most of its tokens are
+boilerplate and columns nobody asked about. ContextPacker renders the
+retrieved CPU rows as one table instead, with a fixed set of core columns
+plus the columns the question hints at ("watt" -> threadMark_per_watt,
+"value" -> thread_mark_per_dollar, ...), and keeps only reference (PDF)
+passages as prose. Chunks are added in retrieval order until the
+tiktoken-measured budget is used up; a passage that does not fit keeps its
+whole lines (headings and bullets intact) and the next line up to a word
+boundary, and later, shorter rows can still fill the remainder.
+
+RAG_CONTEXT_TOKENS sets the budget (see rag_components.py); 0 restores the
+chain's verbose stuffed context.
+"""
+
+import re
+
+from chunking import token_counter
+from cpu_metadata import CPU_ROW
+
+CONTEXT_TOKENS = 1024
+# A passage is only truncated into the budget if at least this much of it fits
+MIN_PASSAGE_TOKENS = 40
+
+CORE_COLUMNS = ["cpu_model", "brand_name", "price", "cpu_mark", "thread_mark", "cores", "TDP", "socket"]
+# Extra columns, added when the question matches the pattern
+QUERY_COLUMNS = [
+    (re.compile(r"server|desktop|laptop|mobile|workstation|categor", re.I), ["category"]),
+    (re.compile(r"\bold|new|age\b|year|recent|latest|release", re.I), ["age", "test_date"]),
+    (re.compile(r"watt|power|efficien|energy|tdp", re.I), ["threadMark_per_watt", "power_performance"]),
+    (re.compile(r"value|dollar|cheap|budget|money|afford|per core|bang", re.I),
+     ["thread_mark_per_dollar", "price_per_core", "cpu_value"]),
+    (re.compile(r"efficien", re.I), ["thread_efficiency"]),
+    (re.compile(r"thermal|heat|cool|temperature", re.I), ["thermal_performance_ratio"]),
+]
+COLUMN_UNITS = {"price": "price ($)", "TDP": "TDP (W)", "price_per_core": "price_per_core ($)"}
+
+NUMBER = r"(Null|-?\d+(?:\.\d+)?(?:e-?\d+)?)"
+# Where each column sits in the row_to_text sentence (src/data/convert_csv_for_rag.py)
+ROW_FIELDS = {
+    "brand_name": re.compile(r"The brand_name is (.+?), cpu_model is"),
+    "cpu_model": re.compile(r"cpu_model is (.+?) at the price of"),
+    "price": re.compile(rf"at the price of {NUMBER}"),
+    "cores": re.compile(rf"number of cores are {NUMBER}"),
+    "socket": re.compile(r"suitable for is (.+?)\. This cpu"),
+    "category": re.compile(r"This cpu is for (.+?)\. "),
+    "age": re.compile(rf"age of the cpu is {NUMBER}"),
+    "test_date": re.compile(rf"tested in the year {NUMBER}"),
+    **{
+        col: re.compile(rf"\b{col} is (?:operating at )?{NUMBER}")
+        for col in ["cpu_mark", "cpu_value", "thread_mark", "thread_value", "TDP", "power_performance",
+                    "price_per_core", "thread_mark_per_dollar", "thread_efficiency", "threadMark_per_watt",
+                    "thermal_performance_ratio"]
+    },
+}
+
+
+def parse_row(doc):
+    """Column values of a CPU row chunk: typed metadata first, the rest parsed from its text."""
+    values = {}
+    for col, pattern in ROW_FIELDS.items():
+        if col in doc.metadata:
+            values[col] = doc.metadata[col]
+            continue
+        match = pattern.search(doc.page_content)
+        if match and match.group(1) not in ("Null", "Unknown"):
+            values[col] = match.group(1)
+    return values
+
+
+def format_cell(value):
+    """Short rendering: whole numbers without ".0", others to 3 significant digits."""
+    if value is None:
+        return "-"
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            return value
+    if isinstance(value, float) and abs(value) < 100 and not value.is_integer():
+        return f"{value:.3g}"
+    return str(int(round(value)))
+
+
+def query_columns(query):
+    """Core columns plus those the question asks about."""
+    columns = list(CORE_COLUMNS)
+    for pattern, extra in QUERY_COLUMNS:
+        if pattern.search(query):
+            columns.extend(col for col in extra if col not in columns)
+    return columns
+
+
+class ContextPacker:
+    """Builds the {context} of the stuff prompt within a token budget."""
+
+    def __init__(self, max_tokens=CONTEXT_TOKENS, count_tokens=None):
+        self.max_tokens = max_tokens
+        self.count_tokens = count_tokens or token_counter()
+
+    def fit_passage(self, text, budget):
+        """`text` cut to at most `budget` tokens: whole lines, then the next line at a word boundary.
+
+        Line breaks are kept, so a heading stays on its own line above its bullets.
+        """
+        lines = text.split("\n")
+        kept = []
+        for line in lines:
+            if self.count_tokens("\n".join(kept + [line])) > budget:
+                break
+            kept.append(line)
+        else:
+            return text, self.count_tokens(text)
+        words = lines[len(kept)].split()
+        while words:
+            candidate = "\n".join(kept + [" ".join(words)])
+            tokens = self.count_tokens(candidate)
+            if tokens <= budget:
+                return candidate, tokens
+            words = words[:min(len(words) - 1, len(words) * budget // tokens)]
+        text = "\n".join(kept)
+        return text, self.count_tokens(text)
+
+    def pack(self, query, docs):
+        """(context, stats) for the documents in retrieval order.
+
+        stats counts CPU rows in the table, prose passages, documents left
+        out, the packed context's tokens and the tokens the verbose stuffed
+        context would have taken.
+        """
+        parsed = []
+        for doc in docs:
+            values = parse_row(doc) if doc.metadata.get("doc_type") == CPU_ROW else {}
+            parsed.append(values if "cpu_model" in values else None)
+        rows = [values for values in parsed if values is not None]
+        columns = [col for col in query_columns(query) if any(col in values for values in rows)]
+        header = " | ".join(COLUMN_UNITS.get(col, col) for col in columns)
+        table_title = "CPUs matching the question:"
+
+        used = self.count_tokens(f"{table_title}\n{header}") if rows else 0
+        table, passages, seen = [], [], set()
+        dropped = 0
+        for doc, values in zip(docs, parsed):
+            if values is not None:
+                line = " | ".join(format_cell(values.get(col)) for col in columns)
+                if line in seen:
+                    continue
+                tokens = self.count_tokens(line) + 1
+                if used + tokens > self.max_tokens:
+                    dropped += 1
+                    continue
+                seen.add(line)
+                table.append(line)
+                used += tokens
+                continue
+            text = "\n".join(" ".join(line.split()) for line in doc.page_content.splitlines() if line.strip())
+            if text in seen:
+                continue
+            remaining = self.max_tokens - used - 2
+            tokens = self.count_tokens(text)
+            if tokens > remaining:
+                if remaining < MIN_PASSAGE_TOKENS:
+                    dropped += 1
+                    continue
+                text, tokens = self.fit_passage(text, remaining)
+            seen.add(text)
+            passages.append(text)
+            used += tokens + 2
+
+        blocks = ["\n".join([table_title, header] + table)] if table else []
+        context = "\n\n".join(blocks + passages)
+        stats = {
+            "cpu_rows": len(table),
+            "passages": len(passages),
+            "dropped": dropped,
+            "context_tokens": self.count_tokens(context),
+            "verbose_context_tokens": self.count_tokens("\n\n".join(doc.page_content for doc in docs)),
+        }
+        return context, stats
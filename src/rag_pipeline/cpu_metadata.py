@@ -0,0 +1,64 @@
+import logging
+
+import pandas as pd
+
+FINAL_CSV = "data/final/cpu_benchmarks_final.csv"
+
+# Columns copied onto each CPU row chunk, with the type Chroma should store.
+METADATA_COLUMNS = {
+    "cpu_id": int,
+    "brand_name": str,
+    "cpu_model": str,
+    "socket": str,
+    "category": str,
+    "price": float,
+    "cpu_mark": int,
+    "thread_mark": int,
+    "cores": int,
+    "TDP": float,
+    "age": int,
+    "test_date": int,
+}
+
+CPU_ROW = "cpu_row"
+REFERENCE = "reference"
+
+
+def row_metadata(record):
+    """Typed metadata for one dataset row; missing values are left out (Chroma rejects None)."""
+    metadata = {}
+    for col, cast in METADATA_COLUMNS.items():
+        value = record.get(col)
+        if value is None or pd.isna(value) or value == "":
+            continue
+        metadata[col] = cast(value)
+    return metadata
+
+
+def attach_cpu_metadata(docs, final_csv=FINAL_CSV):
+    """Copy typed columns from the final dataset onto CSVLoader row documents.
+
+    `cpu_text_chunks_*.csv` is generated row for row from the final dataset,
+    so the loader's `row` index is the join key. A row is only tagged when its
+    text mentions the expected cpu_model, so a stale text file is never
+    labelled with the wrong CPU.
+    """
+    records = pd.read_csv(final_csv).to_dict("records")
+    mismatched = 0
+    for doc in docs:
+        doc.metadata["doc_type"] = CPU_ROW
+        row = doc.metadata.get("row")
+        if row is None or row >= len(records) or str(records[row]["cpu_model"]) not in doc.page_content:
+            mismatched += 1
+            continue
+        doc.metadata.update(row_metadata(records[row]))
+    if mismatched:
+        logging.warning(f"{mismatched} CSV rows could not be matched to {final_csv}; they carry no CPU metadata")
+    return docs
+
+
+def tag_reference_docs(docs):
+    """Mark non-tabular documents (PDF pages) so CPU constraints never filter them out."""
+    for doc in docs:
+        doc.metadata["doc_type"] = REFERENCE
+    return docs
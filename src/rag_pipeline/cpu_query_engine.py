@@ -0,0 +1,215 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from cpu_metadata import FINAL_CSV
+from query_constraints import USE_CASE_RE, extract_constraints
+
+OPERATORS = {
+    "==": np.equal,
+    "!=": np.not_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+}
+
+NAME_COLUMNS = ["brand_name", "cpu_model"]
+
+# Columns where "best" / "top" means the smallest value
+LOWER_IS_BETTER = {"price", "TDP", "age", "price_per_core"}
+# "<metric> per dollar" -> "<metric>/price"
+PER_UNIT_COLUMNS = {"dollar": "price", "watt": "TDP", "core": "cores"}
+
+
+def lower_is_better(metric):
+    """Whether smaller values of a column or `a/b` ratio are better (price per core, but not cpu_mark per dollar)."""
+    num, _, den = metric.partition("/")
+    return num in LOWER_IS_BETTER and den not in LOWER_IS_BETTER
+
+
+class CPUQueryEngine:
+    """Exact filter and top-k queries over the final CPU benchmark table.
+
+    Every column is held as a NumPy array, so filtering is a handful of
+    vectorised comparisons and ranking is an `argpartition` over the
+    surviving rows. No embeddings, vector store or LLM are involved.
+
+    Filters are `(column, op, value)` tuples with `op` one of `==`, `!=`,
+    `<`, `<=`, `>`, `>=` or `in`. String comparisons ignore case. A metric
+    is any numeric column or a ratio of two, written `"cpu_mark/price"`.
+    """
+
+    def __init__(self, df):
+        self.size = len(df)
+        self.numeric = {}
+        self.text = {}
+        self._text_lower = {}
+        for col in df.columns:
+            if pd.api.types.is_numeric_dtype(df[col]):
+                self.numeric[col] = df[col].to_numpy(dtype=np.float64)
+            else:
+                values = df[col].fillna("").astype(str).to_numpy(dtype=object)
+                self.text[col] = values
+                self._text_lower[col] = np.char.lower(values.astype(str))
+
+    @classmethod
+    def from_csv(cls, path=FINAL_CSV):
+        return cls(pd.read_csv(path))
+
+    @property
+    def columns(self):
+        return list(self.numeric) + list(self.text)
+
+    def metric(self, expr):
+        """Return the values of a numeric column or an `a/b` ratio of two columns."""
+        expr = expr.replace(" ", "")
+        if expr in self.numeric:
+            return self.numeric[expr]
+        if "/" in expr:
+            num, den = expr.split("/", 1)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                ratio = self.metric(num) / self.metric(den)
+            ratio[~np.isfinite(ratio)] = np.nan
+            return ratio
+        raise KeyError(f"Unknown metric '{expr}'. Numeric columns: {', '.join(self.numeric)}")
+
+    def mask(self, filters=None):
+        """Boolean row mask for a list of `(column, op, value)` filters (AND-ed)."""
+        mask = np.ones(self.size, dtype=bool)
+        for col, op, value in filters or []:
+            if col in self._text_lower:
+                values = self._text_lower[col]
+                if op == "in":
+                    mask &= np.isin(values, [str(v).lower() for v in value])
+                else:
+                    mask &= OPERATORS[op](values, str(value).lower())
+            else:
+                values = self.metric(col)
+                if op == "in":
+                    mask &= np.isin(values, list(value))
+                else:
+                    # NaN compares False, so rows with missing values never pass a numeric filter.
+                    with np.errstate(invalid="ignore"):
+                        mask &= OPERATORS[op](values, float(value))
+        return mask
+
+    def row(self, i, columns=None):
+        columns = columns or self.columns
+        record = {}
+        for col in columns:
+            if col in self.text:
+                record[col] = self.text[col][i]
+            else:
+                value = self.metric(col)[i]
+                record[col] = None if np.isnan(value) else value.item()
+        return record
+
+    def top_k(self, metric, k=3, filters=None, ascending=False, columns=None):
+        """Return the `k` rows with the highest (or lowest) `metric` after filtering.
+
+        Rows where the metric is missing are skipped. Ties keep table order.
+        """
+        values = self.metric(metric)
+        candidates = np.flatnonzero(self.mask(filters) & ~np.isnan(values))
+        scores = values[candidates] if ascending else -values[candidates]
+        if len(candidates) > k:
+            keep = np.argpartition(scores, k - 1)[:k]
+            candidates, scores = candidates[keep], scores[keep]
+        order = np.lexsort((candidates, scores))
+        columns = columns or NAME_COLUMNS + [c for c in [metric] if c in self.numeric]
+        results = []
+        for i in candidates[order]:
+            record = self.row(i, columns)
+            record[metric] = values[i].item()
+            results.append(record)
+        return results
+
+    def distinct(self, col):
+        """Sorted distinct values of a text column."""
+        return sorted(set(self.text[col])) if col in self.text else []
+
+    def count(self, filters=None):
+        return int(self.mask(filters).sum())
+
+    # --- natural-language routing ---
+
+    def parse_metric(self, text):
+        """The column or `a/b` ratio a question ranks by: "cpu_mark/price", "cpu mark per watt", "cores"."""
+        by_name = {col.lower(): col for col in self.numeric}
+        for num, den in re.findall(r"\b([a-z_]+)\s*/\s*([a-z_]+)\b", text):
+            if num in by_name and den in by_name:
+                return f"{by_name[num]}/{by_name[den]}"
+        for col in sorted(self.numeric, key=len, reverse=True):
+            if col in ("age", "test_date"):
+                continue
+            pattern = re.escape(col.lower()).replace("_", "[_ ]")
+            match = re.search(rf"\b{pattern}\b(?:\s+per\s+(dollar|watt|core)s?\b)?", text)
+            if match:
+                per = PER_UNIT_COLUMNS.get(match.group(1))
+                return f"{col}/{per}" if per and per in self.numeric and per != col else col
+        return None
+
+    def parse_ranking_query(self, query):
+        """Recognise "top N by <metric>" style questions.
+
+        Constraints such as "less than 3 years" or "AMD" become filters via
+        `extract_constraints`. "best" and "top" rank price, TDP and other costs
+        from the lowest up. Returns `{"metric", "k", "ascending", "filters"}`
+        or None when the question is not a ranking over a known numeric column
+        or ratio, or asks about a use case.
+        """
+        text = query.lower()
+        if USE_CASE_RE.search(text):
+            # "What TDP is best for a home lab?" needs judgement, not a sort
+            return None
+        top = re.search(r"\b(top|best|highest|lowest|cheapest)\s*(\d+)?\b|\b(\d+)\s+(best|highest|lowest|cheapest)\b", text)
+        if not top:
+            return None
+        k = int(top.group(2) or top.group(3) or 3)
+
+        metric = self.parse_metric(text)
+        if metric is None:
+            if "cheapest" in text:
+                metric = "price"
+            else:
+                return None
+        if "lowest" in top.group(0) or "cheapest" in top.group(0):
+            ascending = True
+        elif "highest" in top.group(0):
+            ascending = False
+        else:
+            # "best price" is the lowest price, "best cpu_mark" the highest
+            ascending = lower_is_better(metric)
+
+        filters = extract_constraints(query, sockets=self.distinct("socket"))
+        return {"metric": metric, "k": k, "ascending": ascending, "filters": filters}
+
+    def answer(self, query):
+        """Answer a ranking question exactly from the table, or return None to fall back to RAG."""
+        parsed = self.parse_ranking_query(query)
+        if parsed is None:
+            return None
+        rows = self.top_k(
+            parsed["metric"],
+            k=parsed["k"],
+            filters=parsed["filters"],
+            ascending=parsed["ascending"],
+            columns=NAME_COLUMNS + ["age"],
+        )
+        conditions = " and ".join(
+            f"{col} {op} {value:g}" if isinstance(value, float) else f"{col} {op} {value}"
+            for col, op, value in parsed["filters"]
+        )
+        direction = "lowest" if parsed["ascending"] else "highest"
+        header = f"Top {parsed['k']} CPUs by {direction} {parsed['metric']}" + (f" where {conditions}" if conditions else "")
+        if not rows:
+            return f"{header}: no CPUs in the dataset match."
+        lines = [f"{header}:"]
+        for rank, row in enumerate(rows, 1):
+            lines.append(
+                f"{rank}. {row['brand_name']} {row['cpu_model']} - {parsed['metric']} {row[parsed['metric']]:g}"
+                + (f" (age {row['age']:g} years)" if row.get("age") is not None else "")
+            )
+        return "\n".join(lines)
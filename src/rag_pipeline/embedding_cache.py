@@ -0,0 +1,216 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+CACHE_DIR = "data/embedding_cache"
+INITIAL_CAPACITY = 1024
+# Stores between rewrites of the JSON index; in between, new keys are only appended to the log
+COMPACT_EVERY = 64
+
+
+class CachedEmbeddings(Embeddings):
+    """Serve repeated texts from an on-disk float32 vector cache.
+
+    Vectors live in a memory-mapped array (`vectors.f32`) and a JSON index maps
+    the SHA-256 of each text to its row. New keys are appended to `index.log`;
+    the index (with the LRU ticks of cache hits) is rewritten and the log
+    emptied every `compact_every` stores, before an eviction and on `close()`.
+    The cache is tied to the model name and the `normalize_embeddings`
+    setting: if either changes, the old cache is discarded on open. When more
+    than `max_entries` vectors are stored, the least recently used ones are
+    evicted and their rows reused.
+    """
+
+    def __init__(self, embeddings, model_name, normalize_embeddings, cache_dir=CACHE_DIR, max_entries=200_000,
+                 compact_every=COMPACT_EVERY):
+        self.embeddings = embeddings
+        self.fingerprint = {"model_name": model_name, "normalize_embeddings": bool(normalize_embeddings)}
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.compact_every = compact_every
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._meta_path = os.path.join(cache_dir, "meta.json")
+        self._index_path = os.path.join(cache_dir, "index.json")
+        self._log_path = os.path.join(cache_dir, "index.log")
+        self._vectors_path = os.path.join(cache_dir, "vectors.f32")
+        self._open()
+
+    # --- storage ---
+
+    def _open(self):
+        meta = None
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        if meta is not None and meta.get("fingerprint") != self.fingerprint:
+            logging.info(f"Embedding cache at {self.cache_dir} was built for {meta.get('fingerprint')}; clearing it.")
+            shutil.rmtree(self.cache_dir)
+            meta = None
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self.dim = meta["dim"] if meta else None
+        self.capacity = meta["capacity"] if meta else 0
+        self.entries = {}  # text hash -> [row, last used tick]
+        self.free_rows = []
+        self.tick = 0
+        self.vectors = None
+        self._stores = 0  # since the last compaction
+        self._dirty = False
+
+        if meta and meta["dim"] is not None and os.path.exists(self._vectors_path):
+            if os.path.exists(self._index_path):
+                with open(self._index_path, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+                self.entries = index["entries"]
+                self.tick = index["tick"]
+            self._replay_log()
+            self.vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+            used = {row for row, _ in self.entries.values()}
+            self.free_rows = [row for row in range(self.capacity - 1, -1, -1) if row not in used]
+
+    def _replay_log(self):
+        """Apply the keys stored since the last compaction; a torn last line is ignored."""
+        if not os.path.exists(self._log_path):
+            return
+        with open(self._log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    key, row, tick = json.loads(line)
+                except ValueError:
+                    break
+                if row < self.capacity:
+                    self.entries[key] = [row, tick]
+                    self.tick = max(self.tick, tick)
+                    self._dirty = True
+
+    def _write_json(self, path, payload):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, path)
+
+    def _write_meta(self):
+        self._write_json(self._meta_path, {"fingerprint": self.fingerprint, "dim": self.dim, "capacity": self.capacity})
+
+    def _grow(self, needed):
+        new_capacity = max(self.capacity, INITIAL_CAPACITY)
+        while new_capacity - self.capacity + len(self.free_rows) < needed:
+            new_capacity *= 2
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.vectors = None
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(new_capacity * self.dim * 4)
+        self.free_rows = list(range(new_capacity - 1, self.capacity - 1, -1)) + self.free_rows
+        self.capacity = new_capacity
+        self.vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(self.capacity, self.dim))
+        # Logged rows past the recorded capacity would be dropped on open
+        self._write_meta()
+
+    def _evict(self, needed):
+        overflow = len(self.entries) + needed - self.max_entries
+        if overflow <= 0:
+            return False
+        # Evict a little extra so eviction does not run on every insert.
+        count = min(len(self.entries), overflow + self.max_entries // 10)
+        oldest = sorted(self.entries.items(), key=lambda item: item[1][1])[:count]
+        for key, (row, _) in oldest:
+            del self.entries[key]
+            self.free_rows.append(row)
+        logging.info(f"Evicted {count} vectors from embedding cache")
+        return True
+
+    def _store(self, keys, vectors):
+        # Another thread may have embedded and stored the same text meanwhile; a second row would leak
+        new = [i for i, key in enumerate(keys) if key not in self.entries]
+        if not new:
+            return
+        keys = [keys[i] for i in new]
+        vectors = vectors[new]
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        # Drop the evicted keys from disk before their rows are overwritten
+        if self._evict(len(keys)):
+            self.compact()
+        if len(self.free_rows) < len(keys):
+            self._grow(len(keys))
+        lines = []
+        for key, vector in zip(keys, vectors):
+            row = self.free_rows.pop()
+            self.vectors[row] = vector
+            self.tick += 1
+            self.entries[key] = [row, self.tick]
+            lines.append(json.dumps([key, row, self.tick]) + "\n")
+        # Vectors reach the file before the log points at them
+        self.vectors.flush()
+        with open(self._log_path, "a", encoding="utf-8") as f:
+            f.write("".join(lines))
+        self._dirty = True
+        self._stores += 1
+        if self._stores >= self.compact_every:
+            self.compact()
+
+    def compact(self):
+        """Rewrite the hash index with the current LRU ticks and empty the key log."""
+        if self.vectors is not None:
+            self.vectors.flush()
+        # Emptying the log first means a crash in between only loses cache entries, never mislabels rows
+        open(self._log_path, "w").close()
+        self._write_json(self._index_path, {"entries": self.entries, "tick": self.tick})
+        self._write_meta()
+        self._stores = 0
+        self._dirty = False
+
+    def close(self):
+        """Persist the index, including hit ticks not yet written."""
+        with self._lock:
+            if self._dirty:
+                self.compact()
+
+    # --- Embeddings interface ---
+
+    def _lookup(self, keys):
+        found = {}
+        for key in keys:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.tick += 1
+                entry[1] = self.tick
+                found[key] = entry[0]
+        if found:
+            self._dirty = True
+        return found
+
+    def _embed(self, texts, prefix, compute):
+        keys = [prefix + hashlib.sha256(text.encode("utf-8")).hexdigest()[:32] for text in texts]
+        with self._lock:
+            found = self._lookup(keys)
+            cached = dict(zip(found, self.vectors[list(found.values())])) if found else {}
+            missing = {}
+            for key, text in zip(keys, texts):
+                if key not in cached:
+                    missing[key] = text
+            self.hits += len(keys) - sum(1 for key in keys if key in missing)
+            self.misses += len(missing)
+        if missing:
+            new_vectors = np.asarray(compute(list(missing.values())), dtype=np.float32)
+            cached.update(zip(missing, new_vectors))
+            with self._lock:
+                self._store(list(missing), new_vectors)
+        return np.stack([cached[key] for key in keys]).tolist()
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        return self._embed(texts, "d:", self.embeddings.embed_documents)
+
+    def embed_query(self, text):
+        return self._embed([text], "q:", lambda texts: [self.embeddings.embed_query(texts[0])])[0]
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import logging
+import os
+
+from tracing import Tracer
+
+MANIFEST_NAME = "index_manifest.json"
+MANIFEST_VERSION = 1
+
+
+def content_hash(text):
+    """Return a hex SHA-256 digest of a string."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def metadata_hash(metadata):
+    """Hash chunk metadata so metadata-only changes can be detected without re-embedding."""
+    return content_hash(json.dumps(metadata or {}, sort_keys=True, default=str))[:16]
+
+
+def assign_chunk_ids(docs):
+    """Give every chunk a content-addressed ID that is stable across runs.
+
+    The ID is derived from the source path and the chunk text, so an unchanged
+    chunk keeps its ID even when rows are inserted or removed around it.
+    Identical chunks from the same source get a numeric suffix.
+    """
+    seen = {}
+    ids = []
+    for doc in docs:
+        source = str(doc.metadata.get("source", ""))
+        base = content_hash(f"{source}\n{doc.page_content}")[:32]
+        n = seen.get(base, 0)
+        seen[base] = n + 1
+        ids.append(base if n == 0 else f"{base}-{n}")
+    return ids
+
+
+def load_manifest(path):
+    """Load the index manifest, or return an empty one if it does not exist."""
+    if not os.path.exists(path):
+        return {"version": MANIFEST_VERSION, "sources": {}}
+    with open(path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("version") != MANIFEST_VERSION:
+        logging.warning(f"Ignoring manifest {path} with unknown version {manifest.get('version')}")
+        return {"version": MANIFEST_VERSION, "sources": {}}
+    return manifest
+
+
+def save_manifest(manifest, path):
+    """Write the manifest atomically so a crash never leaves a half-written file."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def index_version(manifest_path):
+    """Digest of the manifest, which changes whenever a sync changes the indexed chunks.
+
+    Returns an empty string when the collection has no manifest yet.
+    """
+    if not os.path.exists(manifest_path):
+        return ""
+    with open(manifest_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:32]
+
+
+def manifest_from_collection(collection):
+    """Rebuild a manifest from what is actually stored in a Chroma collection."""
+    stored = collection.get(include=["metadatas"])
+    sources = {}
+    for chunk_id, metadata in zip(stored["ids"], stored["metadatas"]):
+        source = str((metadata or {}).get("source", ""))
+        sources.setdefault(source, {})[chunk_id] = metadata_hash(metadata)
+    return {"version": MANIFEST_VERSION, "sources": sources}
+
+
+def _batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def sync_collection(collection, embeddings, docs, manifest_path, batch_size=256, tracer=None):
+    """Bring a Chroma collection in line with `docs`, embedding only new chunks.
+
+    New chunks are embedded and upserted, chunks whose metadata changed are
+    updated in place, and chunks that no longer exist in any source are
+    deleted. Returns a dict with the number of added, updated, deleted and
+    unchanged chunks. With a `tracer`, each embedding batch and Chroma write
+    is recorded as an "embed" or "chroma_write" span.
+    """
+    tracer = tracer or Tracer("incremental_index")
+    manifest = load_manifest(manifest_path)
+    known_count = sum(len(chunks) for chunks in manifest["sources"].values())
+    if known_count != collection.count():
+        logging.warning(
+            f"Manifest lists {known_count} chunks but collection holds {collection.count()}; "
+            "rebuilding manifest from the collection."
+        )
+        manifest = manifest_from_collection(collection)
+
+    known = {}
+    for chunks in manifest["sources"].values():
+        known.update(chunks)
+
+    ids = assign_chunk_ids(docs)
+    sources = {}
+    to_add, to_update = [], []
+    for chunk_id, doc in zip(ids, docs):
+        meta_hash = metadata_hash(doc.metadata)
+        sources.setdefault(str(doc.metadata.get("source", "")), {})[chunk_id] = meta_hash
+        if chunk_id not in known:
+            to_add.append((chunk_id, doc))
+        elif known[chunk_id] != meta_hash:
+            to_update.append((chunk_id, doc))
+
+    current_ids = set(ids)
+    stale_ids = [chunk_id for chunk_id in known if chunk_id not in current_ids]
+
+    for batch in _batches(stale_ids, batch_size):
+        with tracer.span("chroma_write", operation="delete") as span:
+            collection.delete(ids=batch)
+            span.count(chunks=len(batch))
+
+    for batch in _batches(to_update, batch_size):
+        with tracer.span("chroma_write", operation="update") as span:
+            collection.update(
+                ids=[chunk_id for chunk_id, _ in batch],
+                metadatas=[doc.metadata or None for _, doc in batch],
+            )
+            span.count(chunks=len(batch))
+
+    for batch in _batches(to_add, batch_size):
+        texts = [doc.page_content for _, doc in batch]
+        with tracer.span("embed") as span:
+            vectors = embeddings.embed_documents(texts)
+            span.count(chunks=len(texts), characters=sum(len(text) for text in texts))
+        with tracer.span("chroma_write", operation="upsert") as span:
+            collection.upsert(
+                ids=[chunk_id for chunk_id, _ in batch],
+                embeddings=vectors,
+                documents=texts,
+                metadatas=[doc.metadata or None for _, doc in batch],
+            )
+            span.count(chunks=len(batch))
+
+    save_manifest({"version": MANIFEST_VERSION, "sources": sources}, manifest_path)
+
+    return {
+        "added": len(to_add),
+        "updated": len(to_update),
+        "deleted": len(stale_ids),
+        "unchanged": len(ids) - len(to_add) - len(to_update),
+    }
@@ -0,0 +1,128 @@
+"""
+load_test.py
+
+Concurrent load generator for rag_server.py. Sends `--requests` questions at
+`--concurrency` in flight over a shared keep-alive session and reports
+throughput and latency percentiles, split by answer route. With `--stream`
+the streaming endpoint is used and time to first token is reported as well.
+
+    python src/rag_pipeline/load_test.py --url http://localhost:8080 --requests 200 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+
+import aiohttp
+import numpy as np
+
+DEFAULT_QUERIES = [
+    "What are the key factors for choosing a server CPU?",
+    "How does cache size affect server workloads?",
+    "Which CPUs are similar to the EPYC 7763?",
+    "What is the best server CPU under $2000 and 200W?",
+]
+
+
+async def post_streaming(session, url, query, start, first_tokens):
+    """POST to /query/stream, read every event and record when the first token arrived."""
+    route = "unknown"
+    async with session.post(f"{url}/query/stream", json={"query": query}) as response:
+        if response.status != 200:
+            await response.read()
+            return response.status, route
+        async for line in response.content:
+            event = json.loads(line)
+            if event["type"] in ("token", "answer") and start is not None:
+                first_tokens.append(time.perf_counter() - start)
+                start = None
+            if event["type"] == "done":
+                route = event["route"]
+    return response.status, route
+
+
+async def run(url, queries, requests, concurrency, timeout, stream=False):
+    latencies = []
+    first_tokens = []
+    routes = Counter()
+    statuses = Counter()
+    next_request = iter(range(requests))
+
+    async def worker(session):
+        for i in next_request:
+            start = time.perf_counter()
+            try:
+                query = queries[i % len(queries)]
+                if stream:
+                    status, route = await post_streaming(session, url, query, start, first_tokens)
+                else:
+                    async with session.post(f"{url}/query", json={"query": query}) as response:
+                        status = response.status
+                        route = (await response.json()).get("route", "unknown")
+                statuses[status] += 1
+                if status == 200:
+                    latencies.append(time.perf_counter() - start)
+                    routes[route] += 1
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                statuses[type(e).__name__] += 1
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        async with session.get(f"{url}/stats") as response:
+            server_stats = await response.json()
+
+    result = {
+        "requests": requests,
+        "concurrency": concurrency,
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "statuses": {str(k): v for k, v in statuses.items()},
+        "routes": dict(routes),
+        "server": server_stats,
+    }
+    if latencies:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1e3
+        result.update(p50_ms=p50, p95_ms=p95, p99_ms=p99, mean_ms=float(np.mean(latencies)) * 1e3)
+    if first_tokens:
+        p50, p95, p99 = np.percentile(first_tokens, [50, 95, 99]) * 1e3
+        result.update(first_token_p50_ms=p50, first_token_p95_ms=p95, first_token_p99_ms=p99)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the RAG HTTP server.")
+    parser.add_argument("--url", default="http://localhost:8080")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-request timeout in seconds.")
+    parser.add_argument("--query", action="append", help="Question to send (repeatable; default: a built-in mix).")
+    parser.add_argument("--stream", action="store_true", help="Use /query/stream and report time to first token.")
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.url.rstrip("/"), args.query or DEFAULT_QUERIES,
+                             args.requests, args.concurrency, args.timeout, args.stream))
+
+    print(f"{result['requests']} requests at concurrency {result['concurrency']} in {result['elapsed_s']:.2f} s")
+    print(f"Throughput: {result['throughput_rps']:.1f} req/s")
+    if "p50_ms" in result:
+        print(f"Latency: p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms")
+    if "first_token_p50_ms" in result:
+        print(f"First token: p50 {result['first_token_p50_ms']:.1f} ms, p95 {result['first_token_p95_ms']:.1f} ms, "
+              f"p99 {result['first_token_p99_ms']:.1f} ms")
+    print(f"Status codes: {result['statuses']}")
+    print(f"Routes: {result['routes']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"Results saved to: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+"""
+onnx_embeddings.py
+
+all-MiniLM-L6-v2 sentence embeddings on onnxruntime, without torch or
+sentence-transformers. The model is an int8-quantized ONNX export; inference
+is tokenization (`tokenizers`), one ONNX run per batch, then the same mean
+pooling and L2 normalization sentence-transformers applies, giving the same
+384-dim normalized vectors as the HuggingFaceEmbeddings backend.
+
+    python src/rag_pipeline/onnx_embeddings.py fetch     # download the int8 export + tokenizer
+    python src/rag_pipeline/onnx_embeddings.py parity    # compare with the vectors stored in ChromaDB
+    python src/rag_pipeline/onnx_embeddings.py bench     # load time, memory and per-query latency
+
+`fetch` takes the pre-quantized exports published in the model repository
+(`onnx/model_quint8_avx2.onnx` on x86, `onnx/model_qint8_arm64.onnx` on ARM).
+`--quantize` instead downloads the float32 export and quantizes it locally
+with onnxruntime's dynamic int8 quantization (needs the `onnx` package).
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import time
+
+import numpy as np
+import onnxruntime as ort
+from langchain_core.embeddings import Embeddings
+from tokenizers import Tokenizer
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+ONNX_MODEL_DIR = "data/models/all-MiniLM-L6-v2-onnx"
+ONNX_MODEL_FILE = "model_int8.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+# sentence-transformers truncates all-MiniLM-L6-v2 inputs at 256 word pieces
+MAX_SEQ_LENGTH = 256
+PARITY_MIN_COSINE = 0.99
+
+
+def default_variant():
+    """The published int8 export suited to this CPU."""
+    machine = platform.machine().lower()
+    return "onnx/model_qint8_arm64.onnx" if machine in ("arm64", "aarch64") else "onnx/model_quint8_avx2.onnx"
+
+
+class OnnxMiniLMEmbeddings(Embeddings):
+    """LangChain Embeddings over an ONNX export of all-MiniLM-L6-v2."""
+
+    def __init__(self, model_dir=ONNX_MODEL_DIR, batch_size=32, threads=0, normalize_embeddings=True):
+        model_path = os.path.join(model_dir, ONNX_MODEL_FILE)
+        tokenizer_path = os.path.join(model_dir, TOKENIZER_FILE)
+        if not os.path.exists(model_path) or not os.path.exists(tokenizer_path):
+            raise FileNotFoundError(
+                f"No ONNX model in {model_dir}; run `python src/rag_pipeline/onnx_embeddings.py fetch` first"
+            )
+        self.model_dir = model_dir
+        self.batch_size = batch_size
+        self.normalize_embeddings = normalize_embeddings
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.no_padding()
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.output_name = self.session.get_outputs()[0].name
+
+    def _encode_batch(self, texts):
+        encodings = self.tokenizer.encode_batch(texts)
+        length = max(len(e.ids) for e in encodings)
+        ids = np.zeros((len(texts), length), dtype=np.int64)
+        mask = np.zeros((len(texts), length), dtype=np.int64)
+        for row, e in enumerate(encodings):
+            ids[row, :len(e.ids)] = e.ids
+            mask[row, :len(e.ids)] = 1
+        feed = {"input_ids": ids, "attention_mask": mask, "token_type_ids": np.zeros_like(ids)}
+        hidden = self.session.run([self.output_name], {k: v for k, v in feed.items() if k in self.input_names})[0]
+        # Mean pooling over real (non-padding) tokens, as sentence-transformers does
+        weights = mask[:, :, None].astype(np.float32)
+        pooled = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+        if self.normalize_embeddings:
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+        return pooled
+
+    def embed(self, texts):
+        """(n, 384) float32 array. Texts are batched by length so padding stays small."""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        order = np.argsort([len(t) for t in texts], kind="stable")
+        out = None
+        for start in range(0, len(texts), self.batch_size):
+            rows = order[start:start + self.batch_size]
+            vectors = self._encode_batch([texts[i] for i in rows])
+            if out is None:
+                out = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            out[rows] = vectors
+        return out
+
+    def embed_documents(self, texts):
+        return self.embed(list(texts)).tolist()
+
+    def embed_query(self, text):
+        return self.embed([text])[0].tolist()
+
+
+def fetch_model(model_dir=ONNX_MODEL_DIR, variant=None, quantize=False):
+    """Download the int8 ONNX export (or quantize the float32 one) and the tokenizer into `model_dir`."""
+    from huggingface_hub import hf_hub_download
+
+    os.makedirs(model_dir, exist_ok=True)
+    shutil.copy(hf_hub_download(EMBEDDING_MODEL, TOKENIZER_FILE), os.path.join(model_dir, TOKENIZER_FILE))
+    target = os.path.join(model_dir, ONNX_MODEL_FILE)
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        source = hf_hub_download(EMBEDDING_MODEL, "onnx/model.onnx")
+        quantize_dynamic(source, target, weight_type=QuantType.QInt8)
+        variant = "onnx/model.onnx (quantized locally)"
+    else:
+        variant = variant or default_variant()
+        shutil.copy(hf_hub_download(EMBEDDING_MODEL, variant), target)
+    with open(os.path.join(model_dir, "source.json"), "w", encoding="utf-8") as f:
+        json.dump({"model": EMBEDDING_MODEL, "variant": variant}, f, indent=2)
+    print(f"Saved {variant} ({os.path.getsize(target) / 1e6:.1f} MB) and tokenizer to {model_dir}")
+
+
+def parity_check(embeddings, reference_vectors, texts, min_cosine=PARITY_MIN_COSINE):
+    """Compare `embeddings` on `texts` with reference vectors for the same texts.
+
+    Returns cosine statistics and how often each text's own reference vector
+    is its nearest neighbour among all the references (retrieval agreement).
+    """
+    reference = np.asarray(reference_vectors, dtype=np.float32)
+    vectors = embeddings.embed(texts) if hasattr(embeddings, "embed") else np.asarray(embeddings.embed_documents(texts))
+    if vectors.shape != reference.shape:
+        raise ValueError(f"Shape mismatch: {vectors.shape} vs reference {reference.shape}")
+    ref_unit = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    cosine = (unit * ref_unit).sum(axis=1)
+    nearest = (unit @ ref_unit.T).argmax(axis=1)
+    return {
+        "samples": len(texts),
+        "dim": int(vectors.shape[1]),
+        "mean_norm": float(np.linalg.norm(vectors, axis=1).mean()),
+        "cosine_min": float(cosine.min()),
+        "cosine_p1": float(np.percentile(cosine, 1)),
+        "cosine_mean": float(cosine.mean()),
+        "nearest_agreement": float((nearest == np.arange(len(texts))).mean()),
+        "passed": bool(cosine.min() >= min_cosine),
+    }
+
+
+def stored_vectors(samples, seed=0):
+    """A random sample of (documents, embeddings) from the RAG ChromaDB collection."""
+    import chromadb
+    from rag_components import CHROMA_PATH, COLLECTION_NAME
+
+    collection = chromadb.PersistentClient(path=CHROMA_PATH).get_collection(COLLECTION_NAME)
+    ids = collection.get(include=[])["ids"]
+    rng = np.random.default_rng(seed)
+    ids = [ids[i] for i in rng.choice(len(ids), size=min(samples, len(ids)), replace=False)]
+    stored = collection.get(ids=ids, include=["documents", "embeddings"])
+    return stored["documents"], np.asarray(stored["embeddings"], dtype=np.float32)
+
+
+def max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Int8 ONNX backend for all-MiniLM-L6-v2 embeddings.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    fetch = sub.add_parser("fetch", help="Download the int8 ONNX export and tokenizer.")
+    fetch.add_argument("--variant", help="ONNX file in the model repository (default depends on the CPU).")
+    fetch.add_argument("--quantize", action="store_true", help="Quantize the float32 export locally instead.")
+    parity = sub.add_parser("parity", help="Compare with the vectors stored in ChromaDB.")
+    parity.add_argument("--samples", type=int, default=500)
+    bench = sub.add_parser("bench", help="Measure load time, peak memory and per-query latency.")
+    bench.add_argument("--queries", type=int, default=200)
+    for p in (fetch, parity, bench):
+        p.add_argument("--model-dir", default=ONNX_MODEL_DIR)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == "fetch":
+        fetch_model(args.model_dir, args.variant, args.quantize)
+        return
+
+    start = time.perf_counter()
+    embeddings = OnnxMiniLMEmbeddings(args.model_dir)
+    load_seconds = time.perf_counter() - start
+
+    if args.command == "parity":
+        texts, reference = stored_vectors(args.samples)
+        result = parity_check(embeddings, reference, texts)
+        print(json.dumps(result, indent=2))
+        if not result["passed"]:
+            raise SystemExit(f"Parity check failed: min cosine {result['cosine_min']:.4f} < {PARITY_MIN_COSINE}")
+        return
+
+    queries = [f"Which server CPU has the best value under ${500 + 10 * i} with at least {8 + i % 56} cores?"
+               for i in range(args.queries)]
+    embeddings.embed_query("warm-up")
+    latencies = []
+    for query in queries:
+        t = time.perf_counter()
+        embeddings.embed_query(query)
+        latencies.append(time.perf_counter() - t)
+    p50, p95 = np.percentile(latencies, [50, 95]) * 1e3
+    print(f"Model load: {load_seconds:.2f} s, peak RSS {max_rss_mb():.0f} MB")
+    print(f"embed_query over {len(queries)} queries: p50 {p50:.2f} ms, p95 {p95:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
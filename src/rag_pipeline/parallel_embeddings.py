@@ -0,0 +1,127 @@
+import logging
+import multiprocessing
+import os
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Per-worker state, set once by _init_worker in each pool process.
+_model = None
+_normalize = True
+
+
+def _init_worker(model_name, normalize_embeddings, threads_per_worker, core_queue):
+    """Pin the worker to its cores, cap its thread pools, then load the model once."""
+    global _model, _normalize
+    cores = core_queue.get() if core_queue is not None else None
+    if cores:
+        os.sched_setaffinity(0, cores)
+    # Must be set before torch is imported in this process.
+    os.environ["OMP_NUM_THREADS"] = str(threads_per_worker)
+    os.environ["MKL_NUM_THREADS"] = str(threads_per_worker)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(threads_per_worker)
+    _model = SentenceTransformer(model_name, device="cpu")
+    _normalize = normalize_embeddings
+
+
+def _encode_batch(task):
+    batch_index, texts = task
+    vectors = _model.encode(
+        texts,
+        batch_size=len(texts),
+        normalize_embeddings=_normalize,
+        convert_to_numpy=True,
+        show_progress_bar=False,
+    )
+    return batch_index, vectors.astype(np.float32, copy=False)
+
+
+def length_sorted_batches(texts, batch_size):
+    """Group text indices into batches of similar length to minimise padding.
+
+    Returns a list of index arrays; concatenated they cover every text once.
+    """
+    order = np.argsort([-len(text) for text in texts], kind="stable")
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+class ParallelEmbeddings(Embeddings):
+    """Sentence-transformers embeddings sharded across a pool of CPU worker processes.
+
+    Texts are sorted by length and cut into batches of `batch_size`, so each
+    batch pads to roughly the same length. Batches are spread over
+    `num_workers` processes, each limited to `threads_per_worker` intra-op
+    threads and (on Linux, with `pin_threads`) pinned to its own cores.
+    Vectors come back in the original text order.
+    """
+
+    def __init__(self, model_name, normalize_embeddings=True, num_workers=None,
+                 threads_per_worker=1, batch_size=32, pin_threads=True):
+        self.model_name = model_name
+        self.normalize_embeddings = normalize_embeddings
+        self.threads_per_worker = max(1, threads_per_worker)
+        self.num_workers = num_workers or max(1, (os.cpu_count() or 1) // self.threads_per_worker)
+        self.batch_size = batch_size
+        self.pin_threads = pin_threads and hasattr(os, "sched_setaffinity")
+        self._pool = None
+
+    def _core_groups(self):
+        cores = sorted(os.sched_getaffinity(0))
+        groups = []
+        for worker in range(self.num_workers):
+            start = (worker * self.threads_per_worker) % len(cores)
+            groups.append(set(cores[start:start + self.threads_per_worker]))
+        return groups
+
+    def _get_pool(self):
+        if self._pool is None:
+            # spawn avoids forking a parent that may already hold torch/OpenMP threads.
+            ctx = multiprocessing.get_context("spawn")
+            core_queue = None
+            if self.pin_threads:
+                core_queue = ctx.Queue()
+                for group in self._core_groups():
+                    core_queue.put(group)
+            logging.info(
+                f"Starting {self.num_workers} embedding workers "
+                f"({self.threads_per_worker} thread(s) each, batch size {self.batch_size})"
+            )
+            self._pool = ctx.Pool(
+                processes=self.num_workers,
+                initializer=_init_worker,
+                initargs=(self.model_name, self.normalize_embeddings, self.threads_per_worker, core_queue),
+            )
+        return self._pool
+
+    def close(self):
+        """Shut down the worker pool."""
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        batches = length_sorted_batches(texts, self.batch_size)
+        tasks = [(i, [texts[j] for j in batch]) for i, batch in enumerate(batches)]
+        output = None
+        for batch_index, vectors in self._get_pool().imap_unordered(_encode_batch, tasks):
+            if output is None:
+                output = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            output[batches[batch_index]] = vectors
+        return output.tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
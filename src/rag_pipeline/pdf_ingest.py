@@ -0,0 +1,233 @@
+"""
+pdf_ingest.py
+
+Parallel, cached text extraction for the reference PDFs in data/documents/.
+
+Pages are extracted with pypdf in a process pool, a few pages per task, and
+each page's text is cached on disk under its file's SHA-256 and its page
+number:
+
+    data/pdf_cache/files.json              path -> size, mtime and SHA-256 of the last version seen
+    data/pdf_cache/<sha256>/meta.json      page count, page labels, document info
+    data/pdf_cache/<sha256>/00012.txt      text of page 12
+
+An unchanged file (same size and mtime) is neither re-hashed nor parsed; its
+pages come straight from the cache. A run that was interrupted only extracts
+the pages that are still missing. Pages are yielded in order as soon as they
+are available, so the chunker consumes them while later pages are still
+being extracted, and at most a bounded number of tasks is in flight.
+
+The Documents carry the same metadata as PyPDFLoader's, plus doc_type
+"reference".
+
+    python src/rag_pipeline/pdf_ingest.py [data/documents] --workers 8
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from langchain_core.documents import Document
+
+from cpu_metadata import REFERENCE
+
+DOCUMENTS_DIR = "data/documents"
+PDF_CACHE_DIR = "data/pdf_cache"
+# Each task opens its own PdfReader, so tasks are a few pages rather than one
+PAGES_PER_TASK = 8
+# Tasks queued per worker ahead of the consumer
+TASKS_PER_WORKER = 4
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def extract_pages(path, pages):
+    """[(page, text)] for some pages of one PDF. Runs in a worker process."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    return [(page, reader.pages[page].extract_text().strip()) for page in pages]
+
+
+def read_meta(path):
+    """Page count, page labels and document info, as PyPDFLoader reports them."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(path)
+    info = {"producer": "PyPDF", "creator": "PyPDF", "creationdate": ""}
+    for key, value in (reader.metadata or {}).items():
+        info[key.lstrip("/").lower()] = str(value)
+    return {"pages": len(reader.pages), "page_labels": list(reader.page_labels), "info": info}
+
+
+def _write_json(path, payload):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class PdfPageCache:
+    """Per-page text cache keyed by file SHA-256 and page number."""
+
+    def __init__(self, cache_dir=PDF_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.index_path = os.path.join(cache_dir, "files.json")
+        os.makedirs(cache_dir, exist_ok=True)
+        self.files = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self.files = json.load(f)
+
+    def file_hash(self, path):
+        """SHA-256 of `path`, re-hashing only when its size or mtime changed."""
+        stat = os.stat(path)
+        known = self.files.get(path)
+        if known and known["size"] == stat.st_size and known["mtime_ns"] == stat.st_mtime_ns:
+            return known["sha256"]
+        sha = file_sha256(path)
+        if known and known["sha256"] != sha:
+            # The old version's pages can never be requested again
+            shutil.rmtree(os.path.join(self.cache_dir, known["sha256"]), ignore_errors=True)
+        self.files[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha}
+        _write_json(self.index_path, self.files)
+        return sha
+
+    def meta(self, sha, path):
+        meta_path = os.path.join(self.cache_dir, sha, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        meta = read_meta(path)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        _write_json(meta_path, meta)
+        return meta
+
+    def page_path(self, sha, page):
+        return os.path.join(self.cache_dir, sha, f"{page:05d}.txt")
+
+    def get(self, sha, page):
+        try:
+            with open(self.page_path(sha, page), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, sha, page, text):
+        path = self.page_path(sha, page)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(path + ".tmp", path)
+
+
+def find_pdfs(documents_dir=DOCUMENTS_DIR):
+    return sorted(glob.glob(os.path.join(documents_dir, "**", "*.pdf"), recursive=True))
+
+
+def iter_pdf_pages(paths, workers=None, cache_dir=PDF_CACHE_DIR, pages_per_task=PAGES_PER_TASK, stats=None):
+    """Yield one Document per PDF page, in file and page order.
+
+    Cached pages are read from disk; the others are extracted by `workers`
+    processes (default: one per core, 0 = in this process). Pass a dict as
+    `stats` to get file and page counts once the generator is exhausted.
+    """
+    cache = PdfPageCache(cache_dir)
+    workers = os.cpu_count() if workers is None else workers
+    stats = {} if stats is None else stats
+    stats.update({"files": 0, "pages": 0, "cached_pages": 0, "extracted_pages": 0})
+    start = time.perf_counter()
+
+    files = []
+    for path in paths:
+        sha = cache.file_hash(path)
+        meta = cache.meta(sha, path)
+        missing = [page for page in range(meta["pages"]) if not os.path.exists(cache.page_path(sha, page))]
+        files.append((path, sha, meta, set(missing)))
+    tasks = deque()
+    for path, sha, meta, missing in files:
+        missing = sorted(missing)
+        # In-process there is nothing to spread, so each file is parsed with a single reader
+        size = pages_per_task if workers > 0 else max(1, len(missing))
+        tasks.extend((path, sha, missing[i:i + size]) for i in range(0, len(missing), size))
+
+    executor = ProcessPoolExecutor(workers) if workers > 0 and tasks else None
+    in_flight = deque()
+
+    def fill():
+        while tasks and len(in_flight) < max(1, workers) * TASKS_PER_WORKER:
+            path, sha, pages = tasks.popleft()
+            if executor is None:
+                in_flight.append((sha, extract_pages(path, pages)))
+            else:
+                in_flight.append((sha, executor.submit(extract_pages, path, pages)))
+
+    try:
+        fill()
+        extracted = {}
+        for path, sha, meta, missing in files:
+            stats["files"] += 1
+            for page in range(meta["pages"]):
+                if page in missing:
+                    while (sha, page) not in extracted:
+                        # Tasks are queued in file and page order, which is the order pages are yielded
+                        task_sha, result = in_flight.popleft()
+                        for number, text in (result if executor is None else result.result()):
+                            cache.put(task_sha, number, text)
+                            extracted[(task_sha, number)] = text
+                        fill()
+                    text = extracted.pop((sha, page))
+                    stats["extracted_pages"] += 1
+                else:
+                    text = cache.get(sha, page)
+                    stats["cached_pages"] += 1
+                stats["pages"] += 1
+                labels = meta["page_labels"]
+                yield Document(
+                    page_content=text,
+                    metadata={
+                        **meta["info"],
+                        "source": path,
+                        "total_pages": meta["pages"],
+                        "page": page,
+                        "page_label": labels[page] if page < len(labels) else str(page + 1),
+                        "doc_type": REFERENCE,
+                    },
+                )
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+        stats["seconds"] = time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract and cache the text of every PDF in a directory.")
+    parser.add_argument("documents_dir", nargs="?", default=DOCUMENTS_DIR)
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes (default: one per core).")
+    parser.add_argument("--cache-dir", default=PDF_CACHE_DIR)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    stats = {}
+    chars = sum(len(doc.page_content) for doc in iter_pdf_pages(find_pdfs(args.documents_dir), args.workers,
+                                                                  args.cache_dir, stats=stats))
+    logging.info(
+        f"{stats['files']} PDFs, {stats['pages']} pages ({stats['extracted_pages']} extracted, "
+        f"{stats['cached_pages']} from cache), {chars} characters in {stats['seconds']:.2f} s"
+    )
+
+
+if __name__ == "__main__":
+    main()
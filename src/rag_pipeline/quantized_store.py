@@ -0,0 +1,329 @@
+"""
+quantized_store.py
+
+A compact, memory-mapped alternative to the Chroma HNSW index for the
+cpu_docs_smollm3_ollama collection.
+
+The collection's 384-dim float32 embeddings are exported once to plain .npy
+files next to ChromaDB, together with two quantized copies:
+
+    int8    one signed byte per dimension plus a per-vector scale (4x smaller)
+    binary  one sign bit per dimension, packed (32x smaller)
+
+A query scans the quantized codes for the whole collection with NumPy --
+blocked int8 dot products, or XOR + popcount Hamming distances -- keeps the
+best `k * oversample` candidates, and rescores only those against the
+float32 vectors, so the final ranking uses exact cosine similarity. Every
+file is opened with `np.load(mmap_mode="r")`: loading is an mmap rather than
+an unpickle, the scan touches only the small code matrix, and the rerank
+pages in just the candidates' float rows.
+
+Chroma-style `where` filters (as built by query_constraints.to_chroma_where)
+are evaluated on vectorized metadata columns, so QuantizedVectorStore can
+stand in for Chroma in HybridRetriever. Select it with
+`RAG_VECTORSTORE=int8` (or `binary`).
+
+    python src/rag_pipeline/quantized_store.py export    # from data/chroma_db/smollm3
+    python src/rag_pipeline/quantized_store.py bench     # memory, open time vs Chroma, latency, recall@k
+"""
+
+import argparse
+import json
+import logging
+import operator
+import os
+import resource
+import time
+from datetime import datetime
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from incremental_index import MANIFEST_NAME, index_version
+
+QUANTIZED_PATH = "data/chroma_db/smollm3_quantized"
+MODES = ("int8", "binary")
+# Candidates rescored in float32 per result; sign bits lose more information than int8
+OVERSAMPLE = {"int8": 4, "binary": 10}
+# Rows cast to float32 at a time by the int8 scan (about 25 MB per block at 384 dims)
+SCAN_BLOCK_ROWS = 16384
+EXPORT_PAGE_ROWS = 5000
+
+WHERE_OPERATORS = {"$eq": operator.eq, "$ne": operator.ne, "$gt": operator.gt, "$gte": operator.ge,
+                   "$lt": operator.lt, "$lte": operator.le}
+
+
+def quantize_int8(vectors):
+    """Symmetric per-vector int8 codes and the scale that maps them back."""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def quantize_binary(vectors):
+    """Sign bits of every dimension, packed eight to a byte."""
+    return np.packbits(vectors > 0, axis=1)
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def write_store(path, ids, texts, metadatas, vectors, source_version=None):
+    """Write float32 vectors, both quantized code sets and the documents to `path`."""
+    os.makedirs(path, exist_ok=True)
+    vectors = _normalize(vectors)
+    codes, scales = quantize_int8(vectors)
+    arrays = {"vectors.f32": vectors, "codes.int8": codes, "scales.f32": scales, "codes.bin": quantize_binary(vectors)}
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f"{name}.tmp.npy"), array)
+        os.replace(os.path.join(path, f"{name}.tmp.npy"), os.path.join(path, f"{name}.npy"))
+    with open(os.path.join(path, "documents.json.tmp"), "w", encoding="utf-8") as f:
+        json.dump({"ids": list(ids), "texts": list(texts), "metadatas": [m or {} for m in metadatas]}, f)
+    os.replace(os.path.join(path, "documents.json.tmp"), os.path.join(path, "documents.json"))
+    with open(os.path.join(path, "store.json"), "w", encoding="utf-8") as f:
+        json.dump({"count": len(vectors), "dim": int(vectors.shape[1]) if len(vectors) else 0,
+                   "index_version": source_version, "created": datetime.now().isoformat(timespec="seconds")},
+                  f, indent=2)
+
+
+def export_collection(collection, path=QUANTIZED_PATH, manifest_path=None):
+    """Export a Chroma collection's embeddings, documents and metadata to a quantized store."""
+    ids, texts, metadatas, vectors = [], [], [], []
+    total = collection.count()
+    for offset in range(0, total, EXPORT_PAGE_ROWS):
+        page = collection.get(include=["embeddings", "documents", "metadatas"], offset=offset, limit=EXPORT_PAGE_ROWS)
+        ids.extend(page["ids"])
+        texts.extend(page["documents"])
+        metadatas.extend(page["metadatas"])
+        vectors.append(np.asarray(page["embeddings"], dtype=np.float32))
+    vectors = np.concatenate(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+    version = index_version(manifest_path) if manifest_path else None
+    write_store(path, ids, texts, metadatas, vectors, source_version=version)
+    return len(ids)
+
+
+class QuantizedVectorStore(VectorStore):
+    """Read-only vector store: quantized scan over mmapped codes, exact float32 rerank."""
+
+    def __init__(self, embedding_function, path=QUANTIZED_PATH, mode="int8", oversample=None, manifest_path=None):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}, not {mode!r}")
+        if not os.path.exists(os.path.join(path, "store.json")):
+            raise FileNotFoundError(
+                f"No quantized store in {path}; run `python src/rag_pipeline/quantized_store.py export` first"
+            )
+        self.embedding_function = embedding_function
+        self.path = path
+        self.mode = mode
+        self.oversample = oversample or OVERSAMPLE[mode]
+        with open(os.path.join(path, "store.json"), "r", encoding="utf-8") as f:
+            self.info = json.load(f)
+        if manifest_path and self.info.get("index_version") != index_version(manifest_path):
+            logging.warning(f"Quantized store {path} is older than the Chroma collection; re-run the export")
+
+        self.vectors = self._load("vectors.f32")
+        if mode == "int8":
+            self.codes = self._load("codes.int8")
+            self.scales = self._load("scales.f32")
+        else:
+            self.codes = self._load("codes.bin")
+            self.scales = None
+        with open(os.path.join(path, "documents.json"), "r", encoding="utf-8") as f:
+            documents = json.load(f)
+        self.ids = documents["ids"]
+        self.texts = documents["texts"]
+        self.metadatas = documents["metadatas"]
+        self._columns = {}
+
+    def _load(self, name):
+        return np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def embeddings(self):
+        return self.embedding_function
+
+    @property
+    def scan_bytes(self):
+        """Size of the data every query scans."""
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    # --- filters ---
+
+    def _column(self, name):
+        """Metadata column as a float array (NaN = missing) or, for text, an object array."""
+        column = self._columns.get(name)
+        if column is None:
+            values = [metadata.get(name) for metadata in self.metadatas]
+            if all(v is None or (isinstance(v, (int, float)) and not isinstance(v, bool)) for v in values):
+                column = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+            else:
+                column = np.array(values, dtype=object)
+            self._columns[name] = column
+        return column
+
+    def where_mask(self, where):
+        """Boolean mask of the documents matching a Chroma `where` filter."""
+        if "$and" in where:
+            return np.logical_and.reduce([self.where_mask(clause) for clause in where["$and"]])
+        if "$or" in where:
+            return np.logical_or.reduce([self.where_mask(clause) for clause in where["$or"]])
+        (name, condition), = where.items()
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        (op, value), = condition.items()
+        column = self._column(name)
+        if op in ("$in", "$nin"):
+            mask = np.isin(column, list(value))
+            return ~mask if op == "$nin" else mask
+        if column.dtype == object and op not in ("$eq", "$ne"):
+            # Ordered comparisons only apply to numbers, as in Chroma
+            return np.zeros(len(column), dtype=bool)
+        with np.errstate(invalid="ignore"):
+            return np.asarray(WHERE_OPERATORS[op](column, value), dtype=bool)
+
+    # --- search ---
+
+    def _scan(self, query):
+        """Approximate scores for every document (higher is better)."""
+        if self.mode == "binary":
+            bits = np.packbits(query > 0)
+            distance = np.bitwise_count(np.bitwise_xor(self.codes, bits)).sum(axis=1, dtype=np.int32)
+            return -distance.astype(np.float32)
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), SCAN_BLOCK_ROWS):
+            block = self.codes[start:start + SCAN_BLOCK_ROWS]
+            scores[start:start + len(block)] = (block.astype(np.float32) @ query) * self.scales[start:start + len(block)]
+        return scores
+
+    def search_vector(self, query_vector, k=4, filter=None):
+        """[(doc index, cosine similarity)] for the best `k` documents, best first."""
+        if not len(self.ids):
+            return []
+        query = _normalize(query_vector)
+        scores = self._scan(query)
+        if filter:
+            scores[~self.where_mask(filter)] = -np.inf
+        n_candidates = min(len(scores), k * self.oversample)
+        candidates = np.argpartition(-scores, n_candidates - 1)[:n_candidates]
+        candidates = np.sort(candidates[np.isfinite(scores[candidates])])
+        # Exact cosine on the float32 rows of the candidates only
+        exact = self.vectors[candidates] @ query
+        best = np.argsort(-exact, kind="stable")[:k]
+        return [(int(candidates[i]), float(exact[i])) for i in best]
+
+    def document(self, i):
+        return Document(id=self.ids[i], page_content=self.texts[i], metadata=self.metadatas[i])
+
+    def similarity_search_by_vector(self, embedding, k=4, filter=None, **kwargs):
+        return [self.document(i) for i, _ in self.search_vector(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query, k=4, filter=None, **kwargs):
+        """Documents with their cosine similarity to the query (higher is closer)."""
+        vector = self.embedding_function.embed_query(query)
+        return [(self.document(i), score) for i, score in self.search_vector(vector, k, filter)]
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return self.similarity_search_by_vector(self.embedding_function.embed_query(query), k, filter)
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score
+
+    @classmethod
+    def from_texts(cls, texts, embedding, metadatas=None, ids=None, path=QUANTIZED_PATH, mode="int8", **kwargs):
+        texts = list(texts)
+        ids = list(ids) if ids is not None else [str(i) for i in range(len(texts))]
+        write_store(path, ids, texts, metadatas or [{}] * len(texts), embedding.embed_documents(texts))
+        return cls(embedding, path=path, mode=mode, **kwargs)
+
+
+def max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def chroma_open_ms(chroma_path, collection_name, query_vector, k):
+    """Time to open the Chroma collection and answer a first query (HNSW index load included)."""
+    import chromadb
+    from chromadb.config import Settings
+
+    start = time.perf_counter()
+    client = chromadb.PersistentClient(path=chroma_path, settings=Settings(anonymized_telemetry=False))
+    client.get_collection(collection_name).query(query_embeddings=[query_vector.tolist()], n_results=k)
+    return (time.perf_counter() - start) * 1e3
+
+
+def bench(path, queries, k, seed=0, chroma=None):
+    """Scan size, open time, latency and recall@k against exact float32 search.
+
+    `chroma` = (path, collection name) also times a cold open of the Chroma collection.
+    """
+    vectors = np.load(os.path.join(path, "vectors.f32.npy"))
+    rng = np.random.default_rng(seed)
+    # Perturbed stored vectors stand in for query embeddings, so no model is needed
+    targets = vectors[rng.integers(0, len(vectors), queries)]
+    query_vectors = _normalize(targets + rng.normal(0, 0.05, targets.shape).astype(np.float32))
+    exact = [set(np.argsort(-(vectors @ q))[:k].tolist()) for q in query_vectors]
+
+    results = {"documents": len(vectors), "float32_bytes": int(vectors.nbytes), "k": k}
+    if chroma:
+        results["chroma_open_ms"] = chroma_open_ms(*chroma, query_vectors[0], k)
+    for mode in MODES:
+        start = time.perf_counter()
+        store = QuantizedVectorStore(None, path=path, mode=mode)
+        store.search_vector(query_vectors[0], k)
+        open_ms = (time.perf_counter() - start) * 1e3
+        latencies, recall = [], []
+        for q, truth in zip(query_vectors, exact):
+            t = time.perf_counter()
+            found = store.search_vector(q, k)
+            latencies.append(time.perf_counter() - t)
+            recall.append(len(truth & {i for i, _ in found}) / k)
+        p50, p95 = np.percentile(latencies, [50, 95]) * 1e3
+        results[mode] = {
+            "scan_bytes": int(store.scan_bytes),
+            "compression": vectors.nbytes / store.scan_bytes,
+            "open_ms": open_ms,
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            f"recall@{k}": float(np.mean(recall)),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantized, memory-mapped copy of the RAG vector store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("export", help="Export the Chroma collection's embeddings and quantize them.")
+    bench_parser = sub.add_parser("bench", help="Compare int8 and binary scans with exact float32 search.")
+    bench_parser.add_argument("--queries", type=int, default=200)
+    bench_parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--path", default=QUANTIZED_PATH)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == "export":
+        import chromadb
+        from rag_components import CHROMA_PATH, COLLECTION_NAME
+
+        collection = chromadb.PersistentClient(path=CHROMA_PATH).get_collection(COLLECTION_NAME)
+        count = export_collection(collection, args.path, os.path.join(CHROMA_PATH, MANIFEST_NAME))
+        logging.info(f"Exported {count} vectors to {args.path}")
+        return
+
+    from rag_components import CHROMA_PATH, COLLECTION_NAME
+
+    chroma = (CHROMA_PATH, COLLECTION_NAME) if os.path.isdir(CHROMA_PATH) else None
+    print(json.dumps(bench(args.path, args.queries, args.k, chroma=chroma), indent=2))
+    print(f"Peak RSS {max_rss_mb():.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
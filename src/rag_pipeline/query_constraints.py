@@ -0,0 +1,125 @@
+import operator
+import re
+
+from cpu_metadata import REFERENCE
+
+PY_OPERATORS = {"==": operator.eq, "!=": operator.ne, "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+CHROMA_OPERATORS = {"==": "$eq", "!=": "$ne", "<": "$lt", "<=": "$lte", ">": "$gt", ">=": "$gte", "in": "$in"}
+
+BRANDS = {"amd": "AMD", "intel": "Intel"}
+CATEGORIES = {"server": "Server", "desktop": "Desktop", "laptop": "Laptop", "mobile": "Mobile"}
+
+UPPER = r"(less than|under|below|younger than|newer than|cheaper than|within|at most|no more than|up to|max(?:imum)?)"
+LOWER = r"(more than|over|above|older than|at least|min(?:imum)?)"
+INCLUSIVE = {"within", "at most", "no more than", "up to", "max", "maximum", "at least", "min", "minimum"}
+
+AGE_RE = re.compile(rf"(?:{UPPER}|{LOWER})\s+(\d+)\s*(?:years?|yrs?)\b")
+PRICE_RE = re.compile(rf"(?:{UPPER}|{LOWER})\s*\$\s*(\d[\d,]*(?:\.\d+)?)\s*(k?)\b")
+BUDGET_RE = re.compile(r"budget\s+(?:of\s+)?\$?\s*(\d[\d,]*(?:\.\d+)?)\s*(k?)\b")
+# Use cases the CPU tables say nothing about; questions naming one are left to RAG
+USE_CASE_RE = re.compile(
+    r"\b(virtuali[sz]\w*|vms?|gaming|games?|render\w*|video|editing|stream\w*|compil\w*|databases?|"
+    r"machine learning|ml|ai|home ?lab|nas|plex|docker|kubernetes|containers?|workloads?|hpc|use case)\b"
+)
+WATTS_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(?:w|watts?)\b")
+# The bound word governing a wattage, possibly through other capped amounts: "under $2000 and 200W"
+WATTS_BOUND_RE = re.compile(
+    rf"(?:{UPPER}|{LOWER})\s*(?:(?:tdp\s+(?:of\s+)?)?\$?\s*\d[\d,]*(?:\.\d+)?\s*(?:k|w|watts?|years?|yrs?)?\s*(?:,|and|with|&)\s*)*"
+    r"(?:a\s+)?(?:tdp\s+(?:of\s+)?)?$"
+)
+
+
+def _bound(match):
+    upper, lower = match.group(1), match.group(2)
+    word = upper or lower
+    if upper:
+        return "<=" if word in INCLUSIVE else "<"
+    return ">=" if word in INCLUSIVE else ">"
+
+
+def _amount(number, suffix):
+    value = float(number.replace(",", ""))
+    return value * 1000 if suffix else value
+
+
+def _squash(value):
+    return re.sub(r"[\s\-_]", "", value.lower())
+
+
+def extract_constraints(query, sockets=()):
+    """Turn phrases such as "under 3 years old", "AMD server", "below $2000" or "under 200W" into filters.
+
+    Returns a list of `(column, op, value)` tuples in the format used by
+    `CPUQueryEngine.mask`. `sockets` is the list of socket spellings in the
+    dataset; a socket named in the query matches every spelling that differs
+    only by case, spaces or hyphens ("LGA 2011" / "LGA2011").
+    """
+    text = query.lower()
+    constraints = []
+
+    for match in AGE_RE.finditer(text):
+        constraints.append(("age", _bound(match), int(match.group(3))))
+    for match in PRICE_RE.finditer(text):
+        constraints.append(("price", _bound(match), _amount(match.group(3), match.group(4))))
+    if not any(col == "price" for col, _, _ in constraints):
+        budget = BUDGET_RE.search(text)
+        if budget:
+            constraints.append(("price", "<=", _amount(budget.group(1), budget.group(2))))
+
+    for match in WATTS_RE.finditer(text):
+        bound = WATTS_BOUND_RE.search(text[:match.start()])
+        if bound:
+            constraints.append(("TDP", _bound(bound), float(match.group(1))))
+
+    brands = [name for word, name in BRANDS.items() if re.search(rf"\b{word}\b", text)]
+    if len(brands) == 1:
+        constraints.append(("brand_name", "==", brands[0]))
+    categories = [name for word, name in CATEGORIES.items() if re.search(rf"\b{word}s?\b", text)]
+    if len(categories) == 1:
+        constraints.append(("category", "==", categories[0]))
+
+    by_key = {}
+    for socket in sockets:
+        key = _squash(socket)
+        if len(key) >= 3 and key != "unknown":
+            by_key.setdefault(key, []).append(socket)
+    words = re.findall(r"[a-z0-9\-]+", text)
+    # Try 3-, 2- then 1-word spans so "LGA 2011-3" wins over "LGA 2011".
+    for size in (3, 2, 1):
+        spans = {_squash("".join(words[i:i + size])) for i in range(len(words) - size + 1)}
+        found = sorted(spans & by_key.keys(), key=len, reverse=True)
+        if found:
+            constraints.append(("socket", "in", sorted(set(by_key[found[0]]))))
+            break
+
+    return constraints
+
+
+def matches_constraints(metadata, constraints):
+    """Evaluate constraints against one chunk's metadata, the way the Chroma filter would."""
+    if metadata.get("doc_type") == REFERENCE:
+        return True
+    for col, op, value in constraints:
+        actual = metadata.get(col)
+        if actual is None:
+            return False
+        if op == "in":
+            if actual not in value:
+                return False
+        elif not PY_OPERATORS[op](actual, value):
+            return False
+    return True
+
+
+def to_chroma_where(constraints):
+    """Build a Chroma `where` filter that applies constraints to CPU rows only.
+
+    Reference passages (the PDF) always stay candidates, so a question that
+    merely mentions "server" still gets the background material.
+    Returns None when there are no constraints.
+    """
+    if not constraints:
+        return None
+    clauses = [{col: {CHROMA_OPERATORS[op]: value}} for col, op, value in constraints]
+    cpu_clause = clauses[0] if len(clauses) == 1 else {"$and": clauses}
+    return {"$or": [{"doc_type": {"$eq": REFERENCE}}, cpu_clause]}
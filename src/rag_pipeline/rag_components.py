@@ -0,0 +1,249 @@
+"""
+rag_components.py
+
+Builders for the pieces of the RAG pipeline shared by the scripts and the
+server. torch, the HuggingFace / Chroma / Ollama integrations and LangChain's
+chains are imported inside the builders that need them, so importing this
+module (or answering a question from the CPU tables) stays cheap.
+
+Environment:
+    RAG_EMBEDDINGS  "hf" (default, sentence-transformers on torch) or "onnx"
+                    (int8 ONNX export on onnxruntime, see onnx_embeddings.py)
+    RAG_DEVICE      torch device for the "hf" backend ("cpu", "cuda"); when
+                    unset, CUDA is used if torch finds it
+    RAG_VECTORSTORE "chroma" (default), or "int8" / "binary" for the quantized,
+                    memory-mapped copy of the collection (see quantized_store.py)
+    RAG_RERANK      over-fetch this many chunks and keep the best k by
+                    cross-encoder score (see reranker.py); unset or 0 = off
+    RAG_CONTEXT_TOKENS
+                    token budget of the compact prompt context (see
+                    context_packer.py, default 1024); 0 = stuff the chunks verbatim
+"""
+
+import logging
+import os
+
+from cpu_query_engine import CPUQueryEngine
+from incremental_index import MANIFEST_NAME
+from similar_cpus import ML_READY_PATH, SimilarCPUs, find_ml_ready
+from skyline_index import SKYLINE_PATH, SkylineIndex
+
+CHROMA_PATH = "data/chroma_db/smollm3"
+COLLECTION_NAME = "cpu_docs_smollm3_ollama"
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+NORMALIZE_EMBEDDINGS = True
+
+OLLAMA_MODEL = "alibayram/smollm3:latest"
+OLLAMA_BASE_URL = "http://localhost:11434"
+# How long Ollama keeps the model loaded between requests
+OLLAMA_KEEP_ALIVE = "30m"
+
+
+def embedding_backend():
+    return os.environ.get("RAG_EMBEDDINGS", "hf").lower()
+
+
+def load_base_embeddings(backend=None):
+    """The uncached embedding model for `backend` ("hf" or "onnx"; default from RAG_EMBEDDINGS)."""
+    backend = backend or embedding_backend()
+    if backend == "onnx":
+        from onnx_embeddings import OnnxMiniLMEmbeddings
+
+        logging.info("Using the int8 ONNX embedding backend")
+        return OnnxMiniLMEmbeddings(normalize_embeddings=NORMALIZE_EMBEDDINGS)
+    if backend != "hf":
+        raise ValueError(f"Unknown embedding backend '{backend}' (expected 'hf' or 'onnx')")
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    device = os.environ.get("RAG_DEVICE")
+    if device is None:
+        import torch
+
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    logging.info(f"Using device: {device}")
+    return HuggingFaceEmbeddings(
+        model_name=EMBEDDING_MODEL,
+        model_kwargs={"device": device},
+        encode_kwargs={"normalize_embeddings": NORMALIZE_EMBEDDINGS},
+    )
+
+
+def embedding_cache_args(backend):
+    """Model name and directory of the on-disk embedding cache for `backend`.
+
+    int8 ONNX vectors differ slightly from the float32 ones, so each backend
+    gets its own cache instead of invalidating the other's.
+    """
+    from embedding_cache import CACHE_DIR
+
+    if backend == "hf":
+        return {"model_name": EMBEDDING_MODEL, "cache_dir": CACHE_DIR}
+    return {"model_name": f"{EMBEDDING_MODEL}#{backend}", "cache_dir": f"{CACHE_DIR}_{backend}"}
+
+
+def load_embeddings(backend=None):
+    """Embedding model behind the on-disk vector cache."""
+    from embedding_cache import CachedEmbeddings
+
+    backend = backend or embedding_backend()
+    return CachedEmbeddings(
+        load_base_embeddings(backend),
+        normalize_embeddings=NORMALIZE_EMBEDDINGS,
+        **embedding_cache_args(backend),
+    )
+
+
+def vectorstore_backend():
+    return os.environ.get("RAG_VECTORSTORE", "chroma").lower()
+
+
+def load_vectorstore(embeddings, backend=None):
+    """The Chroma collection, or its quantized export for backend "int8" / "binary"."""
+    backend = backend or vectorstore_backend()
+    if backend != "chroma":
+        from quantized_store import QUANTIZED_PATH, QuantizedVectorStore
+
+        return QuantizedVectorStore(embeddings, QUANTIZED_PATH, mode=backend,
+                                    manifest_path=os.path.join(CHROMA_PATH, MANIFEST_NAME))
+
+    from langchain_community.vectorstores import Chroma
+
+    return Chroma(
+        persist_directory=CHROMA_PATH,
+        embedding_function=embeddings,
+        collection_name=COLLECTION_NAME,
+    )
+
+
+def vectorstore_size(vectorstore):
+    """Number of documents in either vector store."""
+    collection = getattr(vectorstore, "_collection", None)
+    return collection.count() if collection is not None else len(vectorstore)
+
+
+def answer_settings(retriever, packer, llm):
+    """Retrieval and prompt settings a cached answer depends on."""
+    scorer = getattr(retriever, "scorer", None)
+    return {
+        "vectorstore": vectorstore_backend(),
+        "retriever": type(getattr(retriever, "base_retriever", retriever)).__name__,
+        "k": getattr(retriever, "k", None) or retriever.search_kwargs.get("k"),
+        "rerank": retriever.fetch_k if scorer is not None else 0,
+        "rerank_model": scorer.model_name if scorer is not None else None,
+        "context_tokens": packer.max_tokens if packer is not None else 0,
+        "model": getattr(llm, "model", None),
+    }
+
+
+def load_answer_cache(embeddings, settings=None, **kwargs):
+    """Semantic answer cache tied to the Chroma collection's sync manifest and `settings` (see answer_settings)."""
+    from answer_cache import SemanticAnswerCache
+
+    return SemanticAnswerCache(embeddings, os.path.join(CHROMA_PATH, MANIFEST_NAME), settings=settings, **kwargs)
+
+
+def load_llm(base_url=OLLAMA_BASE_URL, max_connections=None, keep_alive=OLLAMA_KEEP_ALIVE):
+    """ChatOllama client. Its sync and async HTTP clients are created once and keep
+    connections to Ollama alive between requests; `max_connections` caps the pool."""
+    import httpx
+    from langchain_ollama import ChatOllama
+
+    client_kwargs = {}
+    if max_connections is not None:
+        client_kwargs["limits"] = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=300,
+        )
+    return ChatOllama(
+        model=OLLAMA_MODEL,
+        temperature=0.1,
+        base_url=base_url,
+        keep_alive=keep_alive,
+        client_kwargs=client_kwargs,
+    )
+
+
+class StructuredAnswerer:
+    """Questions answered exactly from the CPU tables, skipping retrieval and the LLM.
+
+    Ranking questions go to the query engine, "similar to <model>" to the
+    feature-matrix recommender and "best under $X / Y W" to the skyline
+    index; the last two are used when their data files exist.
+    """
+
+    def __init__(self):
+        self.query_engine = CPUQueryEngine.from_csv()
+        logging.info(f"Loaded {self.query_engine.size} CPUs into the structured query engine")
+        ml_ready_path = find_ml_ready()
+        self.similar_cpus = SimilarCPUs.from_file(ml_ready_path) if ml_ready_path else None
+        if self.similar_cpus is None:
+            logging.warning(f"No ML-ready matrix at {ML_READY_PATH}; similar-CPU questions go through RAG")
+        self.skyline = SkylineIndex.load(SKYLINE_PATH) if os.path.exists(SKYLINE_PATH) else None
+        if self.skyline is None:
+            logging.warning(f"No skyline index at {SKYLINE_PATH}; budget questions go through RAG. "
+                            "Run python src/data/run_pipeline.py to build it.")
+
+    def answer(self, query):
+        for source in (self.query_engine, self.similar_cpus, self.skyline):
+            if source is not None:
+                answer = source.answer(query)
+                if answer is not None:
+                    return answer
+        return None
+
+
+def rerank_fetch_k():
+    return int(os.environ.get("RAG_RERANK", "0"))
+
+
+def build_retriever(vectorstore, sockets=(), k=3, rerank=None, tracer=None):
+    """Hybrid BM25 + dense retrieval when the lexical index exists, dense only otherwise.
+
+    With `rerank` > k (default from RAG_RERANK), that many candidates are
+    retrieved and a cross-encoder keeps the best k.
+    """
+    from bm25_index import BM25_PATH, BM25Index, HybridRetriever
+
+    rerank = rerank_fetch_k() if rerank is None else rerank
+    fetch_k = max(k, rerank)
+    if os.path.exists(BM25_PATH):
+        bm25 = BM25Index.load(BM25_PATH)
+        logging.info(f"Loaded BM25 index with {len(bm25)} chunks; using hybrid retrieval")
+        retriever = HybridRetriever(vectorstore=vectorstore, bm25=bm25, k=fetch_k, fetch_k=max(20, fetch_k),
+                                    sockets=list(sockets))
+    else:
+        logging.warning(f"No BM25 index at {BM25_PATH}; falling back to dense retrieval")
+        retriever = vectorstore.as_retriever(search_kwargs={"k": fetch_k})
+    if rerank <= k:
+        return retriever
+
+    from reranker import CrossEncoderScorer, RerankingRetriever
+
+    scorer = CrossEncoderScorer()
+    logging.info(f"Reranking {fetch_k} candidates per question with {scorer.model_name}, keeping {k}")
+    return RerankingRetriever(base_retriever=retriever, scorer=scorer, k=k, fetch_k=fetch_k, tracer=tracer)
+
+
+def load_context_packer(max_tokens=None):
+    """Compact, token-budgeted prompt context; None when the budget (default RAG_CONTEXT_TOKENS) is 0."""
+    from context_packer import CONTEXT_TOKENS, ContextPacker
+
+    if max_tokens is None:
+        max_tokens = int(os.environ.get("RAG_CONTEXT_TOKENS", CONTEXT_TOKENS))
+    if max_tokens <= 0:
+        return None
+    logging.info(f"Packing retrieved chunks into a compact context of at most {max_tokens} tokens")
+    return ContextPacker(max_tokens)
+
+
+def build_qa_chain(llm, retriever):
+    from langchain.chains import RetrievalQA
+
+    return RetrievalQA.from_chain_type(
+        llm=llm,
+        chain_type="stuff",
+        retriever=retriever,
+        return_source_documents=True,
+    )
@@ -1,83 +1,225 @@
 import logging
-import tiktoken
-from langchain_community.document_loaders import PyPDFLoader, CSVLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_ollama import ChatOllama
+from langchain_community.document_loaders import CSVLoader
 from langchain_community.vectorstores import Chroma
-from langchain.chains import retrieval_qa
-import chromadb
+import argparse
+import glob
+import itertools
 import os
 import shutil
-import torch
-
-# --- Setup logging ---
-log_dir = "logs"
-os.makedirs(log_dir, exist_ok=True)
-log_file = os.path.join(log_dir, "cpu_rag_pipeline.log")
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_file),  # save to file
-        logging.StreamHandler()         # still print to console
-    ]
-)
-logging.info("Starting mixed RAG pipeline: Hugging Face embeddings + Ollama generation...")
-
-# --- Step 1: Load documents ---
-pdf_path = "/Users/mousuf/ProgProj/oss-hackathon/OssCode/data/documents/understanding_server_cpus_and_how_to_choose_server_cpu.pdf"
-csv_path = "/Users/mousuf/ProgProj/oss-hackathon/OssCode/data/documents/cpu_text_chunks_2025-09-10_16-38-35.csv"
-
-logging.info("Loading PDF and CSV documents...")
-pdf_loader = PyPDFLoader(pdf_path)
-csv_loader = CSVLoader(csv_path)
-docs = pdf_loader.load() + csv_loader.load()
-logging.info(f"Loaded {len(docs)} documents.")
-
-# --- Step 2: Split documents into chunks ---
-chunk_size = 800
-chunk_overlap = 200
-logging.info(f"Splitting documents into chunks of {chunk_size} characters with {chunk_overlap} overlap...")
-splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-docs_split = splitter.split_documents(docs)
-logging.info(f"Created {len(docs_split)} text chunks.")
-
-# --- Step 3: Setup Hugging Face Embeddings (384 dimensions) ---
-logging.info("Initializing Hugging Face embeddings (all-MiniLM-L6-v2)...")
-device = "cuda" if torch.cuda.is_available() else "cpu"
-logging.info(f"Using device: {device}")
-
-embeddings = HuggingFaceEmbeddings(
-    model_name="sentence-transformers/all-MiniLM-L6-v2",  # 384 dimensions
-    model_kwargs={'device': device},
-    encode_kwargs={'normalize_embeddings': True}
-)
-
-# Test embedding dimensions
-test_embedding = embeddings.embed_query("Test CPU query")
-logging.info(f"Hugging Face embedding dimension: {len(test_embedding)} (expected: 384)")
-
-
-# --- Step 4: Setup ChromaDB with 384-dim embeddings ---
-chroma_path = "data/chroma_db/smollm3"
-try:
-    if os.path.exists(chroma_path):
-        shutil.rmtree(chroma_path)
-        logging.info(f"Cleared old ChromaDB at {chroma_path}")
-except Exception as e:
-    logging.warning(f"Could not clear old ChromaDB: {e}")
-
-os.makedirs(chroma_path, exist_ok=True)
-
-logging.info("Creating ChromaDB collection with Hugging Face embeddings...")
-vectorstore = Chroma.from_documents(
-    documents=docs_split,
-    embedding=embeddings,
-    collection_name="cpu_docs_smollm3_ollama",
-    persist_directory=chroma_path
-)
-
-logging.info(f"ChromaDB created with {len(docs_split)} documents (384-dim vectors)")
\ No newline at end of file
+from bm25_index import BM25_PATH, BM25Index
+from chunking import CHUNK_OVERLAP_TOKENS, CHUNK_TOKENS, DEDUP_THRESHOLD, chunk_documents
+from cpu_metadata import attach_cpu_metadata
+from embedding_cache import CachedEmbeddings
+from incremental_index import MANIFEST_NAME, sync_collection
+from parallel_embeddings import ParallelEmbeddings
+from pdf_ingest import DOCUMENTS_DIR, find_pdfs, iter_pdf_pages
+from quantized_store import QUANTIZED_PATH, export_collection
+from rag_components import EMBEDDING_MODEL, embedding_backend, embedding_cache_args, load_base_embeddings
+from tracing import METRICS_PATH, TRACE_PATH, Tracer
+
+# Written by the convert_csv_for_rag stage of src/data/run_pipeline.py
+CPU_CHUNKS_CSV = os.path.join(DOCUMENTS_DIR, "cpu_text_chunks.csv")
+
+
+def find_cpu_chunks(csv_path=CPU_CHUNKS_CSV):
+    """The pipeline's CPU text chunks, or the newest timestamped export if the pipeline has not run."""
+    if os.path.exists(csv_path):
+        return csv_path
+    exports = sorted(glob.glob(os.path.join(os.path.dirname(csv_path), "cpu_text_chunks_*.csv")))
+    if not exports:
+        raise FileNotFoundError(f"No CPU text chunks at {csv_path}; run src/data/run_pipeline.py first")
+    logging.info(f"{csv_path} not found, using {exports[-1]}")
+    return exports[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or refresh the CPU RAG vector store.")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Drop the existing ChromaDB and re-embed every chunk instead of syncing incrementally.")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Embed with this many CPU worker processes (0 = single in-process model).")
+    parser.add_argument("--threads-per-worker", type=int, default=1,
+                        help="Intra-op threads (and pinned cores) per embedding worker.")
+    parser.add_argument("--batch-size", type=int, default=32,
+                        help="Chunks per embedding batch for the worker pool.")
+    parser.add_argument("--embeddings", choices=["hf", "onnx"], default=embedding_backend(),
+                        help="Embedding backend: sentence-transformers on torch, or the int8 ONNX export "
+                             "(default: $RAG_EMBEDDINGS or hf).")
+    parser.add_argument("--chunk-tokens", type=int, default=CHUNK_TOKENS,
+                        help="Maximum tokens per PDF chunk (CPU rows are always one chunk each).")
+    parser.add_argument("--chunk-overlap-tokens", type=int, default=CHUNK_OVERLAP_TOKENS,
+                        help="Tokens repeated between consecutive chunks of a PDF section.")
+    parser.add_argument("--dedup-threshold", type=float, default=DEDUP_THRESHOLD,
+                        help="Estimated Jaccard similarity above which a PDF chunk is dropped as a near-duplicate.")
+    parser.add_argument("--documents-dir", default=DOCUMENTS_DIR,
+                        help="Every PDF under this directory is ingested as reference material.")
+    parser.add_argument("--cpu-csv", default=CPU_CHUNKS_CSV,
+                        help="CPU text chunks to index (falls back to the newest cpu_text_chunks_*.csv export).")
+    parser.add_argument("--pdf-workers", type=int, default=None,
+                        help="Processes extracting PDF pages (default: one per core, 0 = in-process).")
+    parser.add_argument("--export-quantized", action="store_true",
+                        help=f"Also export int8 and binary codes of the collection to {QUANTIZED_PATH} "
+                             "(RAG_VECTORSTORE=int8|binary).")
+    args = parser.parse_args()
+
+    # --- Setup logging ---
+    log_dir = "logs"
+    os.makedirs(log_dir, exist_ok=True)
+    log_file = os.path.join(log_dir, "cpu_rag_pipeline.log")
+
+    # Configure logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_file),  # save to file
+            logging.StreamHandler()         # still print to console
+        ]
+    )
+    logging.info("Starting mixed RAG pipeline: Hugging Face embeddings + Ollama generation...")
+
+    # Every stage below is a span in logs/traces.jsonl; totals go to logs/metrics.prom
+    tracer = Tracer("rag_pipeline", TRACE_PATH)
+    try:
+        with tracer.span("index_build", embeddings=args.embeddings, rebuild=args.rebuild) as build_span:
+            build_index(args, tracer, build_span)
+    finally:
+        tracer.log_summary()
+        tracer.metrics.write(METRICS_PATH)
+        tracer.close()
+        logging.info(f"Spans appended to {TRACE_PATH}, metrics written to {METRICS_PATH}")
+
+
+def build_index(args, tracer, build_span):
+    """Load, split, embed and sync the documents into ChromaDB, then rebuild the BM25 index."""
+    # --- Step 1: Load documents ---
+    csv_path = find_cpu_chunks(args.cpu_csv)
+    pdf_paths = find_pdfs(args.documents_dir)
+
+    logging.info("Loading CSV documents...")
+    with tracer.span("load") as span:
+        csv_loader = CSVLoader(csv_path)
+        # Typed metadata (brand, socket, price, age, ...) lets queries prefilter CPU rows in Chroma
+        csv_docs = attach_cpu_metadata(csv_loader.load())
+        span.count(documents=len(csv_docs))
+    logging.info(f"Loaded {len(csv_docs)} CPU rows.")
+
+    # --- Step 2: Chunk by document type ---
+    # One chunk per CPU row; PDF sections packed into token-bounded chunks; duplicates dropped.
+    # PDF pages are extracted in parallel (or read from the page cache) and streamed into the chunker.
+    logging.info(f"Chunking {len(pdf_paths)} PDFs from {args.documents_dir} and the CPU rows "
+                 f"(PDF sections of at most {args.chunk_tokens} tokens)...")
+    pdf_stats = {}
+    with tracer.span("split", chunk_tokens=args.chunk_tokens, overlap_tokens=args.chunk_overlap_tokens) as span:
+        pdf_pages = iter_pdf_pages(pdf_paths, workers=args.pdf_workers, stats=pdf_stats)
+        docs_split, chunk_stats = chunk_documents(
+            itertools.chain(pdf_pages, csv_docs),
+            chunk_tokens=args.chunk_tokens,
+            overlap_tokens=args.chunk_overlap_tokens,
+            dedup_threshold=args.dedup_threshold
+        )
+        span.count(chunks=len(docs_split), duplicates=chunk_stats["exact_duplicates"] + chunk_stats["near_duplicates"])
+        span.set(**chunk_stats)
+        span.count(pdf_pages_extracted=pdf_stats["extracted_pages"], pdf_pages_cached=pdf_stats["cached_pages"])
+    logging.info(
+        f"Read {pdf_stats['pages']} PDF pages in {pdf_stats['seconds']:.2f} s: {pdf_stats['extracted_pages']} "
+        f"extracted, {pdf_stats['cached_pages']} from the page cache"
+    )
+    logging.info(
+        f"Created {len(docs_split)} text chunks: {chunk_stats['cpu_rows']} CPU rows, "
+        f"{chunk_stats['reference_chunks']} PDF chunks from {chunk_stats['reference_pages']} pages; dropped "
+        f"{chunk_stats['exact_duplicates']} exact and {chunk_stats['near_duplicates']} near duplicates."
+    )
+    if chunk_stats["oversized_rows"]:
+        logging.warning(f"{chunk_stats['oversized_rows']} CPU rows exceed the embedding model's 256-token input")
+
+    # --- Step 3: Setup Hugging Face Embeddings (384 dimensions) ---
+    logging.info("Initializing Hugging Face embeddings (all-MiniLM-L6-v2)...")
+    embedding_model = EMBEDDING_MODEL  # 384 dimensions
+    normalize_embeddings = True
+    model_span = tracer.start("load_embeddings", backend=args.embeddings, workers=args.workers)
+    if args.embeddings == "onnx":
+        # onnxruntime already uses every core, so the worker pool is not needed
+        base_embeddings = load_base_embeddings("onnx")
+    elif args.workers > 0:
+        logging.info(f"Using {args.workers} CPU embedding workers")
+        base_embeddings = ParallelEmbeddings(
+            embedding_model,
+            normalize_embeddings=normalize_embeddings,
+            num_workers=args.workers,
+            threads_per_worker=args.threads_per_worker,
+            batch_size=args.batch_size
+        )
+    else:
+        base_embeddings = load_base_embeddings("hf")
+    # Identical chunks and queries are served from the on-disk cache instead of the transformer
+    embeddings = CachedEmbeddings(
+        base_embeddings,
+        normalize_embeddings=normalize_embeddings,
+        **embedding_cache_args(args.embeddings)
+    )
+
+    # Test embedding dimensions
+    test_embedding = embeddings.embed_query("Test CPU query")
+    model_span.end(dim=len(test_embedding))
+    logging.info(f"Hugging Face embedding dimension: {len(test_embedding)} (expected: 384)")
+
+    # --- Step 4: Sync ChromaDB with 384-dim embeddings ---
+    chroma_path = "data/chroma_db/smollm3"
+    if args.rebuild:
+        try:
+            if os.path.exists(chroma_path):
+                shutil.rmtree(chroma_path)
+                logging.info(f"Cleared old ChromaDB at {chroma_path}")
+        except Exception as e:
+            logging.warning(f"Could not clear old ChromaDB: {e}")
+
+    os.makedirs(chroma_path, exist_ok=True)
+
+    logging.info("Syncing ChromaDB collection with Hugging Face embeddings (only new or changed chunks are embedded)...")
+    vectorstore = Chroma(
+        embedding_function=embeddings,
+        collection_name="cpu_docs_smollm3_ollama",
+        persist_directory=chroma_path
+    )
+    # Each sync batch is one embed_documents call: give every pool worker several
+    # batches per call so no worker idles and one slow batch does not stall the call
+    sync_batch_size = max(256, args.workers * args.batch_size * 4)
+    try:
+        stats = sync_collection(
+            vectorstore._collection,
+            embeddings,
+            docs_split,
+            manifest_path=os.path.join(chroma_path, MANIFEST_NAME),
+            batch_size=sync_batch_size,
+            tracer=tracer
+        )
+    finally:
+        embeddings.close()
+        if isinstance(base_embeddings, ParallelEmbeddings):
+            base_embeddings.close()
+    logging.info(
+        f"ChromaDB synced: {stats['added']} added, {stats['updated']} metadata updates, "
+        f"{stats['deleted']} deleted, {stats['unchanged']} unchanged"
+    )
+    logging.info(f"ChromaDB now holds {vectorstore._collection.count()} documents (384-dim vectors)")
+    build_span.set(**stats)
+    build_span.count(embedding_cache_hits=embeddings.hits, embedding_cache_misses=embeddings.misses)
+
+    # --- Step 5: Build the BM25 lexical index next to ChromaDB ---
+    with tracer.span("bm25_build") as span:
+        bm25 = BM25Index.from_collection(vectorstore._collection)
+        bm25.save(BM25_PATH)
+        span.count(chunks=len(bm25))
+    logging.info(f"BM25 index over {len(bm25)} chunks ({len(bm25.postings)} terms) saved to {BM25_PATH}")
+
+    # --- Step 6 (optional): Quantized, memory-mapped copy of the collection ---
+    if args.export_quantized:
+        with tracer.span("quantized_export") as span:
+            count = export_collection(vectorstore._collection, QUANTIZED_PATH, os.path.join(chroma_path, MANIFEST_NAME))
+            span.count(vectors=count)
+        logging.info(f"Exported {count} vectors (float32, int8 and binary codes) to {QUANTIZED_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,487 @@
+"""
+rag_server.py
+
+Long-lived asyncio HTTP service for the CPU RAG pipeline. The embeddings,
+Chroma store, structured answerers and ChatOllama client are loaded once at
+startup (and warmed up), so each question only pays for retrieval and
+generation.
+
+    POST /query   {"query": "..."} -> {"answer", "sources", "route", "latency_ms"}
+    POST /query/stream  the same, as NDJSON events: sources first, then tokens
+    GET  /health  readiness
+    GET  /stats   request counts, in-flight requests and latency percentiles
+    GET  /metrics the same counters plus per-stage durations, in Prometheus text format
+
+Table-answerable questions return immediately, and questions close enough to
+one answered before come from the semantic answer cache. RAG questions run through
+the chain's async path, at most `--max-concurrency` at a time; further
+requests wait, and beyond `--max-pending` waiting requests the server
+answers 503 rather than queueing without bound. ChatOllama keeps one pooled
+keep-alive HTTP client to Ollama for the lifetime of the process.
+
+Run from the repository root:
+
+    python src/rag_pipeline/rag_server.py --port 8080
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import time
+from collections import deque
+
+import numpy as np
+from aiohttp import web
+
+from rag_components import (
+    OLLAMA_BASE_URL, StructuredAnswerer, answer_settings, build_qa_chain, build_retriever,
+    load_answer_cache, load_context_packer, load_embeddings, load_llm, load_vectorstore, vectorstore_backend,
+    vectorstore_size,
+)
+from answer_cache import source_records
+from streaming import TokenStats, astream_qa, qa_prompt
+from tracing import Tracer
+
+LATENCY_WINDOW = 2048
+
+
+class RAGService:
+    """Warm pipeline components plus the concurrency limiter and request statistics."""
+
+    def __init__(self, max_concurrency=4, max_pending=64, ollama_url=OLLAMA_BASE_URL,
+                 ollama_connections=None, warmup=True, answer_cache=True, cache_threshold=0.95,
+                 cache_ttl=24 * 3600, rerank=None, context_tokens=None, tracer=None):
+        self.max_concurrency = max_concurrency
+        self.max_pending = max_pending
+        self.ollama_url = ollama_url
+        # One pooled connection per concurrent generation is enough
+        self.ollama_connections = ollama_connections or max_concurrency
+        self.warmup = warmup
+        self.use_answer_cache = answer_cache
+        self.cache_options = {"threshold": cache_threshold, "ttl_seconds": cache_ttl}
+        self.embeddings = None
+        self.answer_cache = None
+        # Candidates reranked by the cross-encoder per question (None: RAG_RERANK, 0: off)
+        self.rerank = rerank
+        self.reranker = None
+        # Token budget of the compact prompt context (None: RAG_CONTEXT_TOKENS, 0: chunks verbatim)
+        self.context_tokens = context_tokens
+        self.packer = None
+        # Spans for each stage of every request; written to a file only with --trace-file
+        self.tracer = tracer or Tracer("rag_server")
+        self.ready = False
+        self.limiter = asyncio.Semaphore(max_concurrency)
+        self.pending = 0
+        self.in_flight = 0
+        self.counts = {"structured": 0, "cache": 0, "rag": 0, "errors": 0, "rejected": 0}
+        self.latencies = {route: deque(maxlen=LATENCY_WINDOW) for route in ("structured", "cache", "rag")}
+        self.ttfts = deque(maxlen=LATENCY_WINDOW)
+        self.token_rates = deque(maxlen=LATENCY_WINDOW)
+        self.started = time.time()
+        self.load_seconds = None
+
+    def load(self):
+        """Load every component once. Blocking; run in a worker thread."""
+        with self.tracer.span("load") as load_span:
+            with self.tracer.span("load_vectorstore") as span:
+                self.embeddings = load_embeddings()
+                self.vectorstore = load_vectorstore(self.embeddings)
+                span.set(documents=vectorstore_size(self.vectorstore), backend=vectorstore_backend())
+            logging.info(f"Loaded {span.attributes['documents']} documents from the {vectorstore_backend()} vector store")
+            with self.tracer.span("load_structured"):
+                self.structured = StructuredAnswerer()
+            self.llm = load_llm(self.ollama_url, max_connections=self.ollama_connections)
+            retriever = build_retriever(self.vectorstore, sockets=self.structured.query_engine.distinct("socket"),
+                                        rerank=self.rerank, tracer=self.tracer)
+            self.reranker = getattr(retriever, "scorer", None)
+            self.qa_chain = build_qa_chain(self.llm, retriever)
+            self.packer = load_context_packer(self.context_tokens)
+            self.retrieval_k = getattr(retriever, "k", None) or retriever.search_kwargs.get("k")
+            if self.use_answer_cache:
+                with self.tracer.span("load_answer_cache") as span:
+                    settings = answer_settings(retriever, self.packer, self.llm)
+                    self.answer_cache = load_answer_cache(self.embeddings, settings=settings, **self.cache_options)
+                    span.set(entries=len(self.answer_cache))
+                logging.info(f"Answer cache holds {len(self.answer_cache)} answers")
+            if self.warmup:
+                # First query embedding pays for model initialisation
+                with self.tracer.span("embedding_warmup"):
+                    self.embeddings.embed_query("server CPU warm-up")
+        self.load_seconds = load_span.duration
+
+    async def start(self):
+        await asyncio.to_thread(self.load)
+        if self.warmup:
+            # Makes Ollama load the model and opens the first pooled connection
+            with self.tracer.span("llm_warmup") as span:
+                await self.llm.ainvoke("Reply with OK.")
+            logging.info(f"Ollama warm-up took {span.duration:.2f} s")
+        self.ready = True
+        logging.info(f"RAG service ready after {self.load_seconds:.1f} s of loading")
+
+    def close(self):
+        """Write out the embedding cache index, including LRU ticks from cache hits."""
+        if self.embeddings is not None:
+            self.embeddings.close()
+
+    def _record(self, route, start):
+        latency = time.perf_counter() - start
+        self.counts[route] += 1
+        self.latencies[route].append(latency)
+        self.tracer.metrics.observe("request_duration_seconds", latency, route=route,
+                                    help_text="End-to-end request latency by route")
+        return latency
+
+    async def cached(self, query):
+        """(cache hit or None, query vector) for a question that is not table-answerable."""
+        if self.answer_cache is None:
+            return None, None
+        with self.tracer.span("embed_query"):
+            vector = await asyncio.to_thread(self.answer_cache.embed, query)
+        with self.tracer.span("cache_lookup", entries=len(self.answer_cache)) as span:
+            hit = self.answer_cache.lookup(query, vector)
+            span.count(cache_hits=int(hit is not None), cache_misses=int(hit is None))
+        return hit, vector
+
+    def _cache_response(self, hit, start):
+        latency = self._record("cache", start)
+        return {
+            "answer": hit["answer"], "sources": hit["sources"], "route": "cache", "latency_ms": latency * 1e3,
+            "matched_query": hit["matched_query"], "similarity": hit["similarity"],
+        }
+
+    async def remember(self, query, answer, sources, vector):
+        if self.answer_cache is not None:
+            with self.tracer.span("cache_store"):
+                await asyncio.to_thread(self.answer_cache.put, query, answer, sources, vector)
+
+    def structured_answer(self, query):
+        with self.tracer.span("structured") as span:
+            answer = self.structured.answer(query)
+            span.set(answered=answer is not None)
+        return answer
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        """Wait for a RAG slot; raises OverflowError when the wait queue is full."""
+        if self.pending >= self.max_pending:
+            self.counts["rejected"] += 1
+            raise OverflowError(f"{self.pending} requests already waiting")
+        self.pending += 1
+        waiting = True
+        wait_span = self.tracer.start("queue_wait", pending=self.pending, in_flight=self.in_flight)
+        try:
+            async with self.limiter:
+                self.pending -= 1
+                waiting = False
+                wait_span.end()
+                self.in_flight += 1
+                try:
+                    yield
+                finally:
+                    self.in_flight -= 1
+        finally:
+            # A client that disconnects while queued must not keep its slot in the count
+            if waiting:
+                self.pending -= 1
+                wait_span.end(cancelled=True)
+
+    async def answer(self, query):
+        """Answer one question; raises OverflowError when the wait queue is full."""
+        with self.tracer.span("query", endpoint="query") as query_span:
+            return await self._answer(query, query_span)
+
+    async def _answer(self, query, query_span):
+        start = time.perf_counter()
+        structured_answer = self.structured_answer(query)
+        if structured_answer is not None:
+            query_span.set(route="structured")
+            latency = self._record("structured", start)
+            return {"answer": structured_answer, "sources": [], "route": "structured", "latency_ms": latency * 1e3}
+        hit, vector = await self.cached(query)
+        if hit is not None:
+            query_span.set(route="cache")
+            return self._cache_response(hit, start)
+
+        query_span.set(route="rag")
+        async with self.slot():
+            # The chain's two steps, run separately so each gets its own span
+            with self.tracer.span("retrieve", k=self.retrieval_k) as span:
+                docs = await self.qa_chain.retriever.ainvoke(query)
+                span.count(documents=len(docs))
+            with self.tracer.span("generate") as span:
+                context_stats = {}
+                message = await self.llm.ainvoke(qa_prompt(self.qa_chain, query, docs, self.packer, context_stats))
+                usage = getattr(message, "usage_metadata", None) or {}
+                span.count(tokens=usage.get("output_tokens", 0), context_tokens=context_stats.get("context_tokens", 0))
+                span.set(answer_chars=len(message.content), **context_stats)
+        latency = self._record("rag", start)
+        sources = source_records(docs)
+        await self.remember(query, message.content, sources, vector)
+        return {"answer": message.content, "sources": sources, "route": "rag", "latency_ms": latency * 1e3}
+
+    async def stream(self, query):
+        """Answer one question as events: "sources", then "token"s, then "done" with timings."""
+        with self.tracer.span("query", endpoint="query/stream") as query_span:
+            async for event in self._stream(query, query_span):
+                yield event
+
+    async def _stream(self, query, query_span):
+        start = time.perf_counter()
+        structured_answer = self.structured_answer(query)
+        if structured_answer is not None:
+            query_span.set(route="structured")
+            latency = self._record("structured", start)
+            yield {"type": "answer", "content": structured_answer, "route": "structured"}
+            yield {"type": "done", "route": "structured", "latency_ms": latency * 1e3}
+            return
+        hit, vector = await self.cached(query)
+        if hit is not None:
+            query_span.set(route="cache")
+            response = self._cache_response(hit, start)
+            yield {"type": "sources", "sources": response.pop("sources")}
+            yield {"type": "answer", "content": response.pop("answer"), "route": "cache"}
+            yield {"type": "done", **response}
+            return
+
+        query_span.set(route="rag")
+        stats = TokenStats()
+        tokens = []
+        context_stats = {}
+        async with self.slot():
+            retrieve_span = self.tracer.start("retrieve", k=self.retrieval_k)
+            generate_span = None
+            try:
+                async for kind, value in astream_qa(self.qa_chain, query, stats, self.packer, context_stats):
+                    if kind == "sources":
+                        sources = source_records(value)
+                        retrieve_span.count(documents=len(sources)).end()
+                        generate_span = self.tracer.start("generate")
+                        yield {"type": "sources", "sources": sources}
+                    else:
+                        tokens.append(value)
+                        yield {"type": "token", "content": value}
+            except BaseException as e:
+                # Includes the client disconnecting (GeneratorExit) mid-answer
+                for span in (retrieve_span, generate_span):
+                    if span is not None:
+                        span.end(error=e)
+                raise
+            generate_span.count(tokens=stats.token_count, context_tokens=context_stats.get("context_tokens", 0))
+            generate_span.end(ttft_ms=None if stats.ttft is None else stats.ttft * 1e3,
+                              tokens_per_s=stats.tokens_per_second, answer_chars=sum(len(t) for t in tokens),
+                              **context_stats)
+        latency = self._record("rag", start)
+        await self.remember(query, "".join(tokens), sources, vector)
+        if stats.ttft is not None:
+            self.ttfts.append(stats.ttft)
+            self.tracer.metrics.observe("first_token_seconds", stats.ttft, help_text="Time to first streamed token")
+        if stats.tokens_per_second is not None:
+            self.token_rates.append(stats.tokens_per_second)
+        yield {"type": "done", "route": "rag", "latency_ms": latency * 1e3, **stats.as_dict()}
+
+    def stats(self):
+        latency = {}
+        for route, values in self.latencies.items():
+            if values:
+                p50, p95, p99 = np.percentile(np.fromiter(values, dtype=np.float64), [50, 95, 99]) * 1e3
+                latency[route] = {"p50_ms": p50, "p95_ms": p95, "p99_ms": p99, "window": len(values)}
+        if self.ttfts:
+            p50, p95, p99 = np.percentile(np.fromiter(self.ttfts, dtype=np.float64), [50, 95, 99]) * 1e3
+            latency["first_token"] = {"p50_ms": p50, "p95_ms": p95, "p99_ms": p99, "window": len(self.ttfts)}
+        return {
+            "ready": self.ready,
+            "uptime_s": time.time() - self.started,
+            "load_s": self.load_seconds,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "pending": self.pending,
+            "counts": self.counts,
+            "latency": latency,
+            "mean_tokens_per_s": float(np.mean(self.token_rates)) if self.token_rates else None,
+            "answer_cache": None if self.answer_cache is None else {
+                "entries": len(self.answer_cache), "hits": self.answer_cache.hits, "misses": self.answer_cache.misses,
+            },
+            "rerank_scores": None if self.reranker is None else {
+                "model": self.reranker.model_name, "cached": len(self.reranker.cache),
+                "hits": self.reranker.hits, "misses": self.reranker.misses,
+            },
+        }
+
+
+SERVICE = web.AppKey("service", RAGService)
+
+
+async def read_query(request):
+    """The question in a /query request body, or an error response."""
+    if not request.app[SERVICE].ready:
+        return None, web.json_response({"error": "service is still loading"}, status=503)
+    try:
+        payload = await request.json()
+    except ValueError:
+        return None, web.json_response({"error": "body must be JSON"}, status=400)
+    query = payload.get("query") if isinstance(payload, dict) else None
+    if not isinstance(query, str) or not query.strip():
+        return None, web.json_response({"error": "missing 'query'"}, status=400)
+    return query, None
+
+
+async def handle_query(request):
+    service = request.app[SERVICE]
+    query, error = await read_query(request)
+    if error is not None:
+        return error
+
+    try:
+        return web.json_response(await service.answer(query))
+    except OverflowError as e:
+        return web.json_response({"error": f"server busy: {e}"}, status=503)
+    except Exception as e:
+        service.counts["errors"] += 1
+        logging.error(f"Error with query '{query}': {e}")
+        return web.json_response({"error": str(e)}, status=502)
+
+
+async def handle_stream(request):
+    service = request.app[SERVICE]
+    query, error = await read_query(request)
+    if error is not None:
+        return error
+
+    events = service.stream(query)
+    try:
+        # The first event is only produced once a slot is free, so a full queue can still answer 503
+        first = await anext(events)
+    except OverflowError as e:
+        return web.json_response({"error": f"server busy: {e}"}, status=503)
+    except Exception as e:
+        service.counts["errors"] += 1
+        logging.error(f"Error with query '{query}': {e}")
+        return web.json_response({"error": str(e)}, status=502)
+
+    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+    await response.prepare(request)
+    try:
+        await response.write((json.dumps(first) + "\n").encode())
+        async for event in events:
+            await response.write((json.dumps(event) + "\n").encode())
+    except ConnectionResetError:
+        # The client went away; closing `events` stops generation and frees the slot
+        logging.info(f"Client disconnected while streaming query '{query}'")
+        return response
+    except Exception as e:
+        # Headers are already sent; report the failure in-band
+        service.counts["errors"] += 1
+        logging.error(f"Error while streaming query '{query}': {e}")
+        await response.write((json.dumps({"type": "error", "error": str(e)}) + "\n").encode())
+    finally:
+        await events.aclose()
+    await response.write_eof()
+    return response
+
+
+async def handle_health(request):
+    service = request.app[SERVICE]
+    return web.json_response({"ready": service.ready}, status=200 if service.ready else 503)
+
+
+async def handle_stats(request):
+    return web.json_response(request.app[SERVICE].stats())
+
+
+async def handle_metrics(request):
+    service = request.app[SERVICE]
+    metrics = service.tracer.metrics
+    metrics.set("ready", int(service.ready), help_text="1 once the models are loaded")
+    metrics.set("in_flight", service.in_flight, help_text="RAG requests being processed")
+    metrics.set("pending", service.pending, help_text="RAG requests waiting for a slot")
+    for outcome, count in service.counts.items():
+        metrics.set("requests_total", count, help_text="Requests by route or outcome", kind="counter", outcome=outcome)
+    if service.answer_cache is not None:
+        metrics.set("answer_cache_entries", len(service.answer_cache), help_text="Answers in the semantic cache")
+    return web.Response(text=metrics.render(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+def create_app(service):
+    app = web.Application()
+    app[SERVICE] = service
+
+    async def startup(app):
+        await service.start()
+
+    async def cleanup(app):
+        await asyncio.to_thread(service.close)
+
+    app.on_startup.append(startup)
+    app.on_cleanup.append(cleanup)
+    app.router.add_post("/query", handle_query)
+    app.router.add_post("/query/stream", handle_stream)
+    app.router.add_get("/health", handle_health)
+    app.router.add_get("/stats", handle_stats)
+    app.router.add_get("/metrics", handle_metrics)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the CPU RAG pipeline over HTTP with warm models.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--max-concurrency", type=int, default=4,
+                        help="RAG requests (retrieval + generation) processed at once.")
+    parser.add_argument("--max-pending", type=int, default=64,
+                        help="RAG requests allowed to wait for a slot before answering 503.")
+    parser.add_argument("--ollama-url", default=OLLAMA_BASE_URL,
+                        help="Ollama endpoint, e.g. a stub_ollama.py server for load tests.")
+    parser.add_argument("--ollama-connections", type=int, default=None,
+                        help="Keep-alive connections to Ollama (default: --max-concurrency).")
+    parser.add_argument("--no-warmup", action="store_true",
+                        help="Skip the warm-up embedding and LLM call at startup.")
+    parser.add_argument("--no-answer-cache", action="store_true",
+                        help="Always run retrieval and generation, even for repeated questions.")
+    parser.add_argument("--cache-threshold", type=float, default=0.95,
+                        help="Cosine similarity at which a cached answer is reused.")
+    parser.add_argument("--cache-ttl", type=float, default=24 * 3600,
+                        help="Seconds a cached answer stays valid.")
+    parser.add_argument("--rerank", type=int, default=None,
+                        help="Retrieve this many chunks and keep the best by cross-encoder score "
+                             "(default: $RAG_RERANK, 0 = off).")
+    parser.add_argument("--context-tokens", type=int, default=None,
+                        help="Token budget of the compact prompt context (default: $RAG_CONTEXT_TOKENS or 1024, "
+                             "0 = stuff the chunks verbatim).")
+    parser.add_argument("--trace-file", default=None,
+                        help="Append a JSON line per stage span to this file (e.g. logs/traces.jsonl).")
+    args = parser.parse_args()
+
+    # --- Setup logging ---
+    log_dir = "logs"
+    os.makedirs(log_dir, exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(os.path.join(log_dir, "cpu_rag_server.log")),
+            logging.StreamHandler()
+        ]
+    )
+
+    service = RAGService(
+        max_concurrency=args.max_concurrency,
+        max_pending=args.max_pending,
+        ollama_url=args.ollama_url,
+        ollama_connections=args.ollama_connections,
+        warmup=not args.no_warmup,
+        answer_cache=not args.no_answer_cache,
+        cache_threshold=args.cache_threshold,
+        cache_ttl=args.cache_ttl,
+        rerank=args.rerank,
+        context_tokens=args.context_tokens,
+        tracer=Tracer("rag_server", args.trace_file),
+    )
+    web.run_app(create_app(service), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+reranker.py
+
+Optional cross-encoder rerank stage between retrieval and generation.
+
+The base retriever (hybrid BM25 + dense, or dense only) over-fetches
+`fetch_k` candidates. A small cross-encoder reads each (question, chunk)
+pair together and scores its relevance, and only the best `k` chunks are
+stuffed into the prompt, so the LLM spends its prefill on context that
+answers the question.
+
+Scoring runs on CPU in batches, shortest pairs first so each batch pads to
+a similar length. Scores are cached per (normalized question, chunk text),
+so chunks that keep coming back for a repeated question are not re-scored. Each rerank is a
+"rerank" span with the number of candidates, cache hits and pairs scored;
+its duration is the per-query overhead.
+
+Enable with RAG_RERANK=<fetch_k> (see rag_components.py) or
+`rag_server.py --rerank <fetch_k>`.
+
+    python src/rag_pipeline/reranker.py "best AMD CPU under $300" --fetch-k 20
+"""
+
+import argparse
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+# 22M parameters, 6 layers: a few ms per pair on one CPU core
+RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+RERANK_FETCH_K = 20
+RERANK_BATCH_SIZE = 16
+# Longer chunks are truncated; CPU rows and PDF chunks are well under this
+RERANK_MAX_LENGTH = 256
+SCORE_CACHE_SIZE = 50000
+
+
+class CrossEncoderScorer:
+    """Batched CPU relevance scores for (query, passage) pairs, with an LRU score cache."""
+
+    def __init__(self, model_name=RERANK_MODEL, batch_size=RERANK_BATCH_SIZE, max_length=RERANK_MAX_LENGTH,
+                 cache_size=SCORE_CACHE_SIZE, device="cpu"):
+        from sentence_transformers import CrossEncoder
+
+        self.model = CrossEncoder(model_name, device=device, max_length=max_length)
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # One forward pass at a time: concurrent torch calls only fight over the same cores
+        self.model_lock = threading.Lock()
+        self.cache_lock = threading.Lock()
+
+    @staticmethod
+    def key(query, text):
+        normalized = " ".join(query.lower().split())
+        return hashlib.sha1(f"{normalized}\0{text}".encode("utf-8")).hexdigest()
+
+    def score(self, query, texts):
+        """Relevance score of every text for `query`, in input order; also returns the cache hit count."""
+        keys = [self.key(query, text) for text in texts]
+        scores = [None] * len(texts)
+        with self.cache_lock:
+            for i, key in enumerate(keys):
+                if key in self.cache:
+                    self.cache.move_to_end(key)
+                    scores[i] = self.cache[key]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        hits = len(texts) - len(missing)
+        if missing:
+            # Similar lengths in a batch means little padding
+            missing.sort(key=lambda i: len(texts[i]))
+            with self.model_lock:
+                predicted = self.model.predict([(query, texts[i]) for i in missing], batch_size=self.batch_size,
+                                               show_progress_bar=False)
+            with self.cache_lock:
+                for i, score in zip(missing, predicted):
+                    scores[i] = float(score)
+                    self.cache[keys[i]] = scores[i]
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+        with self.cache_lock:
+            self.hits += hits
+            self.misses += len(missing)
+        return scores, hits
+
+
+class RerankingRetriever(BaseRetriever):
+    """Over-fetch from `base_retriever`, keep the `k` chunks the cross-encoder ranks highest."""
+
+    base_retriever: Any
+    scorer: Any
+    k: int = 3
+    fetch_k: int = RERANK_FETCH_K
+    tracer: Any = None
+
+    def _get_relevant_documents(self, query, *, run_manager=None):
+        candidates = self.base_retriever.invoke(query)
+        if len(candidates) <= 1:
+            return candidates[:self.k]
+        span = self.tracer.start("rerank", model=self.scorer.model_name) if self.tracer else None
+        start = time.perf_counter()
+        scores, hits = self.scorer.score(query, [doc.page_content for doc in candidates])
+        ranked = sorted(zip(scores, range(len(candidates))), reverse=True)[:self.k]
+        elapsed_ms = (time.perf_counter() - start) * 1e3
+        if span is not None:
+            span.count(candidates=len(candidates), score_cache_hits=hits, pairs_scored=len(candidates) - hits)
+            span.end(kept=len(ranked))
+        logging.info(
+            f"Reranked {len(candidates)} candidates in {elapsed_ms:.1f} ms "
+            f"({hits} cached scores), kept {len(ranked)}"
+        )
+        return [
+            Document(id=candidates[i].id, page_content=candidates[i].page_content,
+                     metadata={**candidates[i].metadata, "rerank_score": score})
+            for score, i in ranked
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show how the cross-encoder reorders retrieved chunks.")
+    parser.add_argument("query")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--fetch-k", type=int, default=RERANK_FETCH_K)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    from rag_components import build_retriever, load_embeddings, load_vectorstore
+
+    retriever = build_retriever(load_vectorstore(load_embeddings()), k=args.k, rerank=args.fetch_k)
+    before = [doc.page_content for doc in retriever.base_retriever.invoke(args.query)]
+    for rank, doc in enumerate(retriever.invoke(args.query), 1):
+        print(f"{rank}. score {doc.metadata['rerank_score']:.3f}, retrieval rank "
+              f"{before.index(doc.page_content) + 1}: {doc.page_content[:100]!r}")
+    # The second call is served from the score cache
+    start = time.perf_counter()
+    retriever.invoke(args.query)
+    print(f"Cached rerank: {(time.perf_counter() - start) * 1e3:.1f} ms including retrieval")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+import glob
+import os
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data"))
+from dataset_io import ML_READY_SCHEMA, read_dataset
+from fitted_scalers import FittedScalers
+
+ML_READY_PATH = "data/ml_ready/cpu_benchmarks_v4_ml_ready_scaled_custom.arrow"
+SCALERS_PATH = "data/ml_ready/cpu_scalers.json"
+
+# The scaled columns written by prepare_ml_data
+FEATURE_COLUMNS = [
+    "price", "TDP", "cores", "price_per_core", "threadMark_per_watt",
+    "cpu_mark", "cpu_value", "thread_mark", "thread_value", "power_performance",
+    "thread_mark_per_dollar", "thermal_performance_ratio",
+    "thread_efficiency", "age",
+]
+
+SIMILAR_RE = re.compile(r"\b(similar to|alternatives? (?:to|for)|comparable to|cpus? like|instead of)\b")
+# "top 10", "10 similar", "10 alternatives", "10 cpus like"; read with the model's name taken out
+COUNT_RE = re.compile(r"\btop\s+(\d+)\b|\b(\d+)\s+(?:most\s+)?(?:similar|alternatives?|comparable|cpus?|processors?)\b")
+MAX_K = 50
+PUNCTUATION_RE = re.compile(r"[?!,;:()\"']|\.(?!\d)")
+
+
+class SimilarCPUs:
+    """k-nearest-neighbour search over the scaled ML-ready feature matrix.
+
+    Distance is a weighted Euclidean distance over the features present in
+    both vectors, rescaled by the share of weight that was present (the
+    scheme of scikit-learn's `nan_euclidean_distances`), so a missing price
+    or cpu_value neither matches nor penalises. A candidate must share at
+    least `min_overlap` of the query's feature weight to be ranked.
+
+    All pairwise distances for a batch of queries come from one matrix
+    product against a precomputed `[x^2, x, present]` block, which at this
+    catalog size is faster than a tree index and handles NaNs, which KD/ball
+    trees cannot.
+    """
+
+    def __init__(self, df, features=FEATURE_COLUMNS, weights=None, min_overlap=0.75):
+        self.features = [col for col in features if col in df.columns]
+        self.names = (df["brand_name"].fillna("") + " " + df["cpu_model"].fillna("")).str.strip().to_numpy(dtype=object)
+        # Lookup keys per CPU: model and full name, with and without the "@ 2.10GHz" clock suffix
+        self._aliases = {}
+        for i, name in enumerate(self.names):
+            brand, model = name.lower().split(" ", 1) if " " in name else ("", name.lower())
+            for alias in (name.lower(), model, model.split(" @ ")[0], f"{brand} {model.split(' @ ')[0]}".strip()):
+                self._aliases.setdefault(" ".join(alias.split()), i)
+        self._max_alias_words = max((len(alias.split()) for alias in self._aliases), default=0)
+        self.weights = self.weight_vector(weights)
+        self.min_overlap = min_overlap
+
+        X = np.column_stack([df[col].to_numpy(dtype=np.float64, na_value=np.nan) for col in self.features])
+        self.X = X
+        present = ~np.isnan(X)
+        X0 = np.where(present, X, 0.0)
+        self._present = present.astype(np.float64)
+        self._block = np.hstack([X0 * X0, X0, self._present])
+
+    @classmethod
+    def from_file(cls, path=ML_READY_PATH, **kwargs):
+        return cls(read_dataset(path, schema=ML_READY_SCHEMA), **kwargs)
+
+    def __len__(self):
+        return len(self.names)
+
+    def weight_vector(self, weights=None):
+        """Per-feature weights as a vector; features not named in `weights` get 1."""
+        weights = weights or {}
+        unknown = set(weights) - set(self.features)
+        if unknown:
+            raise KeyError(f"Unknown features {sorted(unknown)}. Features: {', '.join(self.features)}")
+        return np.array([float(weights.get(col, 1.0)) for col in self.features])
+
+    def distances(self, Q, weights=None):
+        """NaN-aware weighted distances from each row of Q (m x d, scaled) to every CPU: (m x n)."""
+        w = self.weights if weights is None else self.weight_vector(weights)
+        Q = np.atleast_2d(np.asarray(Q, dtype=np.float64))
+        q_present = ~np.isnan(Q)
+        Qw = np.where(q_present, w, 0.0)
+        Q0 = np.where(q_present, Q, 0.0)
+        # sum_j w_j [both present] (x - q)^2 = Qw.x^2 - 2 (Qw q).x + (Qw q^2).[x present]
+        sq = np.hstack([Qw, -2.0 * Qw * Q0, Qw * Q0 * Q0]) @ self._block.T
+        shared = Qw @ self._present.T
+        with np.errstate(divide="ignore", invalid="ignore"):
+            d2 = np.maximum(sq, 0.0) * (w.sum() / shared)
+        d2[(shared == 0) | (shared < self.min_overlap * Qw.sum(axis=1, keepdims=True))] = np.inf
+        return np.sqrt(d2)
+
+    def neighbours(self, Q, k=5, weights=None, exclude=None):
+        """Indices and distances of the `k` nearest CPUs for each query row, nearest first.
+
+        `exclude` is an optional list (one entry per query) of row indices to
+        leave out, e.g. the query CPU itself. Ties keep table order.
+        """
+        D = self.distances(Q, weights)
+        for row, skip in enumerate(exclude or []):
+            D[row, list(np.atleast_1d(skip))] = np.inf
+        k = min(k, D.shape[1])
+        idx = np.argpartition(D, k - 1, axis=1)[:, :k] if k < D.shape[1] else np.tile(np.arange(D.shape[1]), (len(D), 1))
+        rows = np.arange(len(D))[:, None]
+        order = np.lexsort((idx, D[rows, idx]), axis=1)
+        idx = idx[rows, order]
+        return idx, D[rows, idx]
+
+    def find(self, name):
+        """Row index of a CPU given its model ("Xeon Gold 6348") or full name ("Intel Xeon Gold 6348 @ 2.60GHz"), or None."""
+        return self._aliases.get(" ".join(name.lower().split()))
+
+    def _results(self, idx, dist):
+        return [
+            {"cpu": self.names[i], "distance": float(d)}
+            for i, d in zip(idx, dist)
+            if np.isfinite(d)
+        ]
+
+    def similar_to(self, names, k=5, weights=None):
+        """The `k` CPUs most similar to each named CPU (a name or a list of names)."""
+        single = isinstance(names, str)
+        names = [names] if single else list(names)
+        rows = []
+        for name in names:
+            i = self.find(name)
+            if i is None:
+                raise KeyError(f"Unknown CPU '{name}'")
+            rows.append(i)
+        same = [np.flatnonzero(self.names == self.names[i]) for i in rows]
+        idx, dist = self.neighbours(self.X[rows], k, weights, exclude=same)
+        results = [self._results(i, d) for i, d in zip(idx, dist)]
+        return results[0] if single else results
+
+    def similar_to_vector(self, target, k=5, weights=None, scalers_path=None):
+        """The `k` CPUs closest to a target, given as {feature: value}; unnamed features are ignored.
+
+        Values are in the scaled ML-ready space unless `scalers_path` points to
+        the scaler parameters saved by prepare_ml_data, in which case raw
+        values (dollars, watts, years) are scaled first.
+        """
+        unknown = set(target) - set(self.features)
+        if unknown:
+            raise KeyError(f"Unknown features {sorted(unknown)}. Features: {', '.join(self.features)}")
+        if scalers_path is not None:
+            target = scale_raw(target, scalers_path)
+        q = np.array([[target.get(col, np.nan) for col in self.features]], dtype=np.float64)
+        idx, dist = self.neighbours(q, k, weights)
+        return self._results(idx[0], dist[0])
+
+    # --- natural-language routing ---
+
+    def _match(self, words):
+        """(row index, first word, word count) of the longest CPU name or model in `words`, or None."""
+        for size in range(min(self._max_alias_words, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                alias = " ".join(words[start:start + size])
+                if len(alias) >= 3 and alias in self._aliases:
+                    return self._aliases[alias], start, size
+        return None
+
+    def match_model(self, query):
+        """Row index of the CPU whose longest name or model is mentioned in `query`, or None."""
+        match = self._match(PUNCTUATION_RE.sub(" ", query.lower()).split())
+        return match[0] if match else None
+
+    def answer(self, query, k=5):
+        """Answer "CPUs similar to <model>" questions from the feature matrix, or return None."""
+        text = query.lower()
+        if not SIMILAR_RE.search(text):
+            return None
+        words = PUNCTUATION_RE.sub(" ", text).split()
+        match = self._match(words)
+        if match is None:
+            return None
+        i, start, size = match
+        # "EPYC 7763 CPU" must not read as a request for 7763 CPUs
+        count = COUNT_RE.search(" ".join(words[:start] + words[start + size:]))
+        if count:
+            k = min(int(count.group(1) or count.group(2)), MAX_K)
+        same = np.flatnonzero(self.names == self.names[i])
+        idx, dist = self.neighbours(self.X[[i]], k, exclude=[same])
+        results = self._results(idx[0], dist[0])
+        if not results:
+            return f"No CPUs with comparable features to {self.names[i]} were found."
+        lines = [f"CPUs most similar to {self.names[i]} (by scaled benchmark, price and power features):"]
+        for rank, result in enumerate(results, 1):
+            lines.append(f"{rank}. {result['cpu']} - distance {result['distance']:.3f}")
+        return "\n".join(lines)
+
+
+def find_ml_ready(path=ML_READY_PATH):
+    """The pipeline's ML-ready matrix, else the newest timestamped scaled-custom CSV, else None."""
+    if os.path.exists(path):
+        return path
+    exports = sorted(glob.glob(os.path.join(os.path.dirname(path), "cpu_benchmarks_v4_ml_ready_scaled_custom_*.csv")))
+    return exports[-1] if exports else None
+
+
+def scale_raw(target, scalers_path=SCALERS_PATH):
+    """Scale raw feature values with the parameters saved by prepare_ml_data."""
+    scalers = FittedScalers.load(scalers_path)
+    row = pd.DataFrame([{col: target.get(col, np.nan) for col in scalers.columns}])
+    scaled = scalers.transform(row).iloc[0]
+    return {col: (float(scaled[col]) if col in scalers.columns else value) for col, value in target.items()}
@@ -0,0 +1,148 @@
+import json
+import re
+
+from query_constraints import USE_CASE_RE, extract_constraints
+
+SKYLINE_PATH = "data/final/cpu_skyline_index.json"
+
+COUNT_RE = re.compile(r"\b(?:top|best)\s+(\d+)\b|\b(\d+)\s+(?:best|cpus|processors|options)\b")
+TRADE_OFF_RE = re.compile(r"\b(best|fastest|most powerful|most efficient|recommend|ideal)\b")
+# Amounts in the question; each must be covered by a parsed price / TDP cap
+DOLLARS_RE = re.compile(r"\$\s*\d")
+WATTS_RE = re.compile(r"\d\s*(?:w|watts?)\b")
+# Quantities the fronts know nothing about; such questions go to RAG
+OTHER_UNITS_RE = re.compile(r"\d\s*(?:ghz|mhz|cores?|threads?|gb|tb|mb|nm)\b")
+
+# Words that pick the quantity to maximise; the default is overall cpu_mark.
+TARGET_WORDS = [
+    ("threadMark_per_watt", re.compile(r"\b(efficien\w*|per watt|performance per watt)\b")),
+    ("thread_mark_per_dollar", re.compile(r"\b(value|per dollar|bang for)\b")),
+    ("thread_mark", re.compile(r"\b(single[- ]thread\w*|per[- ]thread|thread_mark)\b")),
+]
+
+PARTITION_COLUMNS = ["category", "socket", "brand_name"]
+
+
+def _squash(value):
+    return re.sub(r"[\s\-_]", "", str(value).lower())
+
+
+def partition_key(category=None, socket=None, brand=None):
+    """Index key for a partition, matching build_skyline's spelling."""
+    parts = []
+    for col, value in zip(PARTITION_COLUMNS, (category, socket, brand)):
+        if value is not None:
+            parts.append(f"{col}={_squash(value) if col == 'socket' else str(value).lower()}")
+    return "|".join(parts) or "all"
+
+
+class SkylineIndex:
+    """Query API over the layered Pareto fronts written by build_skyline.py.
+
+    A front for `cpu_mark|price,TDP` holds the CPUs not beaten on cpu_mark,
+    price and TDP at once. The best CPU under a price and/or power cap is
+    always on the first front of the matching objective set: anything that
+    dominates it is also within the caps and at least as fast. More
+    generally the top k lie on the first k fronts, so every answer with
+    k <= `max_layers` is exact while reading only a few dozen rows.
+    """
+
+    def __init__(self, payload):
+        self.max_layers = payload["max_layers"]
+        self.objectives = payload["objectives"]
+        self.fronts = payload["fronts"]
+        self.rows = payload["rows"]
+        self.sockets = sorted({row["socket"] for row in self.rows.values() if row.get("socket")})
+
+    @classmethod
+    def load(cls, path=SKYLINE_PATH):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def objective_set(self, target="cpu_mark", constrained=()):
+        """Name of the objective set maximising `target` under caps on the `constrained` columns."""
+        name = f"{target}|{','.join(col for col in ('price', 'TDP') if col in constrained)}"
+        if name not in self.objectives:
+            raise KeyError(f"No objective set '{name}'. Available: {', '.join(self.objectives)}")
+        return name
+
+    def front(self, objective_set, category=None, socket=None, brand=None, layer=1):
+        """Rows on one front of a partition (layer 1 is the skyline itself)."""
+        layers = self.fronts[objective_set].get(partition_key(category, socket, brand), [])
+        if layer > len(layers):
+            return []
+        return [self.rows[str(i)] for i in layers[layer - 1]]
+
+    def best(self, target="cpu_mark", k=3, max_price=None, max_tdp=None, category=None, socket=None, brand=None,
+             strict=()):
+        """The `k` CPUs with the highest `target` within optional price / TDP caps and partition.
+
+        Caps are inclusive, except for the columns ("price", "TDP") listed in
+        `strict`, which must stay below their cap ("under $2000").
+        """
+        if k > self.max_layers:
+            raise ValueError(f"The index keeps {self.max_layers} fronts; exact answers need k <= {self.max_layers}")
+        constrained = [col for col, cap in (("price", max_price), ("TDP", max_tdp)) if cap is not None]
+        name = self.objective_set(target, constrained or ("price",))
+        layers = self.fronts[name].get(partition_key(category, socket, brand), [])
+        caps = [(col, cap) for col, cap in (("price", max_price), ("TDP", max_tdp)) if cap is not None]
+        candidates = []
+        for layer in layers[:k]:
+            for i in layer:
+                row = self.rows[str(i)]
+                if all(row[col] < cap if col in strict else row[col] <= cap for col, cap in caps):
+                    candidates.append(row)
+        candidates.sort(key=lambda row: -row[target])
+        return candidates[:k]
+
+    # --- natural-language routing ---
+
+    def answer(self, query, k=3):
+        """Answer "best CPU under $X / Y W" questions from the fronts, or return None."""
+        text = query.lower()
+        if not TRADE_OFF_RE.search(text) or OTHER_UNITS_RE.search(text) or USE_CASE_RE.search(text):
+            return None
+        constraints = extract_constraints(query, sockets=self.sockets)
+        parsed = {col: sum(1 for c, _, _ in constraints if c == col) for col in ("price", "TDP")}
+        if len(DOLLARS_RE.findall(text)) > parsed["price"] or len(WATTS_RE.findall(text)) > parsed["TDP"]:
+            # An amount we could not attach to a cap, e.g. "a 200W CPU": don't answer without it
+            return None
+
+        caps = {}
+        strict = set()
+        partition = {}
+        for col, op, value in constraints:
+            if col in ("price", "TDP") and op in ("<", "<="):
+                caps[col] = value
+                if op == "<":
+                    strict.add(col)
+            elif col == "category" and op == "==":
+                partition["category"] = value
+            elif col == "brand_name" and op == "==":
+                partition["brand"] = value
+            elif col == "socket":
+                partition["socket"] = value[0]
+            else:
+                # Other filters (age, minimum price, ...) are not covered by the fronts
+                return None
+        if not caps:
+            return None
+
+        target = next((col for col, pattern in TARGET_WORDS if pattern.search(text)), "cpu_mark")
+        count = COUNT_RE.search(text)
+        k = min(int(count.group(1) or count.group(2)), self.max_layers) if count else k
+        rows = self.best(target, k, max_price=caps.get("price"), max_tdp=caps.get("TDP"), strict=strict, **partition)
+
+        ops = {col: "<" if col in strict else "<=" for col in caps}
+        limits = [f"price {ops['price']} ${caps['price']:g}" if "price" in caps else None,
+                  f"TDP {ops['TDP']} {caps['TDP']:g} W" if "TDP" in caps else None]
+        limits += [f"{col} {value}" for col, value in partition.items()]
+        header = f"Best CPUs by {target} with " + ", ".join(limit for limit in limits if limit)
+        if not rows:
+            return f"{header}: no CPUs in the dataset match."
+        lines = [f"{header}:"]
+        for rank, row in enumerate(rows, 1):
+            price = f"${row['price']:g}" if row.get("price") is not None else "price n/a"
+            tdp = f"{row['TDP']:g} W" if row.get("TDP") is not None else "TDP n/a"
+            lines.append(f"{rank}. {row['brand_name']} {row['cpu_model']} - {target} {row[target]:g} ({price}, {tdp})")
+        return "\n".join(lines)
@@ -0,0 +1,145 @@
+"""
+streaming.py
+
+Token streaming for the RetrievalQA chain and the ConversationChain chat bots,
+with time-to-first-token and generation-rate measurements.
+
+`invoke` / `predict` on these chains return only after the whole completion
+is generated. The helpers here run the same steps as the chains -- retrieve,
+fill the same prompt, call the same LLM, save to memory -- but call
+`llm.stream`, so callers can show the sources and then each token as soon as
+it arrives.
+"""
+
+import time
+
+from langchain_core.prompts import format_document
+
+
+class TokenStats:
+    """Timing for one streamed completion."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.first_token = None
+        self.end = None
+        self.chunks = 0
+        self.tokens = None  # eval_count reported by Ollama, when available
+
+    def add(self, chunk):
+        """Record one streamed chunk and return its text."""
+        text = chunk if isinstance(chunk, str) else chunk.content
+        if text and self.first_token is None:
+            self.first_token = time.perf_counter()
+        if text:
+            self.chunks += 1
+        usage = getattr(chunk, "usage_metadata", None)
+        if usage and usage.get("output_tokens"):
+            self.tokens = usage["output_tokens"]
+        return text
+
+    def finish(self):
+        self.end = time.perf_counter()
+        return self
+
+    @property
+    def ttft(self):
+        """Seconds from the request to the first token."""
+        return None if self.first_token is None else self.first_token - self.start
+
+    @property
+    def token_count(self):
+        # Ollama streams one token per chunk, so the chunk count stands in when eval_count is missing
+        return self.tokens or self.chunks
+
+    @property
+    def tokens_per_second(self):
+        """Generation rate after the first token."""
+        if self.first_token is None or self.end is None or self.end <= self.first_token:
+            return None
+        return max(self.token_count - 1, 0) / (self.end - self.first_token)
+
+    def as_dict(self):
+        return {
+            "ttft_ms": None if self.ttft is None else self.ttft * 1e3,
+            "total_ms": None if self.end is None else (self.end - self.start) * 1e3,
+            "tokens": self.token_count,
+            "tokens_per_s": self.tokens_per_second,
+        }
+
+    def summary(self):
+        if self.ttft is None:
+            return "no tokens generated"
+        rate = self.tokens_per_second
+        rate = f"{rate:.1f} tokens/s" if rate is not None else "n/a tokens/s"
+        return f"first token {self.ttft * 1e3:.0f} ms, {self.token_count} tokens, {rate}"
+
+
+def qa_prompt(qa_chain, query, docs, packer=None, context_stats=None):
+    """The prompt a "stuff" RetrievalQA chain would send to its LLM for `docs`.
+
+    With a ContextPacker (context_packer.py) the context is its compact,
+    token-budgeted rendering instead of the chunks pasted verbatim. Pass a
+    dict as `context_stats` to get the packer's token counts.
+    """
+    stuff = qa_chain.combine_documents_chain
+    if packer is not None:
+        context, packed = packer.pack(query, docs)
+        if context_stats is not None:
+            context_stats.update(packed)
+    else:
+        context = stuff.document_separator.join(format_document(doc, stuff.document_prompt) for doc in docs)
+    return stuff.llm_chain.prompt.format_prompt(**{stuff.document_variable_name: context, "question": query})
+
+
+def stream_qa(qa_chain, query, stats=None, packer=None, context_stats=None):
+    """Stream a RetrievalQA answer.
+
+    Yields ("sources", documents) once retrieval is done, then ("token", text)
+    for every chunk. Pass a TokenStats to collect timings; it is finished when
+    the generator is exhausted. `packer` and `context_stats` are passed to
+    qa_prompt.
+    """
+    stats = stats or TokenStats()
+    docs = qa_chain.retriever.invoke(query)
+    yield "sources", docs
+    llm = qa_chain.combine_documents_chain.llm_chain.llm
+    for chunk in llm.stream(qa_prompt(qa_chain, query, docs, packer, context_stats)):
+        text = stats.add(chunk)
+        if text:
+            yield "token", text
+    stats.finish()
+
+
+async def astream_qa(qa_chain, query, stats=None, packer=None, context_stats=None):
+    """Async version of stream_qa."""
+    stats = stats or TokenStats()
+    docs = await qa_chain.retriever.ainvoke(query)
+    yield "sources", docs
+    llm = qa_chain.combine_documents_chain.llm_chain.llm
+    async for chunk in llm.astream(qa_prompt(qa_chain, query, docs, packer, context_stats)):
+        text = stats.add(chunk)
+        if text:
+            yield "token", text
+    stats.finish()
+
+
+def stream_conversation(conversation, user_input, stats=None):
+    """Stream a ConversationChain reply token by token and save the turn to its memory.
+
+    Equivalent to `conversation.predict(input=user_input)`: the prompt is
+    filled from the chain's memory and the exchange is stored once the reply
+    is complete.
+    """
+    stats = stats or TokenStats()
+    inputs = conversation.prep_inputs({conversation.input_key: user_input})
+    prompt = conversation.prompt.format_prompt(**inputs)
+    parts = []
+    for chunk in conversation.llm.stream(prompt):
+        text = stats.add(chunk)
+        if text:
+            parts.append(text)
+            yield text
+    stats.finish()
+    if conversation.memory is not None:
+        conversation.memory.save_context(inputs, {conversation.output_key: "".join(parts)})
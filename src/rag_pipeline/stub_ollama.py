@@ -0,0 +1,133 @@
+"""
+stub_ollama.py
+
+Minimal stand-in for the Ollama HTTP API, for measuring the RAG server's
+throughput without a GPU or a real model. It answers /api/chat and
+/api/generate (streamed NDJSON or a single JSON reply, like Ollama) with a
+deterministic response after a configurable first-token delay and per-token
+delay, plus /api/tags and the root health check.
+
+GET /stub/stats reports how many requests arrived over how many distinct TCP
+connections, which shows whether clients reuse keep-alive connections.
+
+    python src/rag_pipeline/stub_ollama.py --port 11500 --first-token-ms 50 --tokens 40 --token-ms 5
+    python src/rag_pipeline/rag_server.py --ollama-url http://localhost:11500
+"""
+
+import argparse
+import asyncio
+import json
+from datetime import datetime, timezone
+
+from aiohttp import web
+
+STUB_MODEL = "alibayram/smollm3:latest"
+
+
+class StubOllama:
+    def __init__(self, first_token_ms=50.0, tokens=40, token_ms=5.0, model=STUB_MODEL):
+        self.first_token = first_token_ms / 1e3
+        self.tokens = tokens
+        self.token_delay = token_ms / 1e3
+        self.model = model
+        self.requests = 0
+        self.connections = set()
+
+    def reply_tokens(self, messages):
+        """Deterministic reply: echoes the length of the last message, then numbered filler tokens."""
+        prompt = messages[-1].get("content", "") if messages else ""
+        head = [f"Stub answer for a {len(prompt)}-character prompt."]
+        return head + [f" token{i}" for i in range(1, self.tokens)]
+
+    def _chunk(self, content, done=False, prompt_tokens=0, eval_tokens=0, elapsed=0.0, chat=True):
+        chunk = {"model": self.model, "created_at": datetime.now(timezone.utc).isoformat()}
+        if chat:
+            chunk["message"] = {"role": "assistant", "content": content}
+        else:
+            chunk["response"] = content
+        chunk["done"] = done
+        if done:
+            chunk.update(
+                done_reason="stop",
+                total_duration=int(elapsed * 1e9),
+                load_duration=0,
+                prompt_eval_count=prompt_tokens,
+                prompt_eval_duration=int(self.first_token * 1e9),
+                eval_count=eval_tokens,
+                eval_duration=int(max(elapsed - self.first_token, 0.0) * 1e9),
+            )
+        return chunk
+
+    def _track(self, request):
+        self.requests += 1
+        peer = request.transport.get_extra_info("peername") if request.transport else None
+        self.connections.add(peer)
+
+    async def handle_chat(self, request):
+        return await self._reply(request, chat=True)
+
+    async def handle_generate(self, request):
+        return await self._reply(request, chat=False)
+
+    async def _reply(self, request, chat):
+        self._track(request)
+        payload = await request.json()
+        messages = payload.get("messages", []) if chat else [{"content": payload.get("prompt", "")}]
+        prompt_tokens = sum(len(m.get("content", "").split()) for m in messages)
+        tokens = self.reply_tokens(messages)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await asyncio.sleep(self.first_token)
+
+        if not payload.get("stream", True):
+            await asyncio.sleep(self.token_delay * (len(tokens) - 1))
+            chunk = self._chunk("".join(tokens), True, prompt_tokens, len(tokens), loop.time() - start, chat)
+            return web.json_response(chunk)
+
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        for i, token in enumerate(tokens):
+            if i:
+                await asyncio.sleep(self.token_delay)
+            await response.write((json.dumps(self._chunk(token, chat=chat)) + "\n").encode())
+        final = self._chunk("", True, prompt_tokens, len(tokens), loop.time() - start, chat)
+        await response.write((json.dumps(final) + "\n").encode())
+        await response.write_eof()
+        return response
+
+    async def handle_tags(self, request):
+        return web.json_response({"models": [{"name": self.model, "model": self.model}]})
+
+    async def handle_root(self, request):
+        return web.Response(text="Ollama is running")
+
+    async def handle_stats(self, request):
+        return web.json_response({"requests": self.requests, "connections": len(self.connections)})
+
+
+def create_app(stub):
+    app = web.Application()
+    app.router.add_get("/", stub.handle_root)
+    app.router.add_post("/api/chat", stub.handle_chat)
+    app.router.add_post("/api/generate", stub.handle_generate)
+    app.router.add_get("/api/tags", stub.handle_tags)
+    app.router.add_get("/stub/stats", stub.handle_stats)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a deterministic stub of the Ollama chat and generate APIs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--first-token-ms", type=float, default=50.0,
+                        help="Delay before the first token (prompt evaluation time).")
+    parser.add_argument("--tokens", type=int, default=40, help="Tokens per reply.")
+    parser.add_argument("--token-ms", type=float, default=5.0, help="Delay between tokens.")
+    args = parser.parse_args()
+
+    stub = StubOllama(args.first_token_ms, args.tokens, args.token_ms)
+    web.run_app(create_app(stub), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,15 @@
 import logging
-from langchain_ollama import ChatOllama
-from langchain.chains import RetrievalQA 
-from langchain_community.vectorstores import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings 
-import torch
 import os
+from rag_components import (
+    CHROMA_PATH, StructuredAnswerer, answer_settings, build_qa_chain, build_retriever,
+    load_answer_cache, load_context_packer, load_embeddings, load_llm, load_vectorstore, vectorstore_backend,
+    vectorstore_size,
+)
+from answer_cache import source_records
+from streaming import TokenStats, stream_qa
+from tracing import METRICS_PATH, TRACE_PATH, Tracer
+
+RETRIEVAL_K = 3
 
 # --- Setup logging ---
 log_dir = "logs"
@@ -22,88 +27,153 @@ logging.basicConfig(
 )
 logging.info("Starting RAG inference/testing pipeline...")
 
-# --- Step 1: Load existing ChromaDB and embeddings ---
-chroma_path = "data/chroma_db/smollm3"  
-collection_name = "cpu_docs_smollm3_ollama" 
+# Stage timings go to logs/traces.jsonl (one span per stage) and logs/metrics.prom
+tracer = Tracer("test_rag_pipeline", TRACE_PATH)
 
-logging.info(f"Loading ChromaDB from {chroma_path}...")
+# --- Step 1: Load existing ChromaDB and embeddings ---
+logging.info(f"Loading ChromaDB from {CHROMA_PATH}...")
 try:
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    logging.info(f"Using device: {device}")
-    
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2", 
-        model_kwargs={'device': device},
-        encode_kwargs={'normalize_embeddings': True}
-    )
-    
-    vectorstore = Chroma(
-        persist_directory=chroma_path,
-        embedding_function=embeddings,
-        collection_name=collection_name
-    )
-    
-    num_docs = vectorstore._collection.count()
-    logging.info(f"Loaded {num_docs} documents from ChromaDB")
+    with tracer.span("load_vectorstore") as span:
+        embeddings = load_embeddings()
+        vectorstore = load_vectorstore(embeddings)
+        num_docs = vectorstore_size(vectorstore)
+        span.set(documents=num_docs)
+    logging.info(f"Loaded {num_docs} documents from the {vectorstore_backend()} vector store")
     
 except Exception as e:
     logging.error(f"Failed to load ChromaDB: {e}")
     logging.info("Run rag_pipeline.py first to create the vectorstore!")
     exit(1)
 
+# --- Step 1b: Load the structured answerers for exact numeric questions ---
+with tracer.span("load_structured"):
+    structured = StructuredAnswerer()
+
 # --- Step 2: Setup Ollama SmolLM3 for Generation ---
 logging.info("Initializing Ollama SmolLM3 for text generation...")
-llm = ChatOllama(
-    model="alibayram/smollm3:latest", 
-    temperature=0.1, 
-    base_url="http://localhost:11434"  
-)
+llm = load_llm()
 
 try:
-    test_response = llm.invoke("Say 'Ollama is working!'")
-    logging.info(f"Ollama SmolLM3 test: {test_response.content}")
+    with tracer.span("llm_warmup") as span:
+        test_response = llm.invoke("Say 'Ollama is working!'")
+        span.set(response_chars=len(test_response.content))
+    # Only the size of the reply is logged; model output stays out of the log file
+    logging.info(f"Ollama SmolLM3 responded ({len(test_response.content)} characters, {span.duration:.2f} s)")
 except Exception as e:
     logging.error(f"Ollama connection failed: {e}")
     logging.info("Make sure 'ollama serve' is running and model is pulled")
     exit(1)
 
 # --- Step 3: Create RAG Chain (The Magic!) ---
+# RAG_RERANK=20 over-fetches 20 chunks and keeps the RETRIEVAL_K best by cross-encoder score
+retriever = build_retriever(vectorstore, sockets=structured.query_engine.distinct("socket"), k=RETRIEVAL_K,
+                            tracer=tracer)
+
 logging.info("Building RAG chain: HF embeddings → ChromaDB → Ollama generation...")
-qa_chain = RetrievalQA.from_chain_type(
-    llm=llm, 
-    chain_type="stuff", 
-    retriever=vectorstore.as_retriever(
-        search_kwargs={"k": 3}
-    ),
-    return_source_documents=True 
-)
+qa_chain = build_qa_chain(llm, retriever)
+# CPU rows go into the prompt as one compact table, PDF passages as prose, within a token budget
+packer = load_context_packer()
+
+# Repeated (or near-identical) questions are answered from the semantic answer cache
+with tracer.span("load_answer_cache") as span:
+    answer_cache = load_answer_cache(embeddings, settings=answer_settings(retriever, packer, llm))
+    span.set(entries=len(answer_cache))
+logging.info(f"Answer cache holds {len(answer_cache)} answers")
 
 # --- Step 4: Test the Full Pipeline ---
 logging.info("Testing full RAG pipeline...")
 test_queries = [
     "Compare the CPU_mark and give me the top 3 names. Ensure the CPU is less than 3 years.",
-    "What are the key factors for choosing a server CPU?"
+    "What are the key factors for choosing a server CPU?",
+    "Which CPUs are similar to the EPYC 7763?",
+    # The model number must not be read as the number of CPUs to list
+    "Which CPUs are similar to the AMD EPYC 7763 CPU?",
+    "What is the best server CPU under $2000 and 200W?"
 ]
 
 for i, query in enumerate(test_queries, 1):
     logging.info(f"\nTest Query {i}: {query}")
-    
-    try:
-        result = qa_chain.invoke({"query": query})
-        
-        print(f"\nSmolLM3 Response:")
-        print("-" * 50)
-        print(result["result"])
-        print("-" * 50)
-        print(f"\nRetrieved {len(result['source_documents'])} documents:")
-        
-        for j, doc in enumerate(result["source_documents"]):
-            print(f"  {j+1}. {doc.page_content[:150]}...")
-            print(f"     Source: {doc.metadata.get('source', 'Unknown')}")
+
+    with tracer.span("query", query_index=i) as query_span:
+        # Ranking questions are answered exactly from the table, skipping retrieval and the LLM
+        with tracer.span("structured") as span:
+            structured_answer = structured.answer(query)
+            span.set(answered=structured_answer is not None)
+        if structured_answer is not None:
+            query_span.set(route="structured")
+            logging.info(f"Answered from the CPU table in {span.duration * 1e6:.0f} µs")
+            print(f"\nStructured Answer:")
+            print("-" * 50)
+            print(structured_answer)
+            print("-" * 50)
+            continue
+
+        retrieve_span = generate_span = None
+        try:
+            with tracer.span("embed_query"):
+                query_vector = answer_cache.embed(query)
+            with tracer.span("cache_lookup", entries=len(answer_cache)) as span:
+                cached = answer_cache.lookup(query, query_vector)
+                span.count(cache_hits=int(cached is not None), cache_misses=int(cached is None))
+            if cached is not None:
+                query_span.set(route="cache", similarity=cached["similarity"])
+                logging.info(
+                    f"Answered from the answer cache in {span.duration * 1e3:.1f} ms "
+                    f"(matched '{cached['matched_query']}', similarity {cached['similarity']:.3f})"
+                )
+                print(f"\nCached Answer:")
+                print("-" * 50)
+                print(cached["answer"])
+                print("-" * 50)
+                continue
+
+            # Sources are shown as soon as retrieval finishes, then tokens as they arrive
+            query_span.set(route="rag")
+            stats = TokenStats()
+            tokens = []
+            context_stats = {}
+            retrieve_span = tracer.start("retrieve", k=RETRIEVAL_K)
+            generate_span = None
+            for kind, value in stream_qa(qa_chain, query, stats, packer, context_stats):
+                if kind == "sources":
+                    sources = source_records(value)
+                    retrieve_span.count(documents=len(sources)).end()
+                    generate_span = tracer.start("generate")
+                    print(f"\nRetrieved {len(sources)} documents:")
+                    for j, source in enumerate(sources):
+                        print(f"  {j+1}. {source['content'][:150]}...")
+                        print(f"     Source: {source['source']}")
+                        print()
+                    print(f"SmolLM3 Response:")
+                    print("-" * 50)
+                else:
+                    tokens.append(value)
+                    print(value, end="", flush=True)
             print()
-            
-    except Exception as e:
-        logging.error(f"Error with query '{query}': {e}")
+            print("-" * 50)
+            generate_span.count(tokens=stats.token_count, context_tokens=context_stats.get("context_tokens", 0))
+            generate_span.end(ttft_ms=None if stats.ttft is None else stats.ttft * 1e3,
+                              tokens_per_s=stats.tokens_per_second, answer_chars=sum(len(t) for t in tokens),
+                              **context_stats)
+            if context_stats:
+                logging.info(f"Prompt context: {context_stats['context_tokens']} tokens "
+                             f"({context_stats['verbose_context_tokens']} verbatim), {context_stats['cpu_rows']} CPU rows, "
+                             f"{context_stats['passages']} passages, {context_stats['dropped']} left out")
+            logging.info(f"Streamed answer: {stats.summary()}")
+            with tracer.span("cache_store"):
+                answer_cache.put(query, "".join(tokens), sources, query_vector)
+
+        except Exception as e:
+            for span in (retrieve_span, generate_span):
+                if span is not None:
+                    span.end(error=e)
+            query_span.end(error=e)
+            logging.error(f"Error with query '{query}': {e}")
 
+embeddings.close()
+tracer.log_summary()
+tracer.metrics.write(METRICS_PATH)
+tracer.close()
+logging.info(f"Spans appended to {TRACE_PATH}, metrics written to {METRICS_PATH}")
 logging.info("RAG inference pipeline completed successfully!")
-logging.info(f"Loaded from ChromaDB: {chroma_path}")
\ No newline at end of file
+logging.info(f"Loaded from ChromaDB: {CHROMA_PATH}")
\ No newline at end of file
@@ -0,0 +1,225 @@
+"""
+tracing.py
+
+Per-stage spans and metrics for the RAG scripts and server.
+
+A span times one stage (load, split, embed, chroma_write, retrieve,
+generate, ...) and carries attributes such as chunk counts, k, token counts
+or cache hits. Spans nest: a span started inside another records it as its
+parent, so the stages of one query share a trace id. Finished spans are
+appended as JSON lines to a file sink (`logs/traces.jsonl`), one object per
+span:
+
+    {"trace_id", "span_id", "parent_id", "service", "name", "start", "duration_ms", "status", "attributes"}
+
+Every span also feeds the metrics registry: a duration histogram per stage
+(`rag_stage_duration_seconds{stage=...}`) plus the counters bumped with
+`Span.count` (`rag_chunks_total{stage="split"}`, `rag_tokens_total{...}`).
+`Metrics.render()` produces the Prometheus text exposition format; the server
+serves it on `GET /metrics`, batch scripts write it to `logs/metrics.prom`
+(for node_exporter's textfile collector, or just to read).
+"""
+
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+
+TRACE_PATH = "logs/traces.jsonl"
+METRICS_PATH = "logs/metrics.prom"
+METRIC_PREFIX = "rag"
+# Seconds; covers sub-millisecond cache lookups up to multi-minute indexing runs
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def _label_string(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+
+class Metrics:
+    """Counters, gauges and histograms rendered in the Prometheus text format."""
+
+    def __init__(self, prefix=METRIC_PREFIX):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._types = {}    # metric name -> (type, help)
+        self._values = {}   # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [bucket counts, sum, count, buckets]
+
+    def _name(self, name, kind, help_text):
+        name = f"{self.prefix}_{name}"
+        if name not in self._types:
+            self._types[name] = (kind, help_text or name.replace("_", " "))
+        return name
+
+    def inc(self, name, value=1, help_text=None, **labels):
+        with self._lock:
+            key = (self._name(name, "counter", help_text), tuple(sorted(labels.items())))
+            self._values[key] = self._values.get(key, 0) + value
+
+    def set(self, name, value, help_text=None, kind="gauge", **labels):
+        """Set a gauge, or a counter maintained elsewhere (`kind="counter"`)."""
+        with self._lock:
+            self._values[(self._name(name, kind, help_text), tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, buckets=DURATION_BUCKETS, help_text=None, **labels):
+        with self._lock:
+            key = (self._name(name, "histogram", help_text), tuple(sorted(labels.items())))
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(buckets), 0.0, 0, buckets]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, (kind, help_text) in sorted(self._types.items()):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                if kind == "histogram":
+                    for (metric, labels), (counts, total, count, buckets) in sorted(self._histograms.items()):
+                        if metric != name:
+                            continue
+                        labels = dict(labels)
+                        for bound, bucket_count in zip(buckets, counts):
+                            lines.append(f"{name}_bucket{_label_string({**labels, 'le': repr(float(bound))})} {bucket_count}")
+                        lines.append(f"{name}_bucket{_label_string({**labels, 'le': '+Inf'})} {count}")
+                        lines.append(f"{name}_sum{_label_string(labels)} {total!r}")
+                        lines.append(f"{name}_count{_label_string(labels)} {count}")
+                else:
+                    for (metric, labels), value in sorted(self._values.items()):
+                        if metric == name:
+                            lines.append(f"{name}{_label_string(dict(labels))} {float(value)!r}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path=METRICS_PATH):
+        """Write the current values to `path` atomically."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+class Span:
+    """One timed stage. End it with `end()`, or use `Tracer.span` as a context manager."""
+
+    def __init__(self, tracer, name, parent, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = dict(attributes)
+        self.wall_start = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.status = "ok"
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        return self
+
+    def count(self, **counts):
+        """Set count attributes and add them to the `<name>_total{stage=...}` counters."""
+        self.attributes.update(counts)
+        for name, value in counts.items():
+            self.tracer.metrics.inc(f"{name}_total", value, stage=self.name)
+        return self
+
+    def end(self, error=None, **attributes):
+        if self.duration is not None:
+            return self
+        self.duration = time.perf_counter() - self.start
+        self.attributes.update(attributes)
+        if error is not None:
+            self.status = "error"
+            self.attributes["error"] = f"{type(error).__name__}: {error}"
+        self.tracer._finish(self)
+        return self
+
+    def as_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "service": self.tracer.service,
+            "name": self.name,
+            "start": self.wall_start,
+            "duration_ms": self.duration * 1e3,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class Tracer:
+    """Creates spans, writes finished ones to a JSONL sink and records their metrics.
+
+    With `path=None` spans are only aggregated into `metrics` and the
+    per-stage totals, not written anywhere.
+    """
+
+    def __init__(self, service, path=None, metrics=None):
+        self.service = service
+        self.path = path
+        self.metrics = metrics or Metrics()
+        self.totals = {}  # stage -> [spans, seconds]
+        self._lock = threading.Lock()
+        self._sink = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._sink = open(path, "a", encoding="utf-8")
+
+    def start(self, name, **attributes):
+        """Start a span under the current one (if any) without making it current."""
+        return Span(self, name, _current_span.get(), attributes)
+
+    @contextlib.contextmanager
+    def span(self, name, **attributes):
+        """Time the body as a span; spans started inside it become its children."""
+        span = self.start(name, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.end(error=e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def _finish(self, span):
+        self.metrics.observe("stage_duration_seconds", span.duration, stage=span.name,
+                             help_text="Duration of each pipeline stage")
+        if span.status == "error":
+            self.metrics.inc("stage_errors_total", stage=span.name)
+        with self._lock:
+            total = self.totals.setdefault(span.name, [0, 0.0])
+            total[0] += 1
+            total[1] += span.duration
+            if self._sink is not None:
+                self._sink.write(json.dumps(span.as_dict(), default=str) + "\n")
+                self._sink.flush()
+
+    def log_summary(self):
+        """Log spans and total time per stage, slowest first."""
+        for name, (count, seconds) in sorted(self.totals.items(), key=lambda item: -item[1][1]):
+            logging.info(f"Stage {name}: {count} spans, {seconds:.3f} s total, {seconds / count * 1e3:.1f} ms mean")
+
+    def close(self):
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None